@@ -0,0 +1,94 @@
+"""
+Options and fixtures shared by the benchmark suites. Each suite (logistics,
+core) sets up its own Django project and fleet in its conftest.py.
+"""
+import atexit
+import os
+import shutil
+import tempfile
+
+import pytest
+
+from .harness import SCALES, BenchmarkSession
+
+session_key = pytest.StashKey[BenchmarkSession]()
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('benchmarks')
+    group.addoption('--bench-scale', choices=sorted(SCALES), default='small',
+                    help='Tamanho da frota gerada (padrão: small)')
+    group.addoption('--bench-rounds', type=int, default=3, help='Medições por benchmark, após o aquecimento')
+    group.addoption('--bench-tolerance', type=float, default=1.0,
+                    help='Aumento de tempo aceito em relação à linha de base (1.0 = até o dobro)')
+    group.addoption('--update-baseline', action='store_true',
+                    help='Grava os resultados desta execução como a nova linha de base')
+
+
+def pytest_configure(config):
+    config.stash[session_key] = BenchmarkSession(
+        rounds=config.getoption('bench_rounds', 3),
+        tolerance=config.getoption('bench_tolerance', 1.0),
+        update_baseline=config.getoption('update_baseline', False),
+    )
+
+
+def pytest_sessionfinish(session):
+    bench_session = session.config.stash.get(session_key, None)
+    if bench_session:
+        bench_session.save()
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    bench_session = config.stash.get(session_key, None)
+    if not bench_session or not bench_session.results:
+        return
+    terminalreporter.section(f"benchmarks: {bench_session.suite} ({bench_session.scale})")
+    for line in bench_session.report_lines():
+        terminalreporter.write_line(line)
+
+
+def bench_database(suite):
+    """BENCH_DB reuses (or creates) a fleet database across runs; else a temporary one."""
+    if os.environ.get('BENCH_DB'):
+        return os.environ['BENCH_DB']
+    directory = tempfile.mkdtemp(prefix=f'bench-{suite}-')
+    atexit.register(shutil.rmtree, directory, True)
+    return os.path.join(directory, 'fleet.sqlite3')
+
+
+@pytest.fixture(scope='session')
+def bench_session(pytestconfig):
+    return pytestconfig.stash[session_key]
+
+
+@pytest.fixture(scope='session')
+def bench_scale(pytestconfig):
+    return pytestconfig.getoption('bench_scale')
+
+
+@pytest.fixture(scope='session')
+def client(fleet):
+    from django.contrib.auth import get_user_model
+    from django.test import Client
+
+    user, _ = get_user_model().objects.get_or_create(
+        username='bench', defaults={'is_staff': True, 'is_superuser': True}
+    )
+    client = Client()
+    client.force_login(user)
+    return client
+
+
+@pytest.fixture
+def bench(request, bench_session):
+    """
+    bench(func, rounds=None): measures func (time and queries) under the
+    test's name and fails the test on a regression against the baseline.
+    """
+    def run(func, rounds=None):
+        result, problems = bench_session.measure(request.node.name, func, rounds)
+        if problems:
+            pytest.fail(f"{request.node.name}: " + '; '.join(problems))
+        return result
+    return run
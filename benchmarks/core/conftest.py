@@ -0,0 +1,40 @@
+"""
+Benchmarks of the multas_django core app on a generated fleet.
+
+    python -m pytest benchmarks/core
+    python -m pytest benchmarks/core --bench-scale medium
+    BENCH_DB=/tmp/fleet-core.sqlite3 python -m pytest benchmarks/core --bench-scale large
+"""
+import pytest
+
+from ..conftest import bench_database
+from ..harness import ROOT, SCALES, setup_django
+
+DATABASE = bench_database('core')
+setup_django(ROOT / 'multas_django', DATABASE)
+
+
+@pytest.fixture(scope='session', autouse=True)
+def fleet(bench_session, bench_scale):
+    from django.core.management import call_command
+
+    from core.models import Veiculo
+    from scripts.generate_fleet_data import DjangoWriter, generate
+
+    bench_session.suite, bench_session.scale = 'core', bench_scale
+    call_command('migrate', verbosity=0)
+    if not Veiculo.objects.exists():
+        generate(DjangoWriter('core'), SCALES[bench_scale])
+    return DATABASE
+
+
+@pytest.fixture(scope='session')
+def busiest(fleet):
+    """Ids of the driver and of the vehicle with the most trips (the heaviest filters)."""
+    from django.db.models import Count
+
+    from core.models import Viagem
+
+    def top(field):
+        return Viagem.objects.values(field).annotate(n=Count('id')).order_by('-n')[0][field]
+    return {'motorista': top('motorista'), 'veiculo': top('veiculo')}
@@ -0,0 +1,29 @@
+from datetime import date, timedelta
+
+import pytest
+from django.urls import reverse
+
+from ..harness import fetch
+
+EXPORTS = ['viagem_export', 'multa_export', 'manutencao_export']
+
+PDFS = ['relatorio_motoristas_pdf', 'relatorio_veiculos_pdf', 'relatorio_multas_pdf',
+        'relatorio_manutencoes_pdf', 'relatorio_viagens_pdf']
+
+
+@pytest.mark.parametrize('formato', ['csv', 'xlsx'])
+@pytest.mark.parametrize('name', EXPORTS)
+def test_export(bench, client, name, formato):
+    url = reverse(name, args=[formato])
+    bench(lambda: fetch(client, url))
+
+
+@pytest.mark.parametrize('name', PDFS)
+def test_pdf(bench, client, name):
+    url = reverse(name)
+    bench(lambda: fetch(client, url))
+
+
+def test_viagens_pdf_last_month(bench, client):
+    url = reverse('relatorio_viagens_pdf')
+    bench(lambda: fetch(client, url, {'data_inicio': (date.today() - timedelta(days=30)).isoformat()}))
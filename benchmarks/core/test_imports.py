@@ -0,0 +1,30 @@
+import random
+from datetime import date, time
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+
+from core.models import Motorista, Veiculo
+
+from ..harness import fetch, rolled_back, travel_workbook
+
+ROWS = 500
+
+
+def test_import_travels(bench, client):
+    rng = random.Random(1)
+    drivers = list(Motorista.objects.values_list('nome', 'cpf'))
+    vehicles = list(Veiculo.objects.values_list('modelo', 'placa'))
+    # The template's 'Nome - CPF' and 'Modelo - Placa' cells
+    content = travel_workbook(
+        (date(2024, 1, 1 + i % 28), time(6 + i % 12, i % 60), ' - '.join(rng.choice(drivers)),
+         ' - '.join(rng.choice(vehicles)), 'Garagem Central', 'Centro', round(rng.uniform(5, 200), 1), None)
+        for i in range(ROWS)
+    )
+    url = reverse('viagem_import')
+
+    def upload():
+        upload = SimpleUploadedFile('viagens.xlsx', content)
+        fetch(client, url, {'arquivo_excel': upload}, method='post', status=302)
+
+    bench(rolled_back(upload), rounds=1)
@@ -0,0 +1,36 @@
+from datetime import date, timedelta
+
+import pytest
+from django.urls import reverse
+
+from ..harness import fetch
+
+PAGES = ['dashboard', 'motorista_list', 'veiculo_list', 'viagem_list', 'multa_list', 'manutencao_list',
+         'report_selection']
+
+
+@pytest.mark.parametrize('name', PAGES)
+def test_page(bench, client, name):
+    url = reverse(name)
+    bench(lambda: fetch(client, url))
+
+
+def test_viagem_list_by_driver_and_period(bench, client, busiest):
+    params = {'motorista': busiest['motorista'], 'data_inicio': (date.today() - timedelta(days=365)).isoformat()}
+    url = reverse('viagem_list')
+    bench(lambda: fetch(client, url, params))
+
+
+def test_viagem_list_by_destination(bench, client):
+    url = reverse('viagem_list')
+    bench(lambda: fetch(client, url, {'destino': 'Campinas', 'distancia_min': 50}))
+
+
+def test_multa_list_by_type_and_vehicle(bench, client, busiest):
+    url = reverse('multa_list')
+    bench(lambda: fetch(client, url, {'tipo_infracao': 'Excesso de Velocidade', 'veiculo': busiest['veiculo']}))
+
+
+def test_manutencao_list_by_value(bench, client):
+    url = reverse('manutencao_list')
+    bench(lambda: fetch(client, url, {'valor_min': 1000, 'tipo_servico': 'Revisão'}))
@@ -0,0 +1,67 @@
+"""
+Uncached lookups per second of core.resolution.ResolutionIndex on the
+fleet's drivers and vehicles (2000 drivers at --bench-scale large): exact
+names, first and last words, names with one or two typos, misspelled first
+names and unknown names, and plates typed in both formats or with one wrong
+character. results.json gets the lookups per second of the last round.
+"""
+import random
+
+LOOKUPS = 2000
+
+
+def typo(rng, text):
+    i = rng.randrange(len(text))
+    letter = rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+    return rng.choice([
+        text[:i] + letter + text[i + 1:],   # wrong letter
+        text[:i] + text[i + 1:],            # missing letter
+        text[:i] + letter + text[i:],       # extra letter
+    ])
+
+
+def name_queries(rng, names):
+    queries = []
+    for _ in range(LOOKUPS):
+        name = rng.choice(names)
+        words = name.split()
+        queries.append(rng.choice([
+            name, typo(rng, name), typo(rng, typo(rng, name)), ' '.join(words[:2]),
+            typo(rng, words[0]), f'{typo(rng, name)} JUNIOR',
+        ]))
+    return queries
+
+
+def plate_queries(rng, plates):
+    mercosul = str.maketrans('0123456789', 'ABCDEFGHIJ')
+    queries = []
+    for _ in range(LOOKUPS):
+        plate = rng.choice(plates)
+        queries.append(rng.choice([plate, plate[:4] + plate[4].translate(mercosul) + plate[5:], typo(rng, plate)]))
+    return queries
+
+
+def lookups(index, match, queries):
+    def run():
+        index._cache.clear()
+        for query in queries:
+            match(query)
+    return run
+
+
+def test_resolve_names(bench):
+    from core.resolution import ResolutionIndex
+
+    index = ResolutionIndex().refresh()
+    queries = name_queries(random.Random(1), list(index.names))
+    result = bench(lookups(index, index.match_motorista, queries), rounds=3)
+    result['lookups_per_second'] = round(LOOKUPS / result['seconds'], 1)
+
+
+def test_resolve_plates(bench):
+    from core.resolution import ResolutionIndex
+
+    index = ResolutionIndex().refresh()
+    queries = plate_queries(random.Random(2), list(index.plates))
+    result = bench(lookups(index, index.match_veiculo, queries), rounds=3)
+    result['lookups_per_second'] = round(LOOKUPS / result['seconds'], 1)
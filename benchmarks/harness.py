@@ -0,0 +1,194 @@
+"""
+Timing and query counting for the benchmark suites, compared against the
+stored baseline (benchmarks/baseline.json).
+
+The baseline is keyed by suite (logistics, core), data scale and benchmark
+name. A benchmark fails when it runs more queries than its baseline, or
+when its best time (of --bench-rounds) is above the baseline by more than
+the tolerance (and by more than NOISE_FLOOR seconds, so that millisecond
+pages do not fail on jitter). Query counts do not depend on the machine and
+are compared exactly; times do, so record the baseline on the machine that
+runs the comparison. Benchmarks missing from the baseline are only recorded.
+"""
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+BENCH_DIR = Path(__file__).resolve().parent
+ROOT = BENCH_DIR.parent
+BASELINE_PATH = BENCH_DIR / 'baseline.json'
+RESULTS_PATH = BENCH_DIR / 'results.json'
+
+NOISE_FLOOR = 0.01
+
+# Fleet sizes selectable with --bench-scale; "large" is the reference fleet of the generator
+SCALES = {
+    'small': {'vehicles': 20, 'drivers': 80, 'trips': 5000, 'fines': 500, 'maintenances': 250},
+    'medium': {'vehicles': 100, 'drivers': 400, 'trips': 100_000, 'fines': 10_000, 'maintenances': 5000},
+    'large': {'vehicles': 500, 'drivers': 2000, 'trips': 1_000_000, 'fines': 100_000, 'maintenances': 50_000},
+}
+
+
+def load_json(path):
+    try:
+        return json.loads(path.read_text(encoding='utf-8'))
+    except FileNotFoundError:
+        return {}
+
+
+def save_json(path, data):
+    path.write_text(json.dumps(data, indent=2, sort_keys=True, ensure_ascii=False) + '\n', encoding='utf-8')
+
+
+class BenchmarkSession:
+    """Everything measured in one pytest run, plus the baseline it is compared with."""
+
+    def __init__(self, rounds=3, tolerance=1.0, update_baseline=False):
+        self.rounds = rounds
+        self.tolerance = tolerance
+        self.update_baseline = update_baseline
+        self.baseline = load_json(BASELINE_PATH)
+        self.suite = None
+        self.scale = None
+        self.results = {}
+
+    def expected(self, name):
+        return self.baseline.get(self.suite, {}).get(self.scale, {}).get(name)
+
+    def measure(self, name, func, rounds=None):
+        """
+        Runs func once to warm caches, then `rounds` more times. Queries are
+        counted on the warm-up run. Returns the result entry and a list of
+        regressions against the baseline (empty when within budget).
+        """
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        # The log is capped (9000 entries); a full log would make the capture count 0
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        timings = []
+        for _ in range(rounds or self.rounds):
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+
+        # The best run is the least disturbed by the rest of the machine (as timeit does)
+        result = {
+            'seconds': round(min(timings), 4),
+            'median_seconds': round(statistics.median(timings), 4),
+            'queries': len(queries),
+        }
+        self.results[name] = result
+        return result, self.regressions(name, result)
+
+    def regressions(self, name, result):
+        expected = self.expected(name)
+        if self.update_baseline or not expected:
+            return []
+        problems = []
+        if result['queries'] > expected['queries']:
+            problems.append(f"{result['queries']} queries (baseline {expected['queries']})")
+        limit = expected['seconds'] * (1 + self.tolerance)
+        if result['seconds'] > limit and result['seconds'] - expected['seconds'] > NOISE_FLOOR:
+            problems.append(
+                f"{result['seconds'] * 1000:.1f} ms (baseline {expected['seconds'] * 1000:.1f} ms, "
+                f"tolerance {self.tolerance:.0%})"
+            )
+        return problems
+
+    def save(self):
+        if not self.results:
+            return
+        runs = load_json(RESULTS_PATH)
+        runs.setdefault(self.suite, {})[self.scale] = self.results
+        save_json(RESULTS_PATH, runs)
+        if self.update_baseline:
+            baseline = load_json(BASELINE_PATH)
+            stored = baseline.setdefault(self.suite, {}).setdefault(self.scale, {})
+            stored.update({name: {'seconds': r['seconds'], 'queries': r['queries']} for name, r in self.results.items()})
+            save_json(BASELINE_PATH, baseline)
+
+    def report_lines(self):
+        lines = [f"{'benchmark':<45} {'ms':>9} {'base ms':>9} {'queries':>8} {'base q':>7}"]
+        for name, result in sorted(self.results.items()):
+            expected = self.expected(name) or {}
+            base_ms = f"{expected['seconds'] * 1000:.1f}" if expected else '-'
+            lines.append(
+                f"{name:<45} {result['seconds'] * 1000:>9.1f} {base_ms:>9} "
+                f"{result['queries']:>8} {expected.get('queries', '-'):>7}"
+            )
+        return lines
+
+
+def fetch(client, url, data=None, method='get', status=200):
+    """Requests url with the test client and reads the whole body (streamed exports included)."""
+    response = getattr(client, method)(url, data)
+    assert response.status_code == status, f"{url}: HTTP {response.status_code}"
+    if response.streaming:
+        return b''.join(response.streaming_content)
+    return response.content
+
+
+class Rollback(Exception):
+    """Raised to discard what a measured function wrote."""
+
+
+def rolled_back(func):
+    """func wrapped in a transaction that is always rolled back, so it can be measured repeatedly."""
+    from django.db import transaction
+
+    def run():
+        try:
+            with transaction.atomic():
+                func()
+                raise Rollback
+        except Rollback:
+            pass
+    return run
+
+
+def setup_django(project, database):
+    """
+    Sets up the Django project in `project` on the SQLite file `database`.
+    Both projects name their settings package "config", so only one of them
+    can be loaded per pytest run.
+    """
+    loaded = sys.modules.get('config')
+    if loaded and Path(loaded.__file__).resolve().parent.parent != project:
+        pytest.exit('Rode as suítes benchmarks/logistics e benchmarks/core em execuções separadas do pytest.', returncode=4)
+    sys.path.insert(0, str(project))
+    sys.path.append(str(ROOT))  # scripts/ (data generator)
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'config.settings'
+
+    import django
+    from django.conf import settings
+    from django.test.utils import setup_test_environment
+
+    # Always SQLite, even with a DATABASE_URL in the environment
+    settings.DATABASES['default'] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': str(database)}
+    django.setup()
+    setup_test_environment()
+
+
+def travel_workbook(rows):
+    """An .xlsx in the travel import template layout (header + rows), as bytes."""
+    import io
+
+    import openpyxl
+
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(['Data (DD/MM/AAAA)', 'Hora Saida (HH:MM)', 'CPF Motorista', 'Placa Veiculo', 'Origem', 'Destino',
+                  'Distancia (KM)', 'KM Final'])
+    for row in rows:
+        sheet.append(list(row))
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
@@ -0,0 +1,30 @@
+"""
+Benchmarks of the logistics app and of the legacy db_handler loaders, on a
+generated fleet (the legacy tables live in the same SQLite file).
+
+    python -m pytest benchmarks/logistics
+    python -m pytest benchmarks/logistics --bench-scale medium
+    BENCH_DB=/tmp/fleet.sqlite3 python -m pytest benchmarks/logistics --bench-scale large
+"""
+import pytest
+
+from ..conftest import bench_database
+from ..harness import ROOT, SCALES, setup_django
+
+DATABASE = bench_database('logistics')
+setup_django(ROOT, DATABASE)
+
+
+@pytest.fixture(scope='session', autouse=True)
+def fleet(bench_session, bench_scale):
+    from django.core.management import call_command
+
+    from logistics.models import Veiculo
+    from scripts.generate_fleet_data import DjangoWriter, LegacyWriter, generate
+
+    bench_session.suite, bench_session.scale = 'logistics', bench_scale
+    call_command('migrate', verbosity=0)
+    if not Veiculo.objects.exists():
+        generate(DjangoWriter('logistics'), SCALES[bench_scale])
+        generate(LegacyWriter(DATABASE), SCALES[bench_scale])
+    return DATABASE
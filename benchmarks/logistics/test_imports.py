@@ -0,0 +1,29 @@
+import random
+from datetime import date, time
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+
+from logistics.models import Motorista, Veiculo
+
+from ..harness import fetch, rolled_back, travel_workbook
+
+ROWS = 500
+
+
+def test_import_travels(bench, client):
+    rng = random.Random(1)
+    cpfs = list(Motorista.objects.values_list('cpf', flat=True))
+    plates = list(Veiculo.objects.values_list('placa', flat=True))
+    content = travel_workbook(
+        (date(2024, 1, 1 + i % 28), time(6 + i % 12, i % 60), rng.choice(cpfs), rng.choice(plates),
+         'Garagem Central', 'Centro', round(rng.uniform(5, 200), 1))
+        for i in range(ROWS)
+    )
+    url = reverse('viagem_import')
+
+    def upload():
+        upload = SimpleUploadedFile('viagens.xlsx', content)
+        fetch(client, url, {'arquivo_excel': upload}, method='post', status=302)
+
+    bench(rolled_back(upload), rounds=1)
@@ -0,0 +1,16 @@
+"""The pandas loaders of the legacy Streamlit app (db_handler), on the same fleet."""
+import pytest
+
+import db_handler
+
+LOADERS = ['get_drivers', 'get_vehicles', 'get_fines_df', 'get_travels', 'get_maintenances', 'get_maintenance_alerts']
+
+
+@pytest.fixture(autouse=True)
+def legacy_database(fleet, monkeypatch):
+    monkeypatch.setattr(db_handler, 'DB_NAME', str(fleet))
+
+
+@pytest.mark.parametrize('loader', LOADERS)
+def test_loader(bench, loader):
+    bench(getattr(db_handler, loader))
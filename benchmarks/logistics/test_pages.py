@@ -0,0 +1,30 @@
+import pytest
+from django.urls import reverse
+
+from ..harness import fetch
+
+PAGES = ['dashboard', 'motorista_list', 'veiculo_list', 'viagem_list', 'manutencao_list', 'multa_list', 'reports']
+
+API = {
+    'viagens': 'viagem-list',
+    'multas': 'multa-list',
+    'manutencoes': 'manutencao-list',
+    'veiculos': 'veiculo-list',
+}
+
+
+@pytest.mark.parametrize('name', PAGES)
+def test_page(bench, client, name):
+    url = reverse(name)
+    bench(lambda: fetch(client, url))
+
+
+@pytest.mark.parametrize('resource', API)
+def test_api_list(bench, client, resource):
+    url = reverse(API[resource])
+    bench(lambda: fetch(client, url))
+
+
+def test_api_viagens_sparse_fields(bench, client):
+    url = reverse('viagem-list')
+    bench(lambda: fetch(client, url, {'fields': 'id,data,distancia,motorista', 'page_size': 1000}))
@@ -0,0 +1,17 @@
+import pytest
+from django.urls import reverse
+
+from ..harness import fetch
+
+PDFS = ['motorista_pdf', 'veiculo_pdf', 'multa_pdf', 'manutencao_pdf', 'viagem_pdf']
+
+
+@pytest.mark.parametrize('name', PDFS)
+def test_pdf(bench, client, name):
+    url = reverse(name)
+    bench(lambda: fetch(client, url))
+
+
+def test_import_template(bench, client):
+    url = reverse('viagem_download_template')
+    bench(lambda: fetch(client, url))
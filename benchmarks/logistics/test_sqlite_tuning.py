@@ -0,0 +1,103 @@
+"""
+Mixed read/write throughput on SQLite: with SQLite's defaults (rollback
+journal, synchronous=FULL) and with the PRAGMAs of common/database.py.
+
+Writer threads save trips the way the import does (one transaction per
+row, statistics included) while reader threads run the queries of the
+trip list and the dashboard. Both profiles run the same operations;
+results.json gets the writes and reads per second of the last round and the
+writes that still failed with "database is locked". Point BENCH_DB at the
+disk the app runs on: the cost of synchronous=FULL is the disk's fsync.
+"""
+import threading
+import time as clock
+from datetime import date, time
+
+import pytest
+
+WRITERS = 2
+READERS = 4
+OPERATIONS = 100  # per thread
+MARK = 'bench-sqlite'
+
+PROFILES = {
+    # Only the journal mode is stored in the file; the other PRAGMAs start at SQLite's defaults
+    'stock': {'journal_mode': 'DELETE'},
+    'tuned': None,
+}
+
+
+@pytest.fixture
+def sqlite_profile(request):
+    from django.db import connections
+    from django.test import override_settings
+
+    from common.database import SQLITE_PRAGMAS
+    from logistics.models import Viagem
+
+    pragmas = PROFILES[request.param] if PROFILES[request.param] is not None else SQLITE_PRAGMAS
+    connections.close_all()
+    with override_settings(SQLITE_PRAGMAS=pragmas):
+        yield request.param
+        Viagem.objects.filter(destino=MARK).delete()
+    connections.close_all()
+
+
+def mixed_workload(locked, elapsed):
+    from django.db import OperationalError, connection
+    from django.db.models import Sum
+
+    from logistics.models import Motorista, Veiculo, Viagem
+
+    motorista_ids = list(Motorista.objects.values_list('id', flat=True)[:WRITERS])
+    veiculo_ids = list(Veiculo.objects.values_list('id', flat=True)[:WRITERS])
+    failures = []
+
+    def writer(number):
+        for i in range(OPERATIONS):
+            try:
+                Viagem.objects.create(
+                    data=date(2024, 1, 1 + i % 28), hora_saida=time(8, 0), destino=MARK, distancia=10,
+                    motorista_id=motorista_ids[number % len(motorista_ids)],
+                    veiculo_id=veiculo_ids[number % len(veiculo_ids)],
+                )
+            except OperationalError as error:
+                if 'locked' not in str(error):
+                    raise
+                locked.append(error)
+
+    def reader(number):
+        for i in range(OPERATIONS):
+            list(Viagem.objects.select_related('motorista', 'veiculo').order_by('-data', '-id')[:50])
+            Viagem.objects.filter(data__year=2024).aggregate(Sum('distancia'))
+
+    def run(target, number):
+        started = clock.perf_counter()
+        try:
+            target(number)
+        except Exception as error:  # re-raised in the main thread
+            failures.append(error)
+        finally:
+            connection.close()
+            elapsed[target.__name__] = max(elapsed.get(target.__name__, 0), clock.perf_counter() - started)
+
+    elapsed.clear()
+    threads = [threading.Thread(target=run, args=(writer, n)) for n in range(WRITERS)]
+    threads += [threading.Thread(target=run, args=(reader, n)) for n in range(READERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if failures:
+        raise failures[0]
+
+
+@pytest.mark.parametrize('sqlite_profile', sorted(PROFILES), indirect=True)
+def test_mixed_read_write(bench, sqlite_profile):
+    locked, elapsed = [], {}
+    result = bench(lambda: mixed_workload(locked, elapsed), rounds=2)
+    result['writes_per_second'] = round(WRITERS * OPERATIONS / elapsed['writer'], 1)
+    result['reads_per_second'] = round(READERS * OPERATIONS / elapsed['reader'], 1)
+    result['locked'] = len(locked)
+    if sqlite_profile == 'tuned':
+        assert not locked, f"{len(locked)} escritas falharam com 'database is locked'"
@@ -0,0 +1,7 @@
+"""
+Code shared by the two Django projects of the repository: the logistics
+project (config/ and logistics/, in the repository root) and multas_django
+(which adds the repository root to sys.path in its settings). Each project
+configures these modules through its settings, and lists "common" in
+INSTALLED_APPS for the profile_token command.
+"""
@@ -0,0 +1,155 @@
+"""
+Per-request SQL instrumentation.
+
+QueryInstrumentationMiddleware counts the queries of each request, their
+total time and how often each query shape (fingerprint) ran, through
+Django's connection.execute_wrapper (DEBUG is not needed). The numbers go to
+the Server-Timing and X-Query-Count response headers and to one JSON log
+line per request on the SQL_LOGGER logger ("logistics.sql", "core.sql"). A
+query shape repeated SQL_REPEATED_QUERY_THRESHOLD times or more in one
+request is the usual sign of an N+1 (one query per row of a list) and is
+logged as a warning.
+
+query_budget() checks the same numbers in tests:
+
+    with query_budget(max_queries=10, max_repeats=2):
+        self.client.get(reverse('dashboard'))
+
+Queries run while a StreamingHttpResponse is consumed happen after the
+middleware returns and are not counted.
+"""
+import json
+import logging
+import re
+import time
+from contextlib import ExitStack, contextmanager
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connections
+
+LOGGER_NAME = 'sql'
+REPEATED_QUERY_THRESHOLD = 5
+
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r"\bIN \(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(sql):
+    """
+    The shape of a query, without its values: the same query for another
+    row gives the same fingerprint.
+    "SELECT ... WHERE id = 3 AND placa IN ('A', 'B')" -> "SELECT ... WHERE id = ? AND placa IN (...)"
+    """
+    sql = _STRINGS.sub('?', sql)
+    sql = _NUMBERS.sub('?', sql.replace('%s', '?'))
+    sql = _IN_LISTS.sub('IN (...)', sql)
+    return ' '.join(sql.split())
+
+
+class QueryRecorder:
+    """execute_wrapper that counts and times every query, grouped by fingerprint."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = {}  # fingerprint -> [count, seconds]
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.duration += elapsed
+            entry = self.fingerprints.setdefault(fingerprint(sql), [0, 0.0])
+            entry[0] += 1
+            entry[1] += elapsed
+
+    def repeated(self, threshold):
+        """[(fingerprint, count, seconds)] of the shapes run at least threshold times, most frequent first."""
+        found = [(sql, count, seconds) for sql, (count, seconds) in self.fingerprints.items() if count >= threshold]
+        return sorted(found, key=lambda item: -item[1])
+
+    def summary(self, limit=5):
+        lines = [f"{self.count} queries in {self.duration * 1000:.1f} ms"]
+        ranked = sorted(self.fingerprints.items(), key=lambda item: -item[1][0])[:limit]
+        lines += [f"  {count}x {sql}" for sql, (count, seconds) in ranked]
+        return '\n'.join(lines)
+
+
+@contextmanager
+def record_queries():
+    """Records the queries run on every database connection inside the block."""
+    recorder = QueryRecorder()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        yield recorder
+
+
+@contextmanager
+def query_budget(max_queries=None, max_repeats=None):
+    """
+    Fails (AssertionError) when the block runs more than max_queries queries,
+    or runs the same query shape more than max_repeats times (an N+1).
+    """
+    with record_queries() as recorder:
+        yield recorder
+    problems = []
+    if max_queries is not None and recorder.count > max_queries:
+        problems.append(f"{recorder.count} queries, budget is {max_queries}")
+    if max_repeats is not None:
+        problems += [
+            f"query repeated {count} times (max {max_repeats}): {sql}"
+            for sql, count, seconds in recorder.repeated(max_repeats + 1)
+        ]
+    if problems:
+        raise AssertionError('\n'.join(problems + [recorder.summary()]))
+
+
+class QueryInstrumentationMiddleware:
+    """Reports the SQL of each request in headers and in the SQL_LOGGER log."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.threshold = getattr(settings, 'SQL_REPEATED_QUERY_THRESHOLD', REPEATED_QUERY_THRESHOLD)
+        self.headers = getattr(settings, 'SQL_INSTRUMENTATION_HEADERS', True)
+        self.logger = logging.getLogger(getattr(settings, 'SQL_LOGGER', LOGGER_NAME))
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        with record_queries() as recorder:
+            response = self.get_response(request)
+        total = time.perf_counter() - started
+
+        if self.headers:
+            response['X-Query-Count'] = str(recorder.count)
+            timing = (
+                f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} queries", '
+                f'app;dur={total * 1000:.1f}'
+            )
+            if response.has_header('Server-Timing'):
+                timing = f"{response['Server-Timing']}, {timing}"
+            response['Server-Timing'] = timing
+
+        repeated = recorder.repeated(self.threshold)
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': recorder.count,
+            'sql_ms': round(recorder.duration * 1000, 1),
+            'total_ms': round(total * 1000, 1),
+        }
+        if repeated:
+            record['repeated'] = [
+                {'count': count, 'ms': round(seconds * 1000, 1), 'sql': sql[:300]} for sql, count, seconds in repeated[:3]
+            ]
+            self.logger.warning("possible N+1 %s", json.dumps(record, ensure_ascii=False), extra={'sql': record})
+        else:
+            self.logger.info("%s", json.dumps(record, ensure_ascii=False), extra={'sql': record})
+        return response
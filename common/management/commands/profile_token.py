@@ -0,0 +1,23 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from common.profiling import make_token
+
+
+class Command(BaseCommand):
+    help = (
+        'Prints a token that lets a staff user profile a single request '
+        '(?_profile=<token> or the X-Profile header). See common/profiling.py.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['username'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"Usuário {options['username']} não encontrado.")
+        if not user.is_staff:
+            raise CommandError(f"{user.username} não é da equipe (is_staff): o profiler não vai atender.")
+        self.stdout.write(make_token(user))
@@ -0,0 +1,310 @@
+"""
+In-process metrics, served in the Prometheus text format at /metrics.
+
+Counter and Histogram keep their values in memory, one series per label
+combination; no external service is needed. The metrics below are the ones
+both projects record; a project defines its own ones in its app (for
+example core/metrics.py):
+
+    IMPORT_ROWS.inc(created, result='created')
+    with REPORT_RENDER_SECONDS.time(report='viagens'):
+        ...
+
+Each gunicorn worker (WEB_CONCURRENCY) is a separate process and only sees
+its own requests. Set METRICS_DIR to a directory shared by all of them:
+every process then writes a snapshot of its values to that directory, at
+most every FLUSH_INTERVAL seconds and at exit, and /metrics adds up the
+snapshots of all the processes. Snapshots of workers that already exited
+are kept, so counters do not go back while the directory lives; empty it
+when the service starts.
+
+/metrics is open to staff users, and to scrapers sending
+"Authorization: Bearer <METRICS_TOKEN>" when METRICS_TOKEN is set.
+"""
+import atexit
+import hmac
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse
+
+FLUSH_INTERVAL = 1.0
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (10_000, 50_000, 100_000, 500_000, 1_000_000, 5_000_000, 20_000_000, 50_000_000)
+RATE_BUCKETS = (1, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+def metrics_dir():
+    directory = getattr(settings, 'METRICS_DIR', None)
+    return Path(directory) if directory else None
+
+
+class Registry:
+    """The metrics of this process, and their snapshots in METRICS_DIR."""
+
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+        self._pid = None
+        self._name = None
+        self._flushed = 0.0
+        self._timer = None
+        atexit.register(self.flush)
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def snapshot(self):
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    def reset(self):
+        for metric in self.metrics.values():
+            metric.reset()
+
+    def changed(self):
+        """Called on every update: writes the snapshot, at most every FLUSH_INTERVAL seconds."""
+        if metrics_dir() is None:
+            return
+        wait = self._flushed + FLUSH_INTERVAL - time.monotonic()
+        if wait <= 0:
+            self.flush()
+        elif self._timer is None:
+            # An idle worker must still publish its last updates
+            with self._lock:
+                if self._timer is None:
+                    self._timer = threading.Timer(wait, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+
+    def flush(self):
+        directory = metrics_dir()
+        if directory is None:
+            return
+        with self._lock:
+            self._timer = None
+            self._flushed = time.monotonic()
+            if self._pid != os.getpid():
+                # New process (or forked after import): never reuse a file of another one
+                self._pid = os.getpid()
+                self._name = f"{self._pid}-{time.time_ns()}.json"
+            try:
+                directory.mkdir(parents=True, exist_ok=True)
+                temporary = directory / f".{self._name}.tmp"
+                temporary.write_text(json.dumps(self.snapshot()), encoding='utf-8')
+                os.replace(temporary, directory / self._name)
+            except OSError:
+                pass
+
+    def collect(self):
+        """The snapshots to report: of every process in METRICS_DIR, or only of this one."""
+        directory = metrics_dir()
+        if directory is None:
+            return [self.snapshot()]
+        self.flush()
+        snapshots = []
+        for path in directory.glob('*.json'):
+            try:
+                snapshots.append(json.loads(path.read_text(encoding='utf-8')))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+
+REGISTRY = Registry()
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.registry = registry
+        self._lock = threading.Lock()
+        self._values = {}
+        registry.register(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes the labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def snapshot(self):
+        with self._lock:
+            samples = [[list(key), self._copy(value)] for key, value in self._values.items()]
+        return {'type': self.type, 'help': self.documentation, 'labels': list(self.labelnames), 'samples': samples}
+
+
+class Counter(Metric):
+    type = 'counter'
+    _copy = staticmethod(lambda value: value)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        self.registry.changed()
+
+
+class Histogram(Metric):
+    type = 'histogram'
+    _copy = staticmethod(list)
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, registry=REGISTRY):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            # [count per bucket..., count above the last bucket, sum]
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[bisect_left(self.buckets, value)] += 1
+            entry[-1] += value
+        self.registry.changed()
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def snapshot(self):
+        data = super().snapshot()
+        data['buckets'] = list(self.buckets)
+        return data
+
+
+def merge(snapshots):
+    """Adds up the snapshots of several processes: {name: (description, {labels: value})}."""
+    merged = {}
+    for snapshot in snapshots:
+        for name, data in snapshot.items():
+            description, series = merged.setdefault(name, (data, {}))
+            for labels, value in data['samples']:
+                key = tuple(labels)
+                if data['type'] == 'histogram':
+                    if data['buckets'] != description['buckets']:
+                        continue  # written before a change of buckets
+                    total = series.get(key)
+                    series[key] = [a + b for a, b in zip(total, value)] if total else list(value)
+                else:
+                    series[key] = series.get(key, 0) + value
+    return merged
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(snapshots):
+    """The Prometheus text exposition of the snapshots."""
+    lines = []
+    for name, (description, series) in sorted(merge(snapshots).items()):
+        lines.append(f"# HELP {name} {description['help']}")
+        lines.append(f"# TYPE {name} {description['type']}")
+        names = description['labels']
+        for key, value in sorted(series.items()):
+            if description['type'] != 'histogram':
+                lines.append(f"{name}{_labels(names, key)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(description['buckets'] + ['+Inf'], value[:-1]):
+                cumulative += count
+                le = bound if bound == '+Inf' else _number(bound)
+                lines.append(f"{name}_bucket{_labels(names, key, [('le', le)])} {cumulative}")
+            lines.append(f"{name}_sum{_labels(names, key)} {_number(value[-1])}")
+            lines.append(f"{name}_count{_labels(names, key)} {cumulative}")
+    return '\n'.join(lines) + '\n'
+
+
+HTTP_REQUESTS = Counter('http_requests_total', 'HTTP requests by URL name, method and status.', ['view', 'method', 'status'])
+HTTP_DURATION = Histogram('http_request_duration_seconds', 'Time to build the response, by URL name.', ['view', 'method'])
+REPORT_RENDER_SECONDS = Histogram('report_render_seconds', 'Time to render a PDF report.', ['report'])
+REPORT_SIZE_BYTES = Histogram('report_size_bytes', 'Size of the rendered PDF reports.', ['report'], buckets=SIZE_BUCKETS)
+IMPORT_ROWS = Counter('import_rows_total', 'Spreadsheet rows imported (created) or rejected (error).', ['result'])
+IMPORT_FILES = Counter('import_files_total', 'Spreadsheets imported (ok) or unreadable (failed).', ['result'])
+IMPORT_DURATION = Histogram('import_duration_seconds', 'Time to import one spreadsheet.')
+IMPORT_ROWS_PER_SECOND = Histogram('import_rows_per_second', 'Rows per second of each spreadsheet import.',
+                                   buckets=RATE_BUCKETS)
+
+
+def observe_report(report):
+    """Decorator for the functions returning a PDF report as an HttpResponse."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with REPORT_RENDER_SECONDS.time(report=report):
+                response = func(*args, **kwargs)
+            REPORT_SIZE_BYTES.observe(len(response.content), report=report)
+            return response
+        return wrapper
+    return decorator
+
+
+def observe_import(rows, errors, seconds):
+    """Records one spreadsheet import: rows created, rows rejected and its speed."""
+    IMPORT_FILES.inc(result='ok')
+    IMPORT_ROWS.inc(rows, result='created')
+    IMPORT_ROWS.inc(errors, result='error')
+    IMPORT_DURATION.observe(seconds)
+    if seconds > 0:
+        IMPORT_ROWS_PER_SECOND.observe((rows + errors) / seconds)
+
+
+class MetricsMiddleware:
+    """Counts and times every request by URL name (not path, to keep the series few)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match and match.view_name else 'unmatched'
+        HTTP_REQUESTS.inc(view=view, method=request.method, status=response.status_code)
+        HTTP_DURATION.observe(elapsed, view=view, method=request.method)
+        return response
+
+
+def metrics_view(request):
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    user = getattr(request, 'user', None)
+    allowed = bool(user and user.is_active and user.is_staff)
+    if token and not allowed:
+        allowed = hmac.compare_digest(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}')
+    if not allowed:
+        return HttpResponse('Acesso negado\n', status=403, content_type='text/plain; charset=utf-8')
+    return HttpResponse(render(REGISTRY.collect()), content_type=CONTENT_TYPE)
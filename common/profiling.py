@@ -0,0 +1,199 @@
+"""
+On-demand profiling of a single request, for staff users.
+
+A request is profiled only when it carries a profiling token, in the
+"_profile" query parameter or in the X-Profile header, and the logged-in
+user is staff and the owner of the token. Tokens are signed with SECRET_KEY
+and PROFILING_TOKEN_SALT (one per project) and expire after
+PROFILING_TOKEN_MAX_AGE seconds; create one with
+`python manage.py profile_token <username>`. Requests without a token only
+pay for a substring check on the query string and a header lookup.
+
+"_profile_format" chooses the output, returned instead of the page:
+    stats   (default) cProfile statistics as text, sorted by "_profile_sort"
+            (cumulative, tottime or calls) and limited to "_profile_limit" lines
+    prof    the raw cProfile dump, for snakeviz or pstats
+    folded  stacks sampled every few milliseconds in the "folded" format,
+            which speedscope.app or flamegraph.pl turn into a flame graph
+With "_profile_store=1" the page is returned as usual, the profile is saved
+in PROFILING_DIR and its name is sent in the X-Profile header; download it
+later from /perfis/<name>/.
+
+Example:
+    /relatorios/?_profile=<token>&_profile_sort=tottime
+    curl -H "X-Profile: <token>" -b sessionid=... ".../viagens/pdf/?_profile_format=folded" > pdf.folded
+"""
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core import signing
+from django.http import FileResponse, Http404, HttpResponse
+
+TOKEN_SALT = 'common.profiling'
+TOKEN_MAX_AGE = 3600
+SAMPLE_INTERVAL = 0.005
+STATS_LIMIT = 80
+SORT_KEYS = {'cumulative', 'tottime', 'calls'}
+FORMATS = {'stats': 'txt', 'prof': 'prof', 'folded': 'folded'}
+
+PROFILE_NAME = re.compile(r'^[\w.-]+$')
+
+
+def _signer():
+    return signing.TimestampSigner(salt=getattr(settings, 'PROFILING_TOKEN_SALT', TOKEN_SALT))
+
+
+def make_token(user):
+    """A profiling token for user, valid for PROFILING_TOKEN_MAX_AGE seconds."""
+    return _signer().sign(str(user.pk))
+
+
+def token_user_id(token):
+    """The user id inside a valid, unexpired token, or None."""
+    max_age = getattr(settings, 'PROFILING_TOKEN_MAX_AGE', TOKEN_MAX_AGE)
+    try:
+        return _signer().unsign(token, max_age=max_age)
+    except signing.BadSignature:
+        return None
+
+
+def profiling_dir():
+    return Path(getattr(settings, 'PROFILING_DIR', Path(settings.BASE_DIR) / 'profiles'))
+
+
+class StackSampler:
+    """Samples the stack of one thread from a background thread ("folded" flame graph input)."""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def folded(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class ProfilingMiddleware:
+    """Profiles the requests that carry a valid token of a staff user (see the module docstring)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = request.META.get('HTTP_X_PROFILE')
+        if token is None and '_profile=' in request.META.get('QUERY_STRING', ''):
+            token = request.GET.get('_profile')
+        if not token or not self.allowed(request, token):
+            return self.get_response(request)
+        return self.profile(request)
+
+    def allowed(self, request, token):
+        user = getattr(request, 'user', None)
+        return bool(user and user.is_active and user.is_staff and token_user_id(token) == str(user.pk))
+
+    def profile(self, request):
+        output = request.GET.get('_profile_format', 'stats')
+        if output not in FORMATS:
+            output = 'stats'
+        started = time.perf_counter()
+        if output == 'folded':
+            with StackSampler(threading.get_ident()) as sampler:
+                response = self.run(request)
+            data = sampler.folded()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                response = self.run(request)
+            finally:
+                profiler.disable()
+            data = self.stats(profiler, request) if output == 'stats' else self.dump(profiler)
+        elapsed = time.perf_counter() - started
+
+        if request.GET.get('_profile_store') == '1':
+            name = self.store(request, output, data)
+            response['X-Profile'] = name
+            return response
+        if output == 'stats':
+            data = f"{request.method} {request.get_full_path()} -> {response.status_code} em {elapsed * 1000:.0f} ms\n\n{data}"
+        content_type = 'application/octet-stream' if output == 'prof' else 'text/plain; charset=utf-8'
+        profile_response = HttpResponse(data, content_type=content_type)
+        if output == 'prof':
+            profile_response['Content-Disposition'] = 'attachment; filename="request.prof"'
+        return profile_response
+
+    def run(self, request):
+        response = self.get_response(request)
+        if response.streaming:
+            # Exports do their work while streaming: consume it inside the profile
+            content = b''.join(response.streaming_content)
+            headers = {key: value for key, value in response.items() if key.lower() != 'content-length'}
+            response = HttpResponse(content, status=response.status_code, headers=headers)
+        return response
+
+    def stats(self, profiler, request):
+        sort = request.GET.get('_profile_sort', 'cumulative')
+        try:
+            limit = int(request.GET.get('_profile_limit', STATS_LIMIT))
+        except ValueError:
+            limit = STATS_LIMIT
+        stream = io.StringIO()
+        stats = pstats.Stats(profiler, stream=stream)
+        stats.sort_stats(sort if sort in SORT_KEYS else 'cumulative').print_stats(limit)
+        return stream.getvalue()
+
+    def dump(self, profiler):
+        profiler.create_stats()
+        return marshal.dumps(profiler.stats)
+
+    def store(self, request, output, data):
+        directory = profiling_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        match = getattr(request, 'resolver_match', None)
+        view = re.sub(r'[^\w.-]', '_', match.view_name) if match and match.view_name else 'request'
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{view}-{os.getpid()}.{FORMATS[output]}"
+        mode = 'wb' if isinstance(data, bytes) else 'w'
+        with open(directory / name, mode, **({} if mode == 'wb' else {'encoding': 'utf-8'})) as file:
+            file.write(data)
+        return name
+
+
+@staff_member_required
+def profile_download(request, name):
+    """A profile stored with _profile_store=1."""
+    path = profiling_dir() / name
+    if not PROFILE_NAME.match(name) or not path.is_file():
+        raise Http404
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=name)
@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from common.database import database_config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -48,10 +51,14 @@ INSTALLED_APPS = [
     "crispy_bootstrap5",
     
     # Local apps
+    "common",
     "logistics",
 ]
 
 MIDDLEWARE = [
+    # First, so that the session/auth queries of the other middleware are counted too
+    "common.instrumentation.QueryInstrumentationMiddleware",
+    "common.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -60,6 +67,8 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "allauth.account.middleware.AccountMiddleware",
+    # Needs request.user; does nothing unless the request carries a profiling token
+    "common.profiling.ProfilingMiddleware",
 ]
 
 ROOT_URLCONF = "config.urls"
@@ -86,11 +95,9 @@ WSGI_APPLICATION = "config.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# DATABASE_URL (Postgres on Render), or the local SQLite file; see common/database.py
 DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "traffic_app.db",
-    }
+    "default": database_config(BASE_DIR / "traffic_app.db"),
 }
 
 
@@ -156,3 +163,51 @@ AUTHENTICATION_BACKENDS = [
     # `allauth` specific authentication methods, such as login by e-mail
     'allauth.account.auth_backends.AuthenticationBackend',
 ]
+
+# Django REST Framework
+REST_FRAMEWORK = {
+    "DEFAULT_AUTHENTICATION_CLASSES": [
+        "rest_framework.authentication.SessionAuthentication",
+        "rest_framework.authentication.BasicAuthentication",
+    ],
+    "DEFAULT_PERMISSION_CLASSES": [
+        "rest_framework.permissions.IsAuthenticated",
+    ],
+    "DEFAULT_RENDERER_CLASSES": [
+        "logistics.renderers.FastJSONRenderer",
+    ],
+    "DEFAULT_PAGINATION_CLASS": "logistics.pagination.IdCursorPagination",
+    "PAGE_SIZE": 100,
+}
+
+# SQL instrumentation (common.instrumentation): X-Query-Count and
+# Server-Timing headers, one log line per request, warning on repeated queries
+SQL_INSTRUMENTATION_HEADERS = True
+SQL_LOGGER = "logistics.sql"
+SQL_REPEATED_QUERY_THRESHOLD = 5
+
+# On-demand profiling (common.profiling): tokens from `manage.py profile_token`
+PROFILING_TOKEN_SALT = "logistics.profiling"
+PROFILING_TOKEN_MAX_AGE = 3600
+PROFILING_DIR = BASE_DIR / "profiles"
+
+# Metrics at /metrics (common.metrics). With several gunicorn workers, point
+# METRICS_DIR at a directory shared by them so /metrics adds up every worker
+METRICS_DIR = os.environ.get("METRICS_DIR") or None
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN") or None
+
+# SQLite (the default database) gets WAL and the other PRAGMAs of
+# common/database.py (override them with SQLITE_PRAGMAS); seconds between
+# PRAGMA optimize runs, None disables
+SQLITE_OPTIMIZE_INTERVAL = 3600
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "logistics.sql": {"handlers": ["console"], "level": "INFO", "propagate": False},
+    },
+}
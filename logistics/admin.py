@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Motorista, Veiculo, Viagem, Manutencao, Multa
+from .models import Motorista, Veiculo, Viagem, Manutencao, Multa, VeiculoEstatistica, MotoristaEstatistica
 
 
 @admin.register(Motorista)
@@ -38,3 +38,17 @@ class MultaAdmin(admin.ModelAdmin):
     search_fields = ['motorista__nome', 'veiculo__placa', 'local', 'tipo_infracao']
     list_filter = ['data', 'tipo_infracao', 'motorista', 'veiculo']
     date_hierarchy = 'data'
+
+
+@admin.register(VeiculoEstatistica)
+class VeiculoEstatisticaAdmin(admin.ModelAdmin):
+    list_display = ['veiculo', 'total_viagens', 'km_rodados', 'total_multas', 'valor_multas', 'total_manutencoes', 'ultima_manutencao_data']
+    search_fields = ['veiculo__placa']
+    list_select_related = ['veiculo']
+
+
+@admin.register(MotoristaEstatistica)
+class MotoristaEstatisticaAdmin(admin.ModelAdmin):
+    list_display = ['motorista', 'total_viagens', 'km_rodados', 'total_multas', 'valor_multas', 'ultima_viagem_data']
+    search_fields = ['motorista__nome']
+    list_select_related = ['motorista']
@@ -0,0 +1,202 @@
+"""
+REST API for the logistics models
+
+Every resource supports:
+- cursor pagination (?cursor=..., ?page_size=...)
+- sparse fieldsets (?fields=id,placa,km_atual), which also limit the
+  columns and joins of the query
+- bulk create: POST a JSON list to the list endpoint
+- bulk upsert: POST a JSON list to <resource>/upsert/
+"""
+import copy
+
+from django.db import IntegrityError, transaction
+from rest_framework import permissions, serializers, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from . import stats
+from .pagination import IdCursorPagination
+from .models import Motorista, Veiculo, Viagem, Manutencao, Multa
+from .serializers import (
+    MotoristaSerializer, VeiculoSerializer, ViagemSerializer,
+    ManutencaoSerializer, MultaSerializer,
+)
+
+BULK_BATCH_SIZE = 500
+
+
+class BulkModelViewSet(viewsets.ModelViewSet):
+    """
+    ModelViewSet with bulk create/upsert and sparse fieldsets.
+
+    upsert_fields is the natural key used to match existing rows (it must
+    have a unique constraint). When it is None, rows are matched by "id":
+    rows with an id update that record, rows without one are created.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = IdCursorPagination
+    upsert_fields = None
+
+    def get_requested_fields(self):
+        param = self.request.query_params.get('fields')
+        if not param:
+            return None
+        return [name.strip() for name in param.split(',') if name.strip()]
+
+    def get_serializer(self, *args, **kwargs):
+        if self.request.method == 'GET':
+            kwargs.setdefault('fields', self.get_requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        queryset = self.queryset.all()
+        if self.request.method != 'GET':
+            return queryset
+        select_related, only = self.get_serializer_class().projection(self.get_requested_fields())
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        return queryset.only(*only)
+
+    def create(self, request, *args, **kwargs):
+        if not isinstance(request.data, list):
+            return super().create(request, *args, **kwargs)
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        self.reject_duplicate_keys(serializer.validated_data)
+        model = self.queryset.model
+        objs = [model(**attrs) for attrs in serializer.validated_data]
+        try:
+            with transaction.atomic():
+                self.perform_bulk_create(objs)
+                # bulk_create skips the signals that maintain the statistics
+                stats.refresh(objs)
+        except IntegrityError as e:
+            raise serializers.ValidationError(str(e))
+        return Response(self.get_serializer(objs, many=True).data, status=status.HTTP_201_CREATED)
+
+    def reject_duplicate_keys(self, validated_data, unique_fields=None):
+        """400 when two rows of the payload share a unique value (the validators only check the table)."""
+        if unique_fields is None:
+            unique_fields = [
+                field.name for field in self.queryset.model._meta.concrete_fields
+                if field.unique and not field.primary_key
+            ]
+        errors = {}
+        for name in unique_fields:
+            seen = set()
+            for attrs in validated_data:
+                value = attrs.get(name)
+                if value is None:
+                    continue
+                if value in seen:
+                    errors.setdefault(name, []).append(f'Valor repetido na lista: {value}')
+                seen.add(value)
+        if errors:
+            raise serializers.ValidationError(errors)
+
+    def perform_bulk_create(self, objs):
+        self.queryset.model.objects.bulk_create(objs, batch_size=BULK_BATCH_SIZE)
+
+    @action(detail=False, methods=['post'])
+    def upsert(self, request, *args, **kwargs):
+        if not isinstance(request.data, list):
+            raise serializers.ValidationError('Envie uma lista de registros.')
+        serializer = self.get_serializer(
+            data=request.data, many=True,
+            context={**self.get_serializer_context(), 'upsert': True},
+        )
+        serializer.is_valid(raise_exception=True)
+        if self.upsert_fields:
+            # ON CONFLICT cannot update the same row twice in one statement
+            self.reject_duplicate_keys(serializer.validated_data)
+        try:
+            with transaction.atomic():
+                if self.upsert_fields:
+                    objs = self._upsert_natural_key(serializer.validated_data)
+                    stats.refresh(objs)
+                else:
+                    objs = self._upsert_by_id(request.data, serializer.validated_data)
+        except IntegrityError as e:
+            raise serializers.ValidationError(str(e))
+        return Response(self.get_serializer(objs, many=True).data)
+
+    def _upsert_natural_key(self, validated_data):
+        model = self.queryset.model
+        objs = [model(**attrs) for attrs in validated_data]
+        update_fields = sorted(
+            {name for attrs in validated_data for name in attrs} - set(self.upsert_fields)
+        )
+        model.objects.bulk_create(
+            objs,
+            batch_size=BULK_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=self.upsert_fields,
+            update_fields=update_fields,
+        )
+        return objs
+
+    def _upsert_by_id(self, raw_items, validated_data):
+        model = self.queryset.model
+        try:
+            ids = [None if item.get('id') is None else int(item['id']) for item in raw_items]
+        except (TypeError, ValueError):
+            raise serializers.ValidationError('O campo "id" deve ser um número inteiro.')
+        existing = model.objects.in_bulk([pk for pk in ids if pk is not None])
+        missing = [pk for pk in ids if pk is not None and pk not in existing]
+        if missing:
+            raise serializers.ValidationError(f'Registros não encontrados: {missing}')
+
+        # Rows moved to another vehicle/driver also change the old one's statistics
+        previous = [copy.copy(obj) for obj in existing.values()]
+        objs, to_create, to_update = [], [], []
+        for pk, attrs in zip(ids, validated_data):
+            if pk is None:
+                obj = model(**attrs)
+                to_create.append(obj)
+            else:
+                obj = existing[pk]
+                for name, value in attrs.items():
+                    setattr(obj, name, value)
+                to_update.append(obj)
+            objs.append(obj)
+
+        if to_create:
+            self.perform_bulk_create(to_create)
+        if to_update:
+            update_fields = sorted({name for attrs in validated_data for name in attrs})
+            model.objects.bulk_update(to_update, update_fields, batch_size=BULK_BATCH_SIZE)
+        stats.refresh(previous + objs)
+        return objs
+
+
+class MotoristaViewSet(BulkModelViewSet):
+    queryset = Motorista.objects.all()
+    serializer_class = MotoristaSerializer
+    upsert_fields = ['cpf']
+
+
+class VeiculoViewSet(BulkModelViewSet):
+    queryset = Veiculo.objects.all()
+    serializer_class = VeiculoSerializer
+    upsert_fields = ['placa']
+
+
+class ViagemViewSet(BulkModelViewSet):
+    queryset = Viagem.objects.all()
+    serializer_class = ViagemSerializer
+
+    def perform_bulk_create(self, objs):
+        super().perform_bulk_create(objs)
+        # bulk_create skips Viagem.save(), so update the odometers here
+        Viagem.apply_vehicle_km(objs)
+
+
+class ManutencaoViewSet(BulkModelViewSet):
+    queryset = Manutencao.objects.all()
+    serializer_class = ManutencaoSerializer
+
+
+class MultaViewSet(BulkModelViewSet):
+    queryset = Multa.objects.all()
+    serializer_class = MultaSerializer
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+
+from logistics import stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Recomputes the per-vehicle and per-driver statistics from trips, fines and '
+        'maintenances, reports the rows that had drifted and fixes them.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only report the drift, without fixing it (exits with status 1 if there is any)',
+        )
+        parser.add_argument(
+            '--verbose-drift', action='store_true',
+            help='Print every differing value instead of a summary per table',
+        )
+
+    def handle(self, *args, **options):
+        drift = stats.rebuild(fix=not options['check'])
+
+        total = 0
+        for table, rows in drift.items():
+            total += len(rows)
+            entities = {pk for pk, *_ in rows}
+            fields = sorted({field or '(missing row)' for _, field, _, _ in rows})
+            if not rows:
+                self.stdout.write(f'{table}: in sync')
+                continue
+            self.stdout.write(self.style.WARNING(
+                f'{table}: {len(rows)} value(s) drifted on {len(entities)} row(s) [{", ".join(fields)}]'
+            ))
+            if options['verbose_drift']:
+                for pk, field, stored, expected in rows:
+                    if field is None:
+                        self.stdout.write(f'  {pk}: stats row missing')
+                    else:
+                        self.stdout.write(f'  {pk}.{field}: {stored!r} -> {expected!r}')
+
+        if options['check']:
+            if total:
+                raise SystemExit(1)
+            self.stdout.write(self.style.SUCCESS('Statistics are in sync.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Statistics rebuilt ({total} value(s) fixed).'))
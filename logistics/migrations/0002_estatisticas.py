@@ -0,0 +1,49 @@
+# Generated by Django 5.0.14 on 2026-10-19 18:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MotoristaEstatistica',
+            fields=[
+                ('motorista', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='estatistica', serialize=False, to='logistics.motorista', verbose_name='Motorista')),
+                ('total_viagens', models.IntegerField(default=0, verbose_name='Viagens')),
+                ('km_rodados', models.FloatField(default=0, verbose_name='KM Rodados')),
+                ('ultima_viagem_data', models.DateField(blank=True, null=True, verbose_name='Última Viagem')),
+                ('total_multas', models.IntegerField(default=0, verbose_name='Multas')),
+                ('valor_multas', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Valor das Multas')),
+            ],
+            options={
+                'verbose_name': 'Estatística de Motorista',
+                'verbose_name_plural': 'Estatísticas de Motoristas',
+            },
+        ),
+        migrations.CreateModel(
+            name='VeiculoEstatistica',
+            fields=[
+                ('veiculo', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='estatistica', serialize=False, to='logistics.veiculo', verbose_name='Veículo')),
+                ('total_viagens', models.IntegerField(default=0, verbose_name='Viagens')),
+                ('km_rodados', models.FloatField(default=0, verbose_name='KM Rodados')),
+                ('ultima_viagem_data', models.DateField(blank=True, null=True, verbose_name='Última Viagem')),
+                ('total_multas', models.IntegerField(default=0, verbose_name='Multas')),
+                ('valor_multas', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Valor das Multas')),
+                ('total_manutencoes', models.IntegerField(default=0, verbose_name='Manutenções')),
+                ('valor_manutencoes', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Valor das Manutenções')),
+                ('ultima_manutencao_data', models.DateField(blank=True, null=True, verbose_name='Última Manutenção')),
+                ('ultima_manutencao_km', models.FloatField(blank=True, null=True, verbose_name='KM da Última Manutenção')),
+                ('proximo_servico_km', models.FloatField(blank=True, null=True, verbose_name='Próximo Serviço (KM)')),
+            ],
+            options={
+                'verbose_name': 'Estatística de Veículo',
+                'verbose_name_plural': 'Estatísticas de Veículos',
+            },
+        ),
+    ]
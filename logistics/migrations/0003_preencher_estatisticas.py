@@ -0,0 +1,71 @@
+from django.db import migrations
+from django.db.models import Count, Max, OuterRef, Subquery, Sum
+
+
+def _counters(queryset, key, **aggregates):
+    return {row.pop(key): row for row in queryset.values(key).annotate(**aggregates).order_by()}
+
+
+def preencher_estatisticas(apps, schema_editor):
+    # The stats tables start empty: compute them from the existing rows.
+    # A frozen copy of logistics.stats.expected_stats(), on the historical models
+    Motorista = apps.get_model('logistics', 'Motorista')
+    Veiculo = apps.get_model('logistics', 'Veiculo')
+    Viagem = apps.get_model('logistics', 'Viagem')
+    Manutencao = apps.get_model('logistics', 'Manutencao')
+    Multa = apps.get_model('logistics', 'Multa')
+    MotoristaEstatistica = apps.get_model('logistics', 'MotoristaEstatistica')
+    VeiculoEstatistica = apps.get_model('logistics', 'VeiculoEstatistica')
+
+    # Newest date, then newest row
+    latest = Manutencao.objects.filter(veiculo=OuterRef('pk')).order_by('-data', '-id')
+    veiculo_stats = {
+        row.pop('id'): {
+            'total_viagens': 0, 'km_rodados': 0, 'ultima_viagem_data': None,
+            'total_multas': 0, 'valor_multas': 0, 'total_manutencoes': 0, 'valor_manutencoes': 0,
+            **row,
+        }
+        for row in Veiculo.objects.annotate(
+            ultima_manutencao_data=Subquery(latest.values('data')[:1]),
+            ultima_manutencao_km=Subquery(latest.values('km_realizado')[:1]),
+            proximo_servico_km=Subquery(latest.values('proximo_servico_km')[:1]),
+        ).values('id', 'ultima_manutencao_data', 'ultima_manutencao_km', 'proximo_servico_km')
+    }
+    motorista_stats = {
+        pk: {'total_viagens': 0, 'km_rodados': 0, 'ultima_viagem_data': None, 'total_multas': 0, 'valor_multas': 0}
+        for pk in Motorista.objects.values_list('id', flat=True)
+    }
+
+    viagens = dict(total_viagens=Count('id'), km_rodados=Sum('distancia'), ultima_viagem_data=Max('data'))
+    multas = dict(total_multas=Count('id'), valor_multas=Sum('valor'))
+    manutencoes = dict(total_manutencoes=Count('id'), valor_manutencoes=Sum('valor'))
+    sources = [
+        (veiculo_stats, Viagem.objects.all(), 'veiculo_id', viagens),
+        (veiculo_stats, Multa.objects.all(), 'veiculo_id', multas),
+        (veiculo_stats, Manutencao.objects.all(), 'veiculo_id', manutencoes),
+        (motorista_stats, Viagem.objects.all(), 'motorista_id', viagens),
+        (motorista_stats, Multa.objects.all(), 'motorista_id', multas),
+    ]
+    for stats, queryset, key, aggregates in sources:
+        for pk, values in _counters(queryset, key, **aggregates).items():
+            stats[pk].update(values)
+
+    VeiculoEstatistica.objects.bulk_create(
+        [VeiculoEstatistica(pk=pk, **values) for pk, values in veiculo_stats.items()],
+        batch_size=500,
+    )
+    MotoristaEstatistica.objects.bulk_create(
+        [MotoristaEstatistica(pk=pk, **values) for pk, values in motorista_stats.items()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistics', '0002_estatisticas'),
+    ]
+
+    operations = [
+        migrations.RunPython(preencher_estatisticas, migrations.RunPython.noop),
+    ]
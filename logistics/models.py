@@ -1,8 +1,36 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 
 
+def maintenance_status(proximo_servico_km, km_atual):
+    """Return (is_due, message) for a vehicle at km_atual whose next service is at proximo_servico_km"""
+    if proximo_servico_km:
+        km_diff = proximo_servico_km - km_atual
+        if km_diff <= 0:
+            return True, f"⚠️ MANUTENÇÃO VENCIDA! O veículo atingiu {km_atual} km. Próxima revisão era aos {proximo_servico_km} km."
+        elif km_diff <= 1000:
+            return True, f"⚠️ Manutenção Próxima! Faltam {km_diff:.0f} km para a revisão."
+    return False, None
+
+
+class StatsTrackedModel(models.Model):
+    """
+    Base for the models that feed VeiculoEstatistica/MotoristaEstatistica.
+
+    The statistics are updated by the save/delete signals in logistics.signals;
+    saving inside a transaction keeps the row and its statistics consistent.
+    (delete() already runs its signals inside the deletion transaction.)
+    """
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
 class Motorista(models.Model):
     """Driver model"""
     nome = models.CharField(max_length=200, verbose_name="Nome")
@@ -36,7 +64,7 @@ class Veiculo(models.Model):
         return f"{self.placa} - {self.modelo}"
 
 
-class Viagem(models.Model):
+class Viagem(StatsTrackedModel):
     """Travel model"""
     data = models.DateField(verbose_name="Data")
     motorista = models.ForeignKey(Motorista, on_delete=models.PROTECT, verbose_name="Motorista")
@@ -58,18 +86,35 @@ class Viagem(models.Model):
     def save(self, *args, **kwargs):
         """Override save to update vehicle mileage"""
         is_new = self.pk is None
-        super().save(*args, **kwargs)
-        
-        if is_new:
-            # Update vehicle mileage when creating new travel
-            if self.km_atual:
-                self.veiculo.km_atual = self.km_atual
-            elif self.distancia > 0:
-                self.veiculo.km_atual += self.distancia
-            self.veiculo.save()
-
-
-class Manutencao(models.Model):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+            if is_new:
+                # Update vehicle mileage when creating new travel
+                if self.km_atual:
+                    self.veiculo.km_atual = self.km_atual
+                elif self.distancia > 0:
+                    self.veiculo.km_atual += self.distancia
+                self.veiculo.save()
+
+    @staticmethod
+    def apply_vehicle_km(viagens):
+        """
+        Apply the mileage update done by save() to a batch of new travels
+        (e.g. after bulk_create), with one query for all touched vehicles.
+        Travels are applied in the given order.
+        """
+        veiculos = Veiculo.objects.in_bulk({viagem.veiculo_id for viagem in viagens})
+        for viagem in viagens:
+            veiculo = veiculos[viagem.veiculo_id]
+            if viagem.km_atual:
+                veiculo.km_atual = viagem.km_atual
+            elif viagem.distancia > 0:
+                veiculo.km_atual += viagem.distancia
+        Veiculo.objects.bulk_update(veiculos.values(), ['km_atual'])
+
+
+class Manutencao(StatsTrackedModel):
     """Maintenance model"""
     TIPO_SERVICO_CHOICES = [
         ('Troca de Óleo', 'Troca de Óleo'),
@@ -101,16 +146,10 @@ class Manutencao(models.Model):
 
     def is_due(self):
         """Check if maintenance is due based on current vehicle mileage"""
-        if self.proximo_servico_km:
-            km_diff = self.proximo_servico_km - self.veiculo.km_atual
-            if km_diff <= 0:
-                return True, f"⚠️ MANUTENÇÃO VENCIDA! O veículo atingiu {self.veiculo.km_atual} km. Próxima revisão era aos {self.proximo_servico_km} km."
-            elif km_diff <= 1000:
-                return True, f"⚠️ Manutenção Próxima! Faltam {km_diff:.0f} km para a revisão."
-        return False, None
+        return maintenance_status(self.proximo_servico_km, self.veiculo.km_atual)
 
 
-class Multa(models.Model):
+class Multa(StatsTrackedModel):
     """Fine model"""
     TIPO_INFRACAO_CHOICES = [
         ('Excesso de Velocidade', 'Excesso de Velocidade'),
@@ -139,3 +178,52 @@ class Multa(models.Model):
 
     def __str__(self):
         return f"{self.data} - {self.tipo_infracao} - {self.motorista.nome}"
+
+
+class VeiculoEstatistica(models.Model):
+    """
+    Per-vehicle totals, kept up to date by logistics.signals.
+    Rebuild with: python manage.py reconcile_stats
+    """
+    veiculo = models.OneToOneField(Veiculo, on_delete=models.CASCADE, primary_key=True, related_name='estatistica', verbose_name="Veículo")
+    total_viagens = models.IntegerField(default=0, verbose_name="Viagens")
+    km_rodados = models.FloatField(default=0, verbose_name="KM Rodados")
+    ultima_viagem_data = models.DateField(null=True, blank=True, verbose_name="Última Viagem")
+    total_multas = models.IntegerField(default=0, verbose_name="Multas")
+    valor_multas = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Valor das Multas")
+    total_manutencoes = models.IntegerField(default=0, verbose_name="Manutenções")
+    valor_manutencoes = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Valor das Manutenções")
+    ultima_manutencao_data = models.DateField(null=True, blank=True, verbose_name="Última Manutenção")
+    ultima_manutencao_km = models.FloatField(null=True, blank=True, verbose_name="KM da Última Manutenção")
+    proximo_servico_km = models.FloatField(null=True, blank=True, verbose_name="Próximo Serviço (KM)")
+
+    class Meta:
+        verbose_name = "Estatística de Veículo"
+        verbose_name_plural = "Estatísticas de Veículos"
+
+    def __str__(self):
+        return f"Estatísticas de {self.veiculo_id}"
+
+    def maintenance_status(self):
+        """Same as Manutencao.is_due() for the latest maintenance, without loading it"""
+        return maintenance_status(self.proximo_servico_km, self.veiculo.km_atual)
+
+
+class MotoristaEstatistica(models.Model):
+    """
+    Per-driver totals, kept up to date by logistics.signals.
+    Rebuild with: python manage.py reconcile_stats
+    """
+    motorista = models.OneToOneField(Motorista, on_delete=models.CASCADE, primary_key=True, related_name='estatistica', verbose_name="Motorista")
+    total_viagens = models.IntegerField(default=0, verbose_name="Viagens")
+    km_rodados = models.FloatField(default=0, verbose_name="KM Rodados")
+    ultima_viagem_data = models.DateField(null=True, blank=True, verbose_name="Última Viagem")
+    total_multas = models.IntegerField(default=0, verbose_name="Multas")
+    valor_multas = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Valor das Multas")
+
+    class Meta:
+        verbose_name = "Estatística de Motorista"
+        verbose_name_plural = "Estatísticas de Motoristas"
+
+    def __str__(self):
+        return f"Estatísticas de {self.motorista_id}"
@@ -0,0 +1,12 @@
+"""
+REST API pagination
+"""
+from rest_framework.pagination import CursorPagination
+
+
+class IdCursorPagination(CursorPagination):
+    """Cursor pagination on the primary key (newest first)."""
+    ordering = '-id'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
@@ -11,9 +11,15 @@ from reportlab.lib.units import inch
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 from reportlab.lib.enums import TA_CENTER, TA_LEFT
 from datetime import datetime
+from common.metrics import observe_report
 from .models import Motorista, Veiculo, Multa, Manutencao, Viagem
 
+# Rows read per round trip (through a server-side cursor on PostgreSQL), so
+# the model instances of a report are never all in memory at once
+REPORT_CHUNK_SIZE = 2000
 
+
+@observe_report('motoristas')
 def generate_motoristas_pdf():
     """Generate PDF report for all drivers"""
     # Create buffer
@@ -41,7 +47,7 @@ def generate_motoristas_pdf():
     elements.append(Spacer(1, 0.2*inch))
     
     # Get data
-    motoristas = Motorista.objects.all().order_by('nome')
+    motoristas = Motorista.objects.all().order_by('nome').iterator(chunk_size=REPORT_CHUNK_SIZE)
     
     # Table data
     data = [['Nome', 'CPF', 'CNH', 'Validade CNH']]
@@ -113,6 +119,7 @@ def generate_motoristas_pdf():
     return response
 
 
+@observe_report('veiculos')
 def generate_veiculos_pdf():
     """Generate PDF report for all vehicles"""
     buffer = BytesIO()
@@ -134,7 +141,7 @@ def generate_veiculos_pdf():
     elements.append(title)
     elements.append(Spacer(1, 0.2*inch))
     
-    veiculos = Veiculo.objects.all().order_by('placa')
+    veiculos = Veiculo.objects.all().order_by('placa').iterator(chunk_size=REPORT_CHUNK_SIZE)
     
     data = [['Placa', 'Modelo', 'Ano', 'RENAVAM', 'KM Atual']]
     
@@ -196,6 +203,7 @@ def generate_veiculos_pdf():
     return response
 
 
+@observe_report('multas')
 def generate_multas_pdf():
     """Generate PDF report for all fines"""
     buffer = BytesIO()
@@ -217,7 +225,7 @@ def generate_multas_pdf():
     elements.append(title)
     elements.append(Spacer(1, 0.2*inch))
     
-    multas = Multa.objects.select_related('motorista', 'veiculo').all().order_by('-data')
+    multas = Multa.objects.select_related('motorista', 'veiculo').all().order_by('-data').iterator(chunk_size=REPORT_CHUNK_SIZE)
     
     data = [['Data', 'Motorista', 'Veículo', 'Infração', 'Local', 'Valor']]
     
@@ -284,6 +292,7 @@ def generate_multas_pdf():
     return response
 
 
+@observe_report('manutencoes')
 def generate_manutencoes_pdf():
     """Generate PDF report for all maintenance records"""
     buffer = BytesIO()
@@ -305,7 +314,7 @@ def generate_manutencoes_pdf():
     elements.append(title)
     elements.append(Spacer(1, 0.2*inch))
     
-    manutencoes = Manutencao.objects.select_related('veiculo').all().order_by('-data')
+    manutencoes = Manutencao.objects.select_related('veiculo').all().order_by('-data').iterator(chunk_size=REPORT_CHUNK_SIZE)
     
     data = [['Data', 'Veículo', 'Tipo de Serviço', 'Descrição', 'Valor', 'KM Realizado']]
     
@@ -368,6 +377,7 @@ def generate_manutencoes_pdf():
     return response
 
 
+@observe_report('viagens')
 def generate_viagens_pdf():
     """Generate PDF report for all travels"""
     buffer = BytesIO()
@@ -389,7 +399,7 @@ def generate_viagens_pdf():
     elements.append(title)
     elements.append(Spacer(1, 0.2*inch))
     
-    viagens = Viagem.objects.select_related('motorista', 'veiculo').all().order_by('-data')
+    viagens = Viagem.objects.select_related('motorista', 'veiculo').all().order_by('-data').iterator(chunk_size=REPORT_CHUNK_SIZE)
     
     data = [['Data', 'Motorista', 'Veículo', 'Origem', 'Destino', 'Distância']]
     
@@ -0,0 +1,91 @@
+"""
+REST API serializers for the logistics models
+"""
+from rest_framework import serializers
+from rest_framework.validators import UniqueValidator
+from .models import Motorista, Veiculo, Viagem, Manutencao, Multa
+
+
+class ProjectedModelSerializer(serializers.ModelSerializer):
+    """
+    ModelSerializer with sparse fieldsets.
+
+    Pass fields=[...] to keep only those fields. projection() tells the view
+    which relations to join and which columns to load for a set of fields,
+    so a request for ?fields=id,placa only reads those columns.
+    """
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        if self.context.get('upsert'):
+            # Existing natural keys are expected in an upsert payload
+            for field in self.fields.values():
+                field.validators = [
+                    v for v in field.validators if not isinstance(v, UniqueValidator)
+                ]
+
+    @classmethod
+    def projection(cls, fields=None):
+        """Return (select_related, only) for the given field names."""
+        select_related, only = set(), {'id'}
+        for field in cls(fields=fields).fields.values():
+            if field.source == '*':
+                continue
+            path = field.source.split('.')
+            for depth in range(1, len(path)):
+                # The foreign key itself must be loaded to be traversed
+                select_related.add('__'.join(path[:depth]))
+                only.add('__'.join(path[:depth]))
+            only.add('__'.join(path))
+        return sorted(select_related), sorted(only)
+
+
+class MotoristaSerializer(ProjectedModelSerializer):
+    class Meta:
+        model = Motorista
+        fields = ['id', 'nome', 'cpf', 'cnh', 'validade_cnh']
+
+
+class VeiculoSerializer(ProjectedModelSerializer):
+    class Meta:
+        model = Veiculo
+        fields = ['id', 'placa', 'modelo', 'ano', 'renavam', 'km_atual']
+
+
+class ViagemSerializer(ProjectedModelSerializer):
+    motorista_nome = serializers.CharField(source='motorista.nome', read_only=True)
+    veiculo_placa = serializers.CharField(source='veiculo.placa', read_only=True)
+
+    class Meta:
+        model = Viagem
+        fields = [
+            'id', 'data', 'hora_saida', 'motorista', 'motorista_nome', 'veiculo',
+            'veiculo_placa', 'origem', 'destino', 'distancia', 'km_atual',
+        ]
+
+
+class ManutencaoSerializer(ProjectedModelSerializer):
+    veiculo_placa = serializers.CharField(source='veiculo.placa', read_only=True)
+
+    class Meta:
+        model = Manutencao
+        fields = [
+            'id', 'veiculo', 'veiculo_placa', 'data', 'tipo_servico', 'descricao',
+            'km_realizado', 'proximo_servico_km', 'proximo_servico_data', 'valor',
+        ]
+
+
+class MultaSerializer(ProjectedModelSerializer):
+    motorista_nome = serializers.CharField(source='motorista.nome', read_only=True)
+    veiculo_placa = serializers.CharField(source='veiculo.placa', read_only=True)
+
+    class Meta:
+        model = Multa
+        fields = [
+            'id', 'data', 'hora_infracao', 'local', 'tipo_infracao', 'descricao',
+            'motorista', 'motorista_nome', 'veiculo', 'veiculo_placa', 'valor', 'viagem',
+        ]
@@ -0,0 +1,126 @@
+"""
+Keep VeiculoEstatistica/MotoristaEstatistica in step with trips, fines and
+maintenances (see logistics.stats). Each handler applies F() deltas, so
+concurrent saves never overwrite each other's counts.
+"""
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from . import stats
+from .models import (
+    Motorista, Veiculo, Viagem, Manutencao, Multa,
+    MotoristaEstatistica, VeiculoEstatistica,
+)
+
+# Fields whose change affects the statistics, per model
+TRACKED_FIELDS = {
+    Viagem: ['veiculo_id', 'motorista_id', 'distancia', 'data'],
+    Multa: ['veiculo_id', 'motorista_id', 'valor'],
+    Manutencao: ['veiculo_id', 'valor', 'data', 'km_realizado', 'proximo_servico_km'],
+}
+
+
+def _viagem_delta(values, sign):
+    stats.add(VeiculoEstatistica, values['veiculo_id'], total_viagens=sign, km_rodados=sign * values['distancia'])
+    stats.add(MotoristaEstatistica, values['motorista_id'], total_viagens=sign, km_rodados=sign * values['distancia'])
+
+
+def _multa_delta(values, sign):
+    stats.add(VeiculoEstatistica, values['veiculo_id'], total_multas=sign, valor_multas=sign * values['valor'])
+    stats.add(MotoristaEstatistica, values['motorista_id'], total_multas=sign, valor_multas=sign * values['valor'])
+
+
+def _manutencao_delta(values, sign):
+    stats.add(VeiculoEstatistica, values['veiculo_id'], total_manutencoes=sign, valor_manutencoes=sign * values['valor'])
+
+
+@receiver(post_save, sender=Veiculo)
+def create_veiculo_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        VeiculoEstatistica.objects.get_or_create(veiculo=instance)
+
+
+@receiver(post_save, sender=Motorista)
+def create_motorista_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        MotoristaEstatistica.objects.get_or_create(motorista=instance)
+
+
+@receiver(pre_save, sender=Viagem)
+@receiver(pre_save, sender=Multa)
+@receiver(pre_save, sender=Manutencao)
+def remember_previous_values(sender, instance, raw=False, **kwargs):
+    """Load the stored values of an updated row, to undo its old contribution."""
+    instance._stats_previous = None
+    if instance.pk is not None and not raw:
+        instance._stats_previous = sender.objects.filter(pk=instance.pk).values(*TRACKED_FIELDS[sender]).first()
+
+
+def _changed(sender, instance):
+    """True when an update changed any tracked field."""
+    previous = instance._stats_previous
+    return any(previous[field] != getattr(instance, field) for field in TRACKED_FIELDS[sender])
+
+
+def _current(sender, instance):
+    return {field: getattr(instance, field) for field in TRACKED_FIELDS[sender]}
+
+
+@receiver(post_save, sender=Viagem)
+def viagem_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = instance._stats_previous
+    if previous is None:
+        _viagem_delta(_current(sender, instance), 1)
+        stats.bump_ultima_viagem(instance.veiculo_id, instance.motorista_id, instance.data)
+    elif _changed(sender, instance):
+        _viagem_delta(previous, -1)
+        _viagem_delta(_current(sender, instance), 1)
+        stats.refresh_ultima_viagem(
+            {previous['veiculo_id'], instance.veiculo_id},
+            {previous['motorista_id'], instance.motorista_id},
+        )
+
+
+@receiver(post_delete, sender=Viagem)
+def viagem_deleted(sender, instance, **kwargs):
+    _viagem_delta(_current(sender, instance), -1)
+    stats.refresh_ultima_viagem({instance.veiculo_id}, {instance.motorista_id})
+
+
+@receiver(post_save, sender=Multa)
+def multa_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = instance._stats_previous
+    if previous is None:
+        _multa_delta(_current(sender, instance), 1)
+    elif _changed(sender, instance):
+        _multa_delta(previous, -1)
+        _multa_delta(_current(sender, instance), 1)
+
+
+@receiver(post_delete, sender=Multa)
+def multa_deleted(sender, instance, **kwargs):
+    _multa_delta(_current(sender, instance), -1)
+
+
+@receiver(post_save, sender=Manutencao)
+def manutencao_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = instance._stats_previous
+    if previous is None:
+        _manutencao_delta(_current(sender, instance), 1)
+        stats.bump_ultima_manutencao(instance)
+    elif _changed(sender, instance):
+        _manutencao_delta(previous, -1)
+        _manutencao_delta(_current(sender, instance), 1)
+        stats.refresh_ultima_manutencao({previous['veiculo_id'], instance.veiculo_id})
+
+
+@receiver(post_delete, sender=Manutencao)
+def manutencao_deleted(sender, instance, **kwargs):
+    _manutencao_delta(_current(sender, instance), -1)
+    stats.refresh_ultima_manutencao({instance.veiculo_id})
@@ -0,0 +1,210 @@
+"""
+Denormalized per-vehicle and per-driver statistics
+
+VeiculoEstatistica and MotoristaEstatistica hold the totals that lists,
+dashboards and reports show, so those pages read one row per entity
+instead of aggregating trips, fines and maintenances on every request.
+
+Counters are changed with F() deltas by the signals in logistics.signals,
+inside the transaction of the save/delete that caused them. Writes that skip
+signals (bulk_create, bulk_update, queryset.update) must call refresh() for
+the entities they touched. rebuild() recomputes everything from scratch and
+reports the drift it fixed (see the reconcile_stats command; migration 0003
+fills the tables when they are created, with its own copy of this logic).
+"""
+import math
+
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery, Sum
+
+from .models import (
+    Motorista, Veiculo, Viagem, Manutencao, Multa,
+    MotoristaEstatistica, VeiculoEstatistica,
+)
+
+VEICULO_FIELDS = [
+    'total_viagens', 'km_rodados', 'ultima_viagem_data', 'total_multas', 'valor_multas',
+    'total_manutencoes', 'valor_manutencoes', 'ultima_manutencao_data',
+    'ultima_manutencao_km', 'proximo_servico_km',
+]
+MOTORISTA_FIELDS = ['total_viagens', 'km_rodados', 'ultima_viagem_data', 'total_multas', 'valor_multas']
+
+
+def add(stats_model, pk, **deltas):
+    """Add deltas to the counters of one stats row, creating the row if needed."""
+    updates = {name: F(name) + value for name, value in deltas.items() if value}
+    if not updates or pk is None:
+        return
+    if not stats_model.objects.filter(pk=pk).update(**updates):
+        stats_model.objects.get_or_create(pk=pk)
+        stats_model.objects.filter(pk=pk).update(**updates)
+
+
+def bump_ultima_viagem(veiculo_id, motorista_id, data):
+    """Move the last trip date forward if data is newer (rows must exist)."""
+    newer = Q(ultima_viagem_data__isnull=True) | Q(ultima_viagem_data__lt=data)
+    VeiculoEstatistica.objects.filter(newer, pk=veiculo_id).update(ultima_viagem_data=data)
+    MotoristaEstatistica.objects.filter(newer, pk=motorista_id).update(ultima_viagem_data=data)
+
+
+def bump_ultima_manutencao(manutencao):
+    """Make manutencao the vehicle's last maintenance if it is the most recent (row must exist)."""
+    newer = Q(ultima_manutencao_data__isnull=True) | Q(ultima_manutencao_data__lte=manutencao.data)
+    VeiculoEstatistica.objects.filter(newer, pk=manutencao.veiculo_id).update(
+        ultima_manutencao_data=manutencao.data,
+        ultima_manutencao_km=manutencao.km_realizado,
+        proximo_servico_km=manutencao.proximo_servico_km,
+    )
+
+
+def _latest_viagem(key):
+    return Viagem.objects.filter(**{key: OuterRef('pk')}).order_by('-data').values('data')[:1]
+
+
+def _latest_manutencao():
+    # Newest date, then newest row: the same pick as bump_ultima_manutencao()
+    return Manutencao.objects.filter(veiculo=OuterRef('pk')).order_by('-data', '-id')
+
+
+def refresh_ultima_viagem(veiculo_ids, motorista_ids):
+    """Recompute the last trip date of some vehicles/drivers (after an edit or delete)."""
+    VeiculoEstatistica.objects.filter(pk__in=veiculo_ids).update(
+        ultima_viagem_data=Subquery(_latest_viagem('veiculo_id'))
+    )
+    MotoristaEstatistica.objects.filter(pk__in=motorista_ids).update(
+        ultima_viagem_data=Subquery(_latest_viagem('motorista_id'))
+    )
+
+
+def refresh_ultima_manutencao(veiculo_ids):
+    """Recompute the last maintenance of some vehicles (after an edit or delete)."""
+    latest = _latest_manutencao()
+    VeiculoEstatistica.objects.filter(pk__in=veiculo_ids).update(
+        ultima_manutencao_data=Subquery(latest.values('data')[:1]),
+        ultima_manutencao_km=Subquery(latest.values('km_realizado')[:1]),
+        proximo_servico_km=Subquery(latest.values('proximo_servico_km')[:1]),
+    )
+
+
+def _counters(queryset, key, **aggregates):
+    return {row.pop(key): row for row in queryset.values(key).annotate(**aggregates).order_by()}
+
+
+def expected_stats(veiculo_ids=None, motorista_ids=None):
+    """
+    Compute the statistics from the source tables.
+
+    :param veiculo_ids: Limit to these vehicles (None: all of them)
+    :param motorista_ids: Limit to these drivers (None: all of them)
+    :return: ({veiculo_id: {field: value}}, {motorista_id: {field: value}})
+    """
+    veiculos = Veiculo.objects.all()
+    motoristas = Motorista.objects.all()
+    if veiculo_ids is not None:
+        veiculos = veiculos.filter(pk__in=veiculo_ids)
+    if motorista_ids is not None:
+        motoristas = motoristas.filter(pk__in=motorista_ids)
+
+    latest = _latest_manutencao()
+    veiculo_stats = {
+        row.pop('id'): {
+            'total_viagens': 0, 'km_rodados': 0, 'ultima_viagem_data': None,
+            'total_multas': 0, 'valor_multas': 0, 'total_manutencoes': 0, 'valor_manutencoes': 0,
+            **row,
+        }
+        for row in veiculos.annotate(
+            ultima_manutencao_data=Subquery(latest.values('data')[:1]),
+            ultima_manutencao_km=Subquery(latest.values('km_realizado')[:1]),
+            proximo_servico_km=Subquery(latest.values('proximo_servico_km')[:1]),
+        ).values('id', 'ultima_manutencao_data', 'ultima_manutencao_km', 'proximo_servico_km')
+    }
+    motorista_stats = {
+        pk: {'total_viagens': 0, 'km_rodados': 0, 'ultima_viagem_data': None, 'total_multas': 0, 'valor_multas': 0}
+        for pk in motoristas.values_list('id', flat=True)
+    }
+
+    viagens = dict(total_viagens=Count('id'), km_rodados=Sum('distancia'), ultima_viagem_data=Max('data'))
+    multas = dict(total_multas=Count('id'), valor_multas=Sum('valor'))
+    manutencoes = dict(total_manutencoes=Count('id'), valor_manutencoes=Sum('valor'))
+    sources = [
+        (veiculo_stats, Viagem.objects.filter(veiculo__in=veiculos), 'veiculo_id', viagens),
+        (veiculo_stats, Multa.objects.filter(veiculo__in=veiculos), 'veiculo_id', multas),
+        (veiculo_stats, Manutencao.objects.filter(veiculo__in=veiculos), 'veiculo_id', manutencoes),
+        (motorista_stats, Viagem.objects.filter(motorista__in=motoristas), 'motorista_id', viagens),
+        (motorista_stats, Multa.objects.filter(motorista__in=motoristas), 'motorista_id', multas),
+    ]
+    for stats, queryset, key, aggregates in sources:
+        for pk, values in _counters(queryset, key, **aggregates).items():
+            stats[pk].update(values)
+    return veiculo_stats, motorista_stats
+
+
+def _same(stored, expected):
+    if isinstance(stored, float) or isinstance(expected, float):
+        if stored is None or expected is None:
+            return stored is expected
+        # F() deltas and SUM() add floats in a different order
+        return math.isclose(stored, expected, rel_tol=1e-9, abs_tol=1e-6)
+    return stored == expected
+
+
+def _sync(stats_model, fields, expected, fix):
+    drift = []
+    stored = stats_model.objects.in_bulk(list(expected))
+    missing, changed = [], []
+    for pk, values in expected.items():
+        obj = stored.get(pk)
+        if obj is None:
+            missing.append(stats_model(pk=pk, **values))
+            drift.append((pk, None, None, None))
+            continue
+        dirty = False
+        for field in fields:
+            if not _same(getattr(obj, field), values[field]):
+                drift.append((pk, field, getattr(obj, field), values[field]))
+                setattr(obj, field, values[field])
+                dirty = True
+        if dirty:
+            changed.append(obj)
+    if fix:
+        stats_model.objects.bulk_create(missing, batch_size=500)
+        stats_model.objects.bulk_update(changed, fields, batch_size=500)
+    return drift
+
+
+def rebuild(veiculo_ids=None, motorista_ids=None, fix=True):
+    """
+    Recompute the statistics and compare them with the stored rows.
+
+    :param fix: Write the recomputed values (False only reports the drift)
+    :return: {'veiculos': [...], 'motoristas': [...]} with one
+        (pk, field, stored, expected) tuple per differing value;
+        field is None when the stats row was missing
+    """
+    with transaction.atomic():
+        veiculo_stats, motorista_stats = expected_stats(veiculo_ids, motorista_ids)
+        return {
+            'veiculos': _sync(VeiculoEstatistica, VEICULO_FIELDS, veiculo_stats, fix),
+            'motoristas': _sync(MotoristaEstatistica, MOTORISTA_FIELDS, motorista_stats, fix),
+        }
+
+
+def refresh(objs):
+    """
+    Recompute the statistics of the vehicles/drivers referenced by objs,
+    after writes that skip the signals (bulk_create, bulk_update).
+    objs may be vehicles and drivers themselves or rows pointing at them.
+    """
+    veiculo_ids, motorista_ids = set(), set()
+    for obj in objs:
+        if isinstance(obj, Veiculo):
+            veiculo_ids.add(obj.pk)
+        elif isinstance(obj, Motorista):
+            motorista_ids.add(obj.pk)
+        else:
+            veiculo_ids.add(getattr(obj, 'veiculo_id', None))
+            motorista_ids.add(getattr(obj, 'motorista_id', None))
+    veiculo_ids.discard(None)
+    motorista_ids.discard(None)
+    if veiculo_ids or motorista_ids:
+        rebuild(veiculo_ids, motorista_ids)
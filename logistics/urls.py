@@ -1,5 +1,15 @@
-from django.urls import path
-from . import views
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+from common import metrics, profiling
+
+from . import views, api
+
+router = DefaultRouter()
+router.register('motoristas', api.MotoristaViewSet)
+router.register('veiculos', api.VeiculoViewSet)
+router.register('viagens', api.ViagemViewSet)
+router.register('manutencoes', api.ManutencaoViewSet)
+router.register('multas', api.MultaViewSet)
 
 urlpatterns = [
     # Authentication
@@ -52,5 +62,14 @@ urlpatterns = [
     # Import
     path('viagens/importar/', views.ImportTravelView.as_view(), name='viagem_import'),
     path('viagens/modelo/', views.DownloadTravelTemplateView.as_view(), name='viagem_download_template'),
+    
+    # REST API
+    path('api/', include(router.urls)),
+
+    # Profiles stored with ?_profile_store=1
+    path('perfis/<str:name>/', profiling.profile_download, name='profile_download'),
+
+    # Prometheus metrics
+    path('metrics', metrics.metrics_view, name='metrics'),
 ]
 
@@ -2,11 +2,13 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login, logout, authenticate
 from django.contrib import messages
-from django.db.models import Sum, Count, Q, Max
+from django.db.models import Sum, Q, Max, F
 from django.utils import timezone
 from datetime import timedelta
-from .models import Motorista, Veiculo, Viagem, Manutencao, Multa
+from .models import Motorista, Veiculo, Viagem, Manutencao, Multa, VeiculoEstatistica, MotoristaEstatistica
 from .forms import MotoristaForm, VeiculoForm, ViagemForm, ManutencaoForm, MultaForm
+from common import metrics
+
 from . import reports
 
 
@@ -54,22 +56,23 @@ def dashboard_view(request):
     recent_viagens = Viagem.objects.select_related('motorista', 'veiculo').order_by('-data', '-hora_saida')[:5]
     recent_multas = Multa.objects.select_related('motorista', 'veiculo').order_by('-data')[:5]
     
-    # Get maintenance alerts
+    # Get maintenance alerts (the last maintenance of each vehicle is kept in its statistics)
     manutencoes_pendentes = []
-    veiculos = Veiculo.objects.all()
-    for veiculo in veiculos:
-        ultima_manutencao = Manutencao.objects.filter(veiculo=veiculo).order_by('-data').first()
-        if ultima_manutencao:
-            is_due, message = ultima_manutencao.is_due()
-            if is_due:
-                manutencoes_pendentes.append({
-                    'veiculo': veiculo,
-                    'message': message,
-                    'manutencao': ultima_manutencao
-                })
+    estatisticas = VeiculoEstatistica.objects.select_related('veiculo').filter(
+        proximo_servico_km__isnull=False,
+        proximo_servico_km__lte=F('veiculo__km_atual') + 1000,
+    )
+    for estatistica in estatisticas:
+        is_due, message = estatistica.maintenance_status()
+        if is_due:
+            manutencoes_pendentes.append({
+                'veiculo': estatistica.veiculo,
+                'message': message,
+                'estatistica': estatistica
+            })
     
     # Calculate total fines value
-    total_multas_valor = Multa.objects.aggregate(total=Sum('valor'))['total'] or 0
+    total_multas_valor = MotoristaEstatistica.objects.aggregate(total=Sum('valor_multas'))['total'] or 0
     
     context = {
         'total_motoristas': total_motoristas,
@@ -89,7 +92,7 @@ def dashboard_view(request):
 @login_required
 def motorista_list(request):
     """List all drivers"""
-    motoristas = Motorista.objects.all()
+    motoristas = Motorista.objects.select_related('estatistica')
     return render(request, 'logistics/motorista_list.html', {'motoristas': motoristas})
 
 
@@ -142,7 +145,7 @@ def motorista_delete(request, pk):
 @login_required
 def veiculo_list(request):
     """List all vehicles"""
-    veiculos = Veiculo.objects.all()
+    veiculos = Veiculo.objects.select_related('estatistica')
     return render(request, 'logistics/veiculo_list.html', {'veiculos': veiculos})
 
 
@@ -354,28 +357,33 @@ def multa_delete(request, pk):
 @login_required
 def reports_view(request):
     """Generate reports and statistics"""
+    # Totals come from the denormalized statistics: no GROUP BY over the records
     # Multas por motorista
-    multas_por_motorista = Multa.objects.values('motorista__nome').annotate(
-        total=Count('id'),
-        valor_total=Sum('valor')
+    multas_por_motorista = MotoristaEstatistica.objects.filter(total_multas__gt=0).values(
+        'motorista__nome',
+        total=F('total_multas'),
+        valor_total=F('valor_multas')
     ).order_by('-total')
     
     # Multas por veículo
-    multas_por_veiculo = Multa.objects.values('veiculo__placa').annotate(
-        total=Count('id'),
-        valor_total=Sum('valor')
+    multas_por_veiculo = VeiculoEstatistica.objects.filter(total_multas__gt=0).values(
+        'veiculo__placa',
+        total=F('total_multas'),
+        valor_total=F('valor_multas')
     ).order_by('-total')
     
     # Viagens por motorista
-    viagens_por_motorista = Viagem.objects.values('motorista__nome').annotate(
-        total=Count('id'),
-        distancia_total=Sum('distancia')
+    viagens_por_motorista = MotoristaEstatistica.objects.filter(total_viagens__gt=0).values(
+        'motorista__nome',
+        total=F('total_viagens'),
+        distancia_total=F('km_rodados')
     ).order_by('-total')
     
     # Manutenções por veículo
-    manutencoes_por_veiculo = Manutencao.objects.values('veiculo__placa').annotate(
-        total=Count('id'),
-        valor_total=Sum('valor')
+    manutencoes_por_veiculo = VeiculoEstatistica.objects.filter(total_manutencoes__gt=0).values(
+        'veiculo__placa',
+        total=F('total_manutencoes'),
+        valor_total=F('valor_manutencoes')
     ).order_by('-total')
     
     context = {
@@ -420,6 +428,8 @@ def viagem_pdf(request):
 
 
 # Excel Import
+import time
+
 import openpyxl
 from django.http import HttpResponse
 from django.views import View
@@ -460,6 +470,7 @@ class ImportTravelView(FormView):
     
     def form_valid(self, form):
         excel_file = form.cleaned_data['arquivo_excel']
+        started = time.perf_counter()
         try:
             wb = openpyxl.load_workbook(excel_file)
             ws = wb.active
@@ -515,6 +526,7 @@ class ImportTravelView(FormView):
                 except Exception as e:
                     errors.append(f"Linha {row_idx}: Erro - {str(e)}")
             
+            metrics.observe_import(created_count, len(errors), time.perf_counter() - started)
             if created_count > 0:
                 messages.success(self.request, f"{created_count} viagens importadas com sucesso!")
             
@@ -525,6 +537,7 @@ class ImportTravelView(FormView):
                     messages.warning(self.request, f"E mais {len(errors)-5} erros.")
                     
         except Exception as e:
+            metrics.IMPORT_FILES.inc(result='failed')
             messages.error(self.request, f"Erro ao ler arquivo: {str(e)}")
             return self.form_invalid(form)
             
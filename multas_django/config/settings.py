@@ -1,9 +1,16 @@
 from pathlib import Path
 import os
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# The modules shared with the logistics project (common/) are in the repository root
+if str(BASE_DIR.parent) not in sys.path:
+    sys.path.append(str(BASE_DIR.parent))
+
+from common.database import database_config
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/4.2/howto/deployment/checklist/
 
@@ -30,10 +37,14 @@ INSTALLED_APPS = [
     'crispy_bootstrap5',
     
     # Local apps
+    'common',
     'core',
 ]
 
 MIDDLEWARE = [
+    # First, so that the session/auth queries of the other middleware are counted too
+    'common.instrumentation.QueryInstrumentationMiddleware',
+    'common.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -41,6 +52,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Needs request.user; does nothing unless the request carries a profiling token
+    'common.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -66,11 +79,9 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# DATABASE_URL, or the local SQLite file; see common/database.py
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_config(BASE_DIR / 'db.sqlite3'),
 }
 
 # Password validation
@@ -124,3 +135,35 @@ CRISPY_TEMPLATE_PACK = "bootstrap5"
 LOGIN_REDIRECT_URL = 'dashboard'
 LOGOUT_REDIRECT_URL = 'login'
 LOGIN_URL = 'login'
+
+# SQL instrumentation (common.instrumentation): X-Query-Count and
+# Server-Timing headers, one log line per request, warning on repeated queries
+SQL_INSTRUMENTATION_HEADERS = True
+SQL_LOGGER = 'core.sql'
+SQL_REPEATED_QUERY_THRESHOLD = 5
+
+# On-demand profiling (common.profiling): tokens from `manage.py profile_token`
+PROFILING_TOKEN_SALT = 'core.profiling'
+PROFILING_TOKEN_MAX_AGE = 3600
+PROFILING_DIR = BASE_DIR / 'profiles'
+
+# Metrics at /metrics (common.metrics, core.metrics). With several gunicorn workers, or with the
+# WhatsApp monitor, point METRICS_DIR at a directory shared by the processes
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
+
+# SQLite (the default database) gets WAL and the other PRAGMAs of
+# common/database.py (override them with SQLITE_PRAGMAS); seconds between
+# PRAGMA optimize runs, None disables
+SQLITE_OPTIMIZE_INTERVAL = 3600
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.sql': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
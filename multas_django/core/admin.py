@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Motorista, Veiculo, Viagem, Multa, Manutencao
+from .models import Motorista, Veiculo, Viagem, Multa, Manutencao, ViagemPendente
 
 @admin.register(Motorista)
 class MotoristaAdmin(admin.ModelAdmin):
@@ -25,3 +25,10 @@ class MultaAdmin(admin.ModelAdmin):
 class ManutencaoAdmin(admin.ModelAdmin):
     list_display = ('data', 'tipo_servico', 'veiculo', 'valor')
     list_filter = ('tipo_servico', 'veiculo')
+
+@admin.register(ViagemPendente)
+class ViagemPendenteAdmin(admin.ModelAdmin):
+    list_display = ('recebido_em', 'nome', 'placa', 'destino', 'km_inicial', 'km_final', 'motivo', 'resolvida')
+    list_filter = ('resolvida', 'motivo')
+    search_fields = ('nome', 'placa', 'texto')
+    list_editable = ('resolvida',)
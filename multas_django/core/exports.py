@@ -0,0 +1,84 @@
+import csv
+import tempfile
+from datetime import date, time
+from decimal import Decimal
+
+from django.http import FileResponse, StreamingHttpResponse
+from openpyxl import Workbook
+
+# Rows fetched from the database per round trip while exporting
+EXPORT_CHUNK_SIZE = 2000
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+class Echo:
+    """Pseudo-buffer for csv.writer: write() returns the line instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def _format_csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, date):
+        return value.strftime('%d/%m/%Y')
+    if isinstance(value, time):
+        return value.strftime('%H:%M')
+    if isinstance(value, Decimal):
+        return f'{value:.2f}'.replace('.', ',')
+    return value
+
+
+def stream_csv_response(headers, rows, filename):
+    """
+    Streams rows as a CSV download, one line at a time.
+
+    Uses ';' as delimiter, comma decimals and a UTF-8 BOM so the file opens
+    correctly in a pt-BR Excel.
+
+    :param headers: List of column headers
+    :param rows: Iterable of row tuples (e.g. a values_list().iterator())
+    :param filename: Filename for the download
+    :return: StreamingHttpResponse
+    """
+    writer = csv.writer(Echo(), delimiter=';')
+
+    def generate():
+        # The header goes out before the query runs
+        yield '\ufeff' + writer.writerow(headers)
+        for row in rows:
+            yield writer.writerow([_format_csv_value(value) for value in row])
+
+    response = StreamingHttpResponse(generate(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def stream_xlsx_response(title, headers, rows, filename):
+    """
+    Writes rows to an .xlsx file with openpyxl's write-only mode and streams it.
+
+    Write-only worksheets flush rows to disk as they are appended, so memory
+    stays flat regardless of the row count. The workbook is assembled in a
+    temporary file, which is then sent in chunks.
+
+    :param title: Worksheet title
+    :param headers: List of column headers
+    :param rows: Iterable of row tuples (e.g. a values_list().iterator())
+    :param filename: Filename for the download
+    :return: FileResponse
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=title[:31])
+    ws.append(headers)
+    for row in rows:
+        ws.append(row)
+
+    output = tempfile.TemporaryFile()
+    wb.save(output)
+    output.seek(0)
+    return FileResponse(
+        output, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE
+    )
@@ -1,179 +1,332 @@
 import sqlite3
 import os
+from decimal import Decimal
 from django.core.management.base import BaseCommand
 from django.conf import settings
-from core.models import Motorista, Veiculo, Viagem, Multa, Manutencao
+from django.db import transaction
+from django.db.models import F
+from core.models import Motorista, Veiculo, Viagem, Multa, Manutencao, MigracaoCheckpoint
 from datetime import datetime
 
+# Helper to parse dates
+def parse_date(date_str):
+    if not date_str: return None
+    try:
+        return datetime.strptime(date_str, '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+def parse_time(time_str):
+    if not time_str: return None
+    try:
+        return datetime.strptime(time_str, '%H:%M').time()
+    except ValueError:
+        try:
+            return datetime.strptime(time_str, '%H:%M:%S').time()
+        except ValueError:
+            return None
+
+def to_decimal(value):
+    return Decimal(str(value)) if value else Decimal('0')
+
 class Command(BaseCommand):
-    help = 'Migrates data from the legacy traffic_app.db SQLite database to Django models'
+    help = (
+        'Migrates data from the legacy traffic_app.db SQLite database to Django models. '
+        'Rows are read and inserted in chunks; an interrupted run resumes from the last committed chunk.'
+    )
 
-    def handle(self, *args, **kwargs):
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Legacy rows read and inserted per transaction (default: 1000)',
+        )
+        parser.add_argument(
+            '--reset', action='store_true',
+            help='Discard saved checkpoints and start from the first legacy row',
+        )
+        parser.add_argument(
+            '--source',
+            help='Path to the legacy database (default: traffic_app.db in the repository root)',
+        )
+
+    def handle(self, *args, **options):
         # Path to the old database
         # Assuming it's in the root of the project (parent of multas_django)
-        old_db_path = os.path.join(settings.BASE_DIR.parent, 'traffic_app.db')
-        
+        old_db_path = options['source'] or os.path.join(settings.BASE_DIR.parent, 'traffic_app.db')
+
         if not os.path.exists(old_db_path):
             self.stdout.write(self.style.ERROR(f'Database file not found at: {old_db_path}'))
             return
 
         self.stdout.write(self.style.SUCCESS(f'Found database at: {old_db_path}'))
-        
+        self.chunk_size = options['chunk_size']
+
+        if options['reset']:
+            MigracaoCheckpoint.objects.all().delete()
+            self.stdout.write('Checkpoints discarded, starting from scratch.')
+
         conn = sqlite3.connect(old_db_path)
+        try:
+            # 1. Migrate Motoristas
+            self.motorista_keys = self.stored_keys(Motorista, ['cpf', 'cnh'])
+            self.migrate_table(
+                conn, 'motoristas',
+                "SELECT id, nome, cpf, cnh, validade_cnh FROM motoristas WHERE id > ? ORDER BY id",
+                self.motoristas_chunk,
+            )
+            # old_id -> new id, rebuilt on every run so resumed runs can link trips
+            self.motoristas_map = self.build_map(conn, 'motoristas', 'cpf', Motorista)
+
+            # 2. Migrate Veiculos
+            self.veiculo_keys = self.stored_keys(Veiculo, ['placa', 'renavam'])
+            self.migrate_table(
+                conn, 'veiculos',
+                "SELECT id, placa, modelo, ano, renavam, km_atual FROM veiculos WHERE id > ? ORDER BY id",
+                self.veiculos_chunk,
+            )
+            self.veiculos_map = self.build_map(conn, 'veiculos', 'placa', Veiculo)
+
+            # 3. Migrate Viagens
+            self.migrate_table(
+                conn, 'viagens',
+                "SELECT id, data, motorista_id, veiculo_id, origem, destino, hora_saida, distancia "
+                "FROM viagens WHERE id > ? ORDER BY id",
+                self.viagens_chunk,
+            )
+
+            # 4. Migrate Multas
+            self.migrate_table(
+                conn, 'multas',
+                "SELECT id, data, hora_infracao, local, tipo_infracao, descricao, motorista_id, veiculo_id, valor, viagem_id "
+                "FROM multas WHERE id > ? ORDER BY id",
+                self.multas_chunk,
+            )
+
+            # 5. Migrate Manutencoes
+            self.migrate_table(
+                conn, 'manutencoes',
+                "SELECT id, veiculo_id, data, tipo_servico, descricao, km_realizado, proximo_servico_km, proximo_servico_data, valor "
+                "FROM manutencoes WHERE id > ? ORDER BY id",
+                self.manutencoes_chunk,
+            )
+
+            # 6. Vehicle mileage, once for the whole run
+            self.apply_vehicle_km()
+        finally:
+            conn.close()
+
+        self.stdout.write(self.style.SUCCESS('Data migration completed successfully!'))
+
+    def migrate_table(self, conn, table, query, migrate_chunk):
+        """
+        Streams a legacy table in id order with fetchmany() and migrates it
+        chunk by chunk. Each chunk and its checkpoint commit together.
+        """
+        checkpoint, _ = MigracaoCheckpoint.objects.get_or_create(tabela=table)
+        if checkpoint.ultimo_id:
+            self.stdout.write(f'Migrating {table} (resuming after id {checkpoint.ultimo_id})...')
+        else:
+            self.stdout.write(f'Migrating {table}...')
+
         cursor = conn.cursor()
+        cursor.execute(query, (checkpoint.ultimo_id,))
+        read_count = created_count = 0
+        while True:
+            rows = cursor.fetchmany(self.chunk_size)
+            if not rows:
+                break
+            with transaction.atomic():
+                created_count += migrate_chunk(rows, checkpoint)
+                checkpoint.ultimo_id = rows[-1][0]
+                checkpoint.save(update_fields=['ultimo_id', 'pendencias', 'updated_at'])
+            read_count += len(rows)
+            self.stdout.write(f'  {read_count} rows read, {created_count} created')
+
+        self.stdout.write(self.style.SUCCESS(f'Migrated {created_count} {table}'))
+
+    def build_map(self, conn, table, key, model):
+        """Maps legacy ids to Django ids through the natural key (cpf/placa)."""
+        new_ids = dict(model.objects.values_list(key, 'id'))
+        cursor = conn.execute(f"SELECT id, {key} FROM {table}")
+        return {old_id: new_ids[value] for old_id, value in cursor if value in new_ids}
+
+    def stored_keys(self, model, fields):
+        """Values already taken by each unique field of the model."""
+        return {field: set(model.objects.values_list(field, flat=True)) for field in fields}
+
+    def unique_objects(self, table, candidates, keys):
+        """
+        Keeps the (old_id, obj) candidates whose unique fields are all free.
+        The first field is the natural key: a row found through it was migrated
+        already and is skipped quietly. A row that only clashes on another
+        unique field is a different record, so its legacy id is reported.
+        """
+        natural_key = next(iter(keys))
+        objs, conflicts = [], []
+        for old_id, obj in candidates:
+            values = {field: getattr(obj, field) for field in keys}
+            if values[natural_key] in keys[natural_key]:
+                continue
+            if any(values[field] in keys[field] for field in keys):
+                conflicts.append(old_id)
+                continue
+            for field, value in values.items():
+                keys[field].add(value)
+            objs.append(obj)
+        self.warn_skipped(table, conflicts, f"{'/'.join(list(keys)[1:])} already used by another record")
+        return objs
 
-        # Helper to parse dates
-        def parse_date(date_str):
-            if not date_str: return None
-            try:
-                return datetime.strptime(date_str, '%Y-%m-%d').date()
-            except ValueError:
-                return None
-
-        def parse_time(time_str):
-            if not time_str: return None
-            try:
-                return datetime.strptime(time_str, '%H:%M').time()
-            except ValueError:
-                try:
-                    return datetime.strptime(time_str, '%H:%M:%S').time()
-                except ValueError:
-                    return None
-
-        # 1. Migrate Motoristas
-        self.stdout.write('Migrating Motoristas...')
-        cursor.execute("SELECT id, nome, cpf, cnh, validade_cnh FROM motoristas")
-        motoristas_map = {} # old_id -> new_instance
-        for row in cursor.fetchall():
-            old_id, nome, cpf, cnh, validade_cnh = row
-            motorista, created = Motorista.objects.get_or_create(
+    def warn_skipped(self, table, old_ids, reason):
+        if old_ids:
+            ids = ', '.join(str(old_id) for old_id in old_ids)
+            self.stdout.write(self.style.WARNING(f'  Skipped {table} ids {ids}: {reason}'))
+
+    def motoristas_chunk(self, rows, checkpoint):
+        candidates = [
+            (old_id, Motorista(
+                nome=nome,
                 cpf=cpf,
-                defaults={
-                    'nome': nome,
-                    'cnh': cnh,
-                    'validade_cnh': parse_date(validade_cnh)
-                }
-            )
-            motoristas_map[old_id] = motorista
-        self.stdout.write(self.style.SUCCESS(f'Migrated {len(motoristas_map)} Motoristas'))
-
-        # 2. Migrate Veiculos
-        self.stdout.write('Migrating Veiculos...')
-        cursor.execute("SELECT id, placa, modelo, ano, renavam, km_atual FROM veiculos")
-        veiculos_map = {} # old_id -> new_instance
-        for row in cursor.fetchall():
-            old_id, placa, modelo, ano, renavam, km_atual = row
-            veiculo, created = Veiculo.objects.get_or_create(
+                cnh=cnh,
+                validade_cnh=parse_date(validade_cnh)
+            ))
+            for old_id, nome, cpf, cnh, validade_cnh in rows
+        ]
+        objs = self.unique_objects('motoristas', candidates, self.motorista_keys)
+        Motorista.objects.bulk_create(objs)
+        return len(objs)
+
+    def veiculos_chunk(self, rows, checkpoint):
+        candidates = [
+            (old_id, Veiculo(
                 placa=placa,
-                defaults={
-                    'modelo': modelo,
-                    'ano': ano,
-                    'renavam': renavam,
-                    'km_atual': km_atual if km_atual else 0
-                }
-            )
-            veiculos_map[old_id] = veiculo
-        self.stdout.write(self.style.SUCCESS(f'Migrated {len(veiculos_map)} Veiculos'))
-
-        # 3. Migrate Viagens
-        self.stdout.write('Migrating Viagens...')
-        cursor.execute("SELECT id, data, motorista_id, veiculo_id, origem, destino, hora_saida, distancia FROM viagens")
-        viagens_count = 0
-        for row in cursor.fetchall():
-            old_id, data, motorista_id, veiculo_id, origem, destino, hora_saida, distancia = row
-            
-            motorista = motoristas_map.get(motorista_id)
-            veiculo = veiculos_map.get(veiculo_id)
-
-            if motorista and veiculo:
-                # Check if exists to avoid duplicates
-                if not Viagem.objects.filter(
-                    data=parse_date(data),
-                    hora_saida=parse_time(hora_saida),
-                    motorista=motorista,
-                    veiculo=veiculo
-                ).exists():
-                    Viagem.objects.create(
-                        data=parse_date(data),
-                        hora_saida=parse_time(hora_saida),
-                        motorista=motorista,
-                        veiculo=veiculo,
-                        origem=origem,
-                        destino=destino,
-                        distancia=distancia if distancia else 0
-                    )
-                    viagens_count += 1
-        self.stdout.write(self.style.SUCCESS(f'Migrated {viagens_count} Viagens'))
-
-        # 4. Migrate Multas
-        self.stdout.write('Migrating Multas...')
-        cursor.execute("SELECT id, data, hora_infracao, local, tipo_infracao, descricao, motorista_id, veiculo_id, valor, viagem_id FROM multas")
-        multas_count = 0
-        for row in cursor.fetchall():
-            old_id, data, hora_infracao, local, tipo_infracao, descricao, motorista_id, veiculo_id, valor, viagem_id = row
-            
-            motorista = motoristas_map.get(motorista_id)
-            veiculo = veiculos_map.get(veiculo_id)
-            
-            # Try to find the trip if linked, but it's tricky without a direct map if we didn't save it.
-            # However, since we just created them, we might not have the exact ID match if we didn't force IDs.
-            # For simplicity, we will skip linking the exact Viagem object for now unless we query it, 
-            # or we could have stored the map.
-            # Let's try to match by attributes if needed, or just leave it null if not critical.
-            # But wait, the model has a ForeignKey.
-            
-            # Improved strategy: We can't easily map the Viagem ID because we didn't force IDs.
-            # But the user might want that history. 
-            # For now, let's leave 'viagem' null to avoid errors, as it's nullable.
-            viagem = None 
-
-            if motorista and veiculo:
-                 if not Multa.objects.filter(
-                    data=parse_date(data),
+                modelo=modelo,
+                ano=ano,
+                renavam=renavam,
+                km_atual=to_decimal(km_atual)
+            ))
+            for old_id, placa, modelo, ano, renavam, km_atual in rows
+        ]
+        objs = self.unique_objects('veiculos', candidates, self.veiculo_keys)
+        Veiculo.objects.bulk_create(objs)
+        return len(objs)
+
+    def new_objects(self, candidates, existing_qs, key_fields):
+        """
+        Drops candidates whose natural key already exists, with one query
+        limited to the date range of the chunk.
+        """
+        if not candidates:
+            return []
+        dates = [obj.data for obj in candidates]
+        existing = set(
+            existing_qs.filter(data__range=(min(dates), max(dates))).values_list(*key_fields)
+        )
+        objs = []
+        for obj in candidates:
+            key = tuple(getattr(obj, field) for field in key_fields)
+            if key not in existing:
+                existing.add(key)
+                objs.append(obj)
+        return objs
+
+    def viagens_chunk(self, rows, checkpoint):
+        candidates, unlinked = [], []
+        for old_id, data, motorista_id, veiculo_id, origem, destino, hora_saida, distancia in rows:
+            motorista_id = self.motoristas_map.get(motorista_id)
+            veiculo_id = self.veiculos_map.get(veiculo_id)
+            data = parse_date(data)
+            hora_saida = parse_time(hora_saida)
+            if motorista_id and veiculo_id and data and hora_saida:
+                candidates.append(Viagem(
+                    data=data,
+                    hora_saida=hora_saida,
+                    motorista_id=motorista_id,
+                    veiculo_id=veiculo_id,
+                    origem=origem,
+                    destino=destino,
+                    distancia=to_decimal(distancia)
+                ))
+            else:
+                unlinked.append(old_id)
+        self.warn_skipped('viagens', unlinked, 'unknown motorista/veiculo or invalid date/time')
+
+        objs = self.new_objects(
+            candidates, Viagem.objects.all(), ['data', 'hora_saida', 'motorista_id', 'veiculo_id']
+        )
+        # bulk_create does not fire the km signal; accumulate the deltas and
+        # apply them once at the end (kept in the checkpoint to survive restarts)
+        Viagem.objects.bulk_create(objs)
+        km = checkpoint.pendencias.setdefault('km', {})
+        for viagem in objs:
+            key = str(viagem.veiculo_id)
+            km[key] = str(Decimal(km.get(key, '0')) + viagem.distancia)
+        return len(objs)
+
+    def multas_chunk(self, rows, checkpoint):
+        candidates, unlinked = [], []
+        for old_id, data, hora_infracao, local, tipo_infracao, descricao, motorista_id, veiculo_id, valor, viagem_id in rows:
+            motorista_id = self.motoristas_map.get(motorista_id)
+            veiculo_id = self.veiculos_map.get(veiculo_id)
+            data = parse_date(data)
+            # Legacy trip ids are not mapped to the new trips, so 'viagem' is
+            # left null (it is nullable)
+            if motorista_id and veiculo_id and data:
+                candidates.append(Multa(
+                    data=data,
+                    hora_infracao=parse_time(hora_infracao),
+                    local=local,
                     tipo_infracao=tipo_infracao,
-                    veiculo=veiculo
-                ).exists():
-                    Multa.objects.create(
-                        data=parse_date(data),
-                        hora_infracao=parse_time(hora_infracao),
-                        local=local,
-                        tipo_infracao=tipo_infracao,
-                        descricao=descricao,
-                        motorista=motorista,
-                        veiculo=veiculo,
-                        viagem=viagem,
-                        valor=valor
-                    )
-                    multas_count += 1
-        self.stdout.write(self.style.SUCCESS(f'Migrated {multas_count} Multas'))
-
-        # 5. Migrate Manutencoes
-        self.stdout.write('Migrating Manutencoes...')
-        cursor.execute("SELECT id, veiculo_id, data, tipo_servico, descricao, km_realizado, proximo_servico_km, proximo_servico_data, valor FROM manutencoes")
-        manutencoes_count = 0
-        for row in cursor.fetchall():
-            old_id, veiculo_id, data, tipo_servico, descricao, km_realizado, proximo_servico_km, proximo_servico_data, valor = row
-            
-            veiculo = veiculos_map.get(veiculo_id)
-            
-            if veiculo:
-                if not Manutencao.objects.filter(
-                    veiculo=veiculo,
-                    data=parse_date(data),
-                    tipo_servico=tipo_servico
-                ).exists():
-                    Manutencao.objects.create(
-                        veiculo=veiculo,
-                        data=parse_date(data),
-                        tipo_servico=tipo_servico,
-                        descricao=descricao,
-                        km_realizado=km_realizado,
-                        proximo_servico_km=proximo_servico_km,
-                        proximo_servico_data=parse_date(proximo_servico_data),
-                        valor=valor
-                    )
-                    manutencoes_count += 1
-        self.stdout.write(self.style.SUCCESS(f'Migrated {manutencoes_count} Manutencoes'))
-
-        conn.close()
-        self.stdout.write(self.style.SUCCESS('Data migration completed successfully!'))
+                    descricao=descricao or '',
+                    motorista_id=motorista_id,
+                    veiculo_id=veiculo_id,
+                    viagem=None,
+                    valor=to_decimal(valor)
+                ))
+            else:
+                unlinked.append(old_id)
+        self.warn_skipped('multas', unlinked, 'unknown motorista/veiculo or invalid date')
+
+        objs = self.new_objects(
+            candidates, Multa.objects.all(), ['data', 'tipo_infracao', 'veiculo_id']
+        )
+        Multa.objects.bulk_create(objs)
+        return len(objs)
+
+    def manutencoes_chunk(self, rows, checkpoint):
+        candidates, unlinked = [], []
+        for old_id, veiculo_id, data, tipo_servico, descricao, km_realizado, proximo_servico_km, proximo_servico_data, valor in rows:
+            veiculo_id = self.veiculos_map.get(veiculo_id)
+            data = parse_date(data)
+            if veiculo_id and data:
+                candidates.append(Manutencao(
+                    veiculo_id=veiculo_id,
+                    data=data,
+                    tipo_servico=tipo_servico,
+                    descricao=descricao or '',
+                    km_realizado=to_decimal(km_realizado),
+                    proximo_servico_km=to_decimal(proximo_servico_km) if proximo_servico_km else None,
+                    proximo_servico_data=parse_date(proximo_servico_data),
+                    valor=to_decimal(valor)
+                ))
+            else:
+                unlinked.append(old_id)
+        self.warn_skipped('manutencoes', unlinked, 'unknown veiculo or invalid date')
+
+        objs = self.new_objects(
+            candidates, Manutencao.objects.all(), ['veiculo_id', 'data', 'tipo_servico']
+        )
+        Manutencao.objects.bulk_create(objs)
+        return len(objs)
+
+    def apply_vehicle_km(self):
+        """Adds the distance of all migrated trips to each vehicle, one UPDATE per vehicle."""
+        checkpoint = MigracaoCheckpoint.objects.filter(tabela='viagens').first()
+        pending = checkpoint.pendencias.get('km', {}) if checkpoint else {}
+        if not pending:
+            return
+        with transaction.atomic():
+            for veiculo_id, km in pending.items():
+                Veiculo.objects.filter(pk=int(veiculo_id)).update(km_atual=F('km_atual') + Decimal(km))
+            checkpoint.pendencias.pop('km')
+            checkpoint.save(update_fields=['pendencias', 'updated_at'])
+        self.stdout.write(self.style.SUCCESS(f'Updated km of {len(pending)} Veiculos'))
@@ -0,0 +1,16 @@
+"""
+Metrics of this project only, on top of the shared ones of common/metrics.py
+(which also serves /metrics): the in-memory caches of core.resolution and
+the WhatsApp monitor. The monitor runs in its own process: give it the same
+METRICS_DIR and its ingestion metrics show up in /metrics too.
+"""
+from common.metrics import Counter, Histogram
+
+LAG_BUCKETS = (0.5, 1, 2, 5, 10, 30, 60, 300, 900, 3600)
+
+CACHE_REQUESTS = Counter('cache_requests_total', 'Lookups of in-memory caches, by cache and result (hit, miss).',
+                         ['cache', 'result'])
+WHATSAPP_LAG = Histogram('whatsapp_ingest_lag_seconds', 'Time from a WhatsApp message to its trip being saved.',
+                         buckets=LAG_BUCKETS)
+WHATSAPP_RECORDS = Counter('whatsapp_records_total', 'WhatsApp trip messages saved (created), sent to review '
+                           '(pending) or lost in a failed batch (failed).', ['result'])
@@ -0,0 +1,25 @@
+# Generated by Django 5.0.14 on 2026-10-19 18:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0003_viagem_km_final"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="manutencao",
+            index=models.Index(fields=["-data", "id"], name="core_manute_data_909d2b_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="multa",
+            index=models.Index(fields=["-data", "id"], name="core_multa_data_713531_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="viagem",
+            index=models.Index(fields=["-data", "-hora_saida", "id"], name="core_viagem_data_ae673a_idx"),
+        ),
+    ]
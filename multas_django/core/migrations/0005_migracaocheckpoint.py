@@ -0,0 +1,27 @@
+# Generated by Django 5.0.14 on 2026-10-19 18:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0004_keyset_pagination_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MigracaoCheckpoint",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("tabela", models.CharField(max_length=50, unique=True)),
+                ("ultimo_id", models.BigIntegerField(default=0)),
+                ("pendencias", models.JSONField(blank=True, default=dict)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Checkpoint de Migração",
+                "verbose_name_plural": "Checkpoints de Migração",
+            },
+        ),
+    ]
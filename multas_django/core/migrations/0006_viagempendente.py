@@ -0,0 +1,34 @@
+# Generated by Django 5.0.14 on 2026-10-19 18:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_migracaocheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ViagemPendente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recebido_em', models.DateTimeField(db_index=True)),
+                ('nome', models.CharField(blank=True, max_length=200)),
+                ('placa', models.CharField(blank=True, max_length=20)),
+                ('destino', models.CharField(blank=True, max_length=200)),
+                ('km_inicial', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('km_final', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('texto', models.TextField(blank=True)),
+                ('motivo', models.CharField(max_length=200)),
+                ('resolvida', models.BooleanField(db_index=True, default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Viagem Pendente',
+                'verbose_name_plural': 'Viagens Pendentes',
+                'ordering': ['resolvida', '-recebido_em'],
+            },
+        ),
+    ]
@@ -58,6 +58,8 @@ class Viagem(models.Model):
             models.Index(fields=['-data']),
             models.Index(fields=['motorista', 'data']),
             models.Index(fields=['veiculo', 'data']),
+            # Keyset pagination key of the trip list
+            models.Index(fields=['-data', '-hora_saida', 'id']),
         ]
         verbose_name = 'Viagem'
         verbose_name_plural = 'Viagens'
@@ -86,6 +88,7 @@ class Multa(models.Model):
             models.Index(fields=['motorista', 'data']),
             models.Index(fields=['veiculo', 'data']),
             models.Index(fields=['tipo_infracao']),
+            models.Index(fields=['-data', 'id']),
         ]
         verbose_name = 'Multa'
         verbose_name_plural = 'Multas'
@@ -112,6 +115,7 @@ class Manutencao(models.Model):
             models.Index(fields=['veiculo', 'data']),
             models.Index(fields=['tipo_servico']),
             models.Index(fields=['proximo_servico_km']),
+            models.Index(fields=['-data', 'id']),
         ]
         verbose_name = 'Manutenção'
         verbose_name_plural = 'Manutenções'
@@ -119,3 +123,47 @@ class Manutencao(models.Model):
 
     def __str__(self):
         return f"{self.tipo_servico} - {self.veiculo.placa}"
+
+class MigracaoCheckpoint(models.Model):
+    """
+    Progress of the legacy data migration (manage.py migrate_data).
+    Saved in the same transaction as each migrated chunk, so an interrupted
+    run resumes after the last legacy id that was committed.
+    """
+    tabela = models.CharField(max_length=50, unique=True)
+    ultimo_id = models.BigIntegerField(default=0)
+    # Work deferred to the end of the run (e.g. vehicle km deltas)
+    pendencias = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Checkpoint de Migração'
+        verbose_name_plural = 'Checkpoints de Migração'
+
+    def __str__(self):
+        return f"{self.tabela} (último id {self.ultimo_id})"
+
+class ViagemPendente(models.Model):
+    """
+    Trip messages from the WhatsApp monitor that could not be turned into a
+    Viagem automatically (unknown driver/plate, inconsistent km...).
+    They wait here until someone reviews them.
+    """
+    recebido_em = models.DateTimeField(db_index=True)
+    nome = models.CharField(max_length=200, blank=True)
+    placa = models.CharField(max_length=20, blank=True)
+    destino = models.CharField(max_length=200, blank=True)
+    km_inicial = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    km_final = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    texto = models.TextField(blank=True)
+    motivo = models.CharField(max_length=200)
+    resolvida = models.BooleanField(default=False, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Viagem Pendente'
+        verbose_name_plural = 'Viagens Pendentes'
+        ordering = ['resolvida', '-recebido_em']
+
+    def __str__(self):
+        return f"{self.recebido_em:%d/%m/%Y %H:%M} - {self.nome} ({self.motivo})"
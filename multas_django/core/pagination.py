@@ -0,0 +1,225 @@
+import base64
+import json
+from datetime import date, time
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Max, Q
+from django.http import Http404
+from django.utils.functional import cached_property
+
+
+class InvalidCursor(Exception):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+def encode_cursor(values, direction):
+    """
+    Encodes the ordering key of a row into an opaque, URL-safe cursor.
+
+    :param values: Values of the ordering fields for the boundary row
+    :param direction: 'n' to seek forward, 'p' to seek backwards
+    """
+    payload = {
+        'v': [_serialize(value) for value in values],
+        'd': direction,
+    }
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, fields=None):
+    """
+    Decodes a cursor produced by encode_cursor into (values, direction).
+
+    With fields (the model fields of the ordering), the cursor must hold one
+    non-null value per field, converted with the field's to_python(): a
+    tampered cursor raises InvalidCursor instead of reaching the query.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values, direction = payload['v'], payload['d']
+    except (ValueError, KeyError, TypeError) as exc:
+        raise InvalidCursor(cursor) from exc
+    if direction not in ('n', 'p') or not isinstance(values, list):
+        raise InvalidCursor(cursor)
+    if fields is not None:
+        if len(values) != len(fields) or any(value is None for value in values):
+            raise InvalidCursor(cursor)
+        try:
+            values = [field.to_python(value) for field, value in zip(fields, values)]
+        except (ValidationError, TypeError, ValueError) as exc:
+            raise InvalidCursor(cursor) from exc
+        if any(value is None for value in values):
+            raise InvalidCursor(cursor)
+    return values, direction
+
+
+def _serialize(value):
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+class KeysetPage:
+    """A single page of a KeysetPaginator, with next/previous cursors."""
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @cached_property
+    def next_cursor(self):
+        if not self._has_next or not self.object_list:
+            return None
+        return encode_cursor(self.paginator.row_key(self.object_list[-1]), 'n')
+
+    @cached_property
+    def previous_cursor(self):
+        if not self._has_previous or not self.object_list:
+            return None
+        return encode_cursor(self.paginator.row_key(self.object_list[0]), 'p')
+
+
+class KeysetPaginator:
+    """
+    Cursor-based (seek) paginator.
+
+    Instead of COUNT(*) + OFFSET, each page is fetched with a WHERE clause on
+    the ordering key of the boundary row, so the cost of a page does not
+    depend on how deep the user is. The ordering must be unique (end it with
+    the primary key) and its fields must be non-null.
+    """
+
+    def __init__(self, queryset, per_page, ordering, estimate_total=False):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.estimate_total = estimate_total
+        self.fields = [field.lstrip('-') for field in self.ordering]
+
+    def row_key(self, obj):
+        return [getattr(obj, field) for field in self.fields]
+
+    def _reversed_ordering(self):
+        return [
+            field[1:] if field.startswith('-') else f'-{field}'
+            for field in self.ordering
+        ]
+
+    def _seek_filter(self, values, backwards):
+        """
+        Builds the lexicographic "row comes after the cursor" condition:
+        (a < va) OR (a = va AND b < vb) OR (a = va AND b = vb AND c > vc) ...
+        """
+        condition = Q()
+        for index, field in enumerate(self.ordering):
+            descending = field.startswith('-') != backwards
+            lookup = 'lt' if descending else 'gt'
+            clause = Q(**{f'{self.fields[index]}__{lookup}': values[index]})
+            for name, value in zip(self.fields[:index], values[:index]):
+                clause &= Q(**{name: value})
+            condition |= clause
+        return condition
+
+    def page(self, cursor=None):
+        values, direction = (None, 'n')
+        if cursor:
+            model_fields = [self.queryset.model._meta.get_field(name) for name in self.fields]
+            values, direction = decode_cursor(cursor, model_fields)
+
+        backwards = direction == 'p'
+        ordering = self._reversed_ordering() if backwards else self.ordering
+        queryset = self.queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._seek_filter(values, backwards))
+
+        # Fetch one extra row to know whether there is another page
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if backwards:
+            rows.reverse()
+            return KeysetPage(rows, self, has_next=True, has_previous=has_more)
+        return KeysetPage(rows, self, has_next=has_more, has_previous=values is not None)
+
+    @cached_property
+    def estimated_count(self):
+        """
+        Cheap approximation of the table size, without a COUNT(*).
+
+        Uses the planner statistics on PostgreSQL and the highest primary key
+        elsewhere. It describes the whole table, not the filtered queryset.
+        """
+        if not self.estimate_total:
+            return None
+        model = self.queryset.model
+        connection = connections[self.queryset.db]
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                    [model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            # reltuples is -1 until the table has been analyzed
+            if row and row[0] >= 0:
+                return row[0]
+        return model._default_manager.using(self.queryset.db).aggregate(n=Max('pk'))['n'] or 0
+
+
+class KeysetPaginationMixin:
+    """
+    ListView mixin that swaps the default Paginator for a KeysetPaginator.
+
+    Set keyset_ordering to the unique ordering of the list. Views that leave
+    it as None keep Django's page-number Paginator, which is fine for small
+    tables.
+    """
+    keyset_ordering = None
+    estimate_total = False
+    cursor_kwarg = 'cursor'
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.keyset_ordering:
+            return super().paginate_queryset(queryset, page_size)
+
+        paginator = KeysetPaginator(
+            queryset, page_size, self.keyset_ordering, estimate_total=self.estimate_total
+        )
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except InvalidCursor:
+            raise Http404('Cursor de paginação inválido.')
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Keep the other query parameters (e.g. filters) in the page links
+        params = self.request.GET.copy()
+        params.pop(self.cursor_kwarg, None)
+        params.pop(self.page_kwarg, None)
+        context['pagination_querystring'] = params.urlencode()
+        return context
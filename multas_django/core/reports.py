@@ -1,51 +1,232 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
 from io import BytesIO
 from django.http import HttpResponse
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter, landscape
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet
 
-def generate_pdf_report(title, data, headers, filename="report.pdf"):
+try:
+    from pypdf import PdfReader, PdfWriter
+except ImportError:  # Parallel rendering needs pypdf to join the parts
+    PdfReader = PdfWriter = None
+
+from common.metrics import REPORT_RENDER_SECONDS, REPORT_SIZE_BYTES
+
+# Maximum number of rows rendered in a single PDF report
+REPORT_MAX_ROWS = 50000
+
+# Reports with at least this many rows are rendered in parallel
+PARALLEL_MIN_ROWS = 2000
+
+# Worker processes used for parallel rendering
+REPORT_WORKERS = int(os.environ.get('REPORT_WORKERS', os.cpu_count() or 1))
+
+PAGE_SIZE = landscape(letter)
+
+# Padding of the frame SimpleDocTemplate puts on each page (Frame's default)
+FRAME_PADDING = 6
+
+TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+])
+
+def _draw_page_number(canvas_obj, page_number):
+    canvas_obj.saveState()
+    canvas_obj.setFont('Helvetica', 8)
+    canvas_obj.drawRightString(PAGE_SIZE[0] - 36, 20, f"Página {page_number}")
+    canvas_obj.restoreState()
+
+def _column_widths(data, headers):
+    """Column widths that fit the widest cell, as Table computes them."""
+    widths = [stringWidth(str(header), 'Helvetica-Bold', 10) for header in headers]
+    for row in data:
+        for index, value in enumerate(row):
+            for line in str(value).split('\n'):
+                widths[index] = max(widths[index], stringWidth(line, 'Helvetica', 10))
+    # Default TableStyle padding is 6pt on each side
+    return [width + 12 for width in widths]
+
+def _title_elements(title, subtitle=None):
+    styles = getSampleStyleSheet()
+    elements = [Paragraph(title, styles['Title'])]
+    if subtitle:
+        elements.append(Paragraph(subtitle, styles['Normal']))
+    elements.append(Spacer(1, 20))
+    return elements
+
+def _frame_size():
+    """Width and height of the frame SimpleDocTemplate lays each page out in."""
+    doc = SimpleDocTemplate(BytesIO(), pagesize=PAGE_SIZE)
+    return doc.width - 2 * FRAME_PADDING, doc.height - 2 * FRAME_PADDING
+
+def _row_heights(headers, col_widths, width, height):
+    """
+    Heights of the header row, of a one-line row and of every extra line of
+    a row, measured on small tables with the report's style: plain string
+    cells take one leading per line plus the padding.
+    """
+    def measure(rows):
+        table = Table(rows, colWidths=col_widths)
+        table.setStyle(TABLE_STYLE)
+        return table.wrap(width, height)[1]
+
+    blank = [''] * len(headers)
+    header = measure([headers])
+    one_line = measure([headers, blank]) - header
+    two_lines = measure([headers, ['\n'] + blank[1:]]) - header
+    return header, one_line, two_lines - one_line
+
+def _page_starts(title, data, headers, subtitle, col_widths):
+    """
+    Index of the first row of every page of the single-document layout.
+
+    Row heights come from the number of lines of each row, instead of laying
+    out the whole table, so finding the breaks costs little next to the
+    parallel render. Pages are then filled with Table.split's rule: a page
+    takes rows while they fit under the repeated header, and the first page
+    has the title block above the table.
+    """
+    width, height = _frame_size()
+    available = height
+    for index, flowable in enumerate(_title_elements(title, subtitle)):
+        available -= flowable.wrap(width, height)[1] + flowable.getSpaceAfter()
+        if index:
+            available -= flowable.getSpaceBefore()
+
+    header, one_line, per_line = _row_heights(headers, col_widths, width, height)
+    starts, used = [0], header
+    for index, row in enumerate(data):
+        # Cells are laid out as str(value), one line per "\n"
+        row_height = one_line + per_line * max(str(value).count('\n') for value in row)
+        if used + row_height > available and index > starts[-1]:
+            starts.append(index)
+            available, used = height, header
+        used += row_height
+    return starts
+
+def _build_pdf(title, data, headers, subtitle=None, with_title=True, number_pages=True, col_widths=None):
+    """
+    Lays out one PDF document. The header row repeats on every page.
+
+    :param with_title: Whether to print the title block (first part only)
+    :param number_pages: Whether to print page numbers while building
+    :param col_widths: Fixed column widths, so that parts rendered separately line up
+    :return: PDF bytes
+    """
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=PAGE_SIZE)
+    elements = _title_elements(title, subtitle) if with_title else []
+
+    # Add headers to data
+    table_data = [headers] + data
+
+    # Create table; the header row is repeated when the table splits
+    table = Table(table_data, colWidths=col_widths, repeatRows=1)
+    table.setStyle(TABLE_STYLE)
+    elements.append(table)
+
+    if number_pages:
+        on_page = lambda c, d: _draw_page_number(c, d.page)
+        doc.build(elements, onFirstPage=on_page, onLaterPages=on_page)
+    else:
+        doc.build(elements)
+    return buffer.getvalue()
+
+def _render_part(args):
+    """Worker entry point: renders one contiguous slice of rows."""
+    title, data, headers, subtitle, with_title, col_widths = args
+    return _build_pdf(
+        title, data, headers, subtitle,
+        with_title=with_title, number_pages=False, col_widths=col_widths,
+    )
+
+def _split_rows(data, page_starts, parts):
+    """Splits rows into contiguous slices of whole pages."""
+    pages_per_part = max(1, -(-len(page_starts) // parts))
+    cuts = page_starts[::pages_per_part] + [len(data)]
+    return [data[start:end] for start, end in zip(cuts, cuts[1:])]
+
+def _number_pages(writer):
+    """Stamps continuous page numbers on every page of the merged document."""
+    overlay_buffer = BytesIO()
+    overlay = canvas.Canvas(overlay_buffer, pagesize=PAGE_SIZE)
+    for number in range(1, len(writer.pages) + 1):
+        _draw_page_number(overlay, number)
+        overlay.showPage()
+    overlay.save()
+    overlay_buffer.seek(0)
+    for page, stamp in zip(writer.pages, PdfReader(overlay_buffer).pages):
+        page.merge_page(stamp)
+
+def render_pdf_parallel(title, data, headers, subtitle=None, workers=REPORT_WORKERS):
+    """
+    Renders a large report on several cores.
+
+    The rows are split into contiguous page ranges, each range is laid out in
+    its own process, and the parts are joined in order. Page numbers are
+    stamped after joining so they run continuously across the parts.
+
+    :return: PDF bytes
+    """
+    col_widths = _column_widths(data, headers)
+    page_starts = _page_starts(title, data, headers, subtitle, col_widths)
+    chunks = _split_rows(data, page_starts, workers)
+    jobs = [
+        (title, chunk, headers, subtitle, index == 0, col_widths)
+        for index, chunk in enumerate(chunks)
+    ]
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+        parts = list(executor.map(_render_part, jobs))
+
+    writer = PdfWriter()
+    for part in parts:
+        writer.append(PdfReader(BytesIO(part)))
+    _number_pages(writer)
+
+    output = BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+def generate_pdf_report(title, data, headers, filename="report.pdf", subtitle=None, parallel=None):
     """
     Generates a PDF report with a title and a table of data.
-    
+
     :param title: Title of the report
     :param data: List of lists containing the row data
     :param headers: List of column headers
     :param filename: Filename for the download
+    :param subtitle: Optional line shown under the title (e.g. active filters)
+    :param parallel: Force (True) or disable (False) multi-process rendering;
+        by default it is used for reports with at least PARALLEL_MIN_ROWS rows
     :return: HttpResponse with PDF content
     """
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=landscape(letter))
-    elements = []
+    if parallel is None:
+        parallel = len(data) >= PARALLEL_MIN_ROWS
+    can_parallelize = PdfWriter is not None and REPORT_WORKERS > 1
 
-    styles = getSampleStyleSheet()
-    title_style = styles['Title']
-    elements.append(Paragraph(title, title_style))
-    elements.append(Spacer(1, 20))
-
-    # Add headers to data
-    table_data = [headers] + data
-
-    # Create table
-    table = Table(table_data)
-    
-    # Add style to table
-    style = TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-    ])
-    table.setStyle(style)
-    
-    elements.append(table)
-    doc.build(elements)
+    report = os.path.splitext(filename)[0]
+    pdf = None
+    with REPORT_RENDER_SECONDS.time(report=report):
+        if parallel and can_parallelize:
+            try:
+                pdf = render_pdf_parallel(title, data, headers, subtitle)
+            except (OSError, RuntimeError):
+                # No usable process pool (e.g. frozen desktop build): render inline
+                pdf = None
+        if pdf is None:
+            pdf = _build_pdf(title, data, headers, subtitle)
+    REPORT_SIZE_BYTES.observe(len(pdf), report=report)
 
-    buffer.seek(0)
-    response = HttpResponse(buffer, content_type='application/pdf')
+    response = HttpResponse(pdf, content_type='application/pdf')
     response['Content-Disposition'] = f'attachment; filename="{filename}"'
     return response
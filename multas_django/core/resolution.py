@@ -0,0 +1,323 @@
+"""
+Resolution of free-text driver names and plates (WhatsApp messages,
+spreadsheets) to Motorista and Veiculo ids.
+
+ResolutionIndex keeps the two tables in memory, indexed by normalized name
+and canonical plate, plus trigram indexes for edit-distance lookups, so resolving a
+name costs no query. Every match comes with a confidence score in [0, 1].
+"""
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import OrderedDict, namedtuple
+
+from django.db.models import Count, Max
+
+from .metrics import CACHE_REQUESTS
+from .models import Motorista, Veiculo
+
+# Matches scoring below this are not accepted by motorista_id/veiculo_id
+MIN_SCORE = 0.75
+
+# Resolved queries kept per index (names and plates repeat a lot)
+CACHE_SIZE = 5000
+
+Match = namedtuple('Match', 'id value score')
+
+# Old plates are AAA9999; Mercosul plates are AAA9A99, where the 5th
+# character is the old digit written as a letter (0=A ... 9=J)
+PLATE = re.compile(r'[A-Z]{3}[0-9][A-Z0-9][0-9]{2}')
+MERCOSUL_TO_DIGIT = str.maketrans('ABCDEFGHIJ', '0123456789')
+
+# Typing/OCR confusions, fixed by the position's expected kind
+AS_LETTER = str.maketrans('01258', 'OIZSB')
+AS_DIGIT = str.maketrans('OQDILZSB', '00011258')
+
+
+def normalize_name(name):
+    """Upper case, no accents, single spaces: 'José  da Silva ' -> 'JOSE DA SILVA'."""
+    name = unicodedata.normalize('NFKD', name or '')
+    name = ''.join(c for c in name if not unicodedata.combining(c))
+    return ' '.join(name.upper().split())
+
+
+def normalize_plate(plate):
+    """'txh-2f74 ' -> 'TXH2F74'."""
+    return re.sub(r'[^A-Z0-9]', '', (plate or '').upper())
+
+
+def extract_plate(text):
+    """
+    The plate inside a free-text cell ('GOL - ABC-1234', 'VAN ABC1D23'):
+    the plate is expected at the end, as in the import template, so the last
+    7 characters win when they read as a plate (typos included); else the
+    last substring shaped like a plate, or else the last 7 characters.
+    """
+    compact = normalize_plate(text)
+    if len(compact) <= 7 or PLATE.fullmatch(canonical_plate(compact[-7:])):
+        return compact[-7:]
+    found = re.findall(rf'(?=({PLATE.pattern}))', compact)
+    return found[-1] if found else compact[-7:]
+
+
+def canonical_plate(plate):
+    """
+    Key shared by the old and the Mercosul form of a plate, with common
+    letter/digit confusions fixed ('ABC1C34' and 'ABC-1234' -> 'ABC1234',
+    'A8C1234' -> 'ABC1234'). Anything that is not 7 characters is only
+    normalized.
+    """
+    plate = normalize_plate(plate)
+    if len(plate) != 7:
+        return plate
+    return (
+        plate[:3].translate(AS_LETTER)
+        + plate[3].translate(AS_DIGIT)
+        + plate[4].translate(MERCOSUL_TO_DIGIT)
+        + plate[5:].translate(AS_DIGIT)
+    )
+
+
+def levenshtein(a, b, limit):
+    """
+    Edit distance between a and b, or limit + 1 if it is larger than limit.
+    Only the diagonal band of width 2 * limit + 1 is computed.
+    """
+    if a == b:
+        return 0
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    over = limit + 1
+    previous = [j if j <= limit else over for j in range(len(b) + 1)]
+    for i, ca in enumerate(a, 1):
+        low, high = max(1, i - limit), min(len(b), i + limit)
+        current = [over] * (len(b) + 1)
+        current[0] = i if i <= limit else over
+        for j in range(low, high + 1):
+            current[j] = min(
+                previous[j - 1] + (ca != b[j - 1]), previous[j] + 1, current[j - 1] + 1, over
+            )
+        if min(current[low - 1:high + 1]) > limit:
+            return over
+        previous = current
+    return previous[-1]
+
+
+def trigrams(text):
+    padded = f'${text}$'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """
+    Finds the keys within an edit distance of a query without comparing it
+    to every key: one edit changes at most 3 trigrams, so only keys sharing
+    enough trigrams with the query are checked with levenshtein().
+
+    A key sharing `needed` of the query's n trigrams shares at least one of
+    any n - needed + 1 of them, so candidates are only collected from the
+    postings of the rarest ones, and keys whose length is off by more than
+    the distance are skipped before counting.
+    """
+
+    def __init__(self, keys=()):
+        self.keys = list(keys)
+        self.grams = {}
+        self.postings = {}
+        for key in self.keys:
+            self.grams[key] = trigrams(key)
+            for gram in self.grams[key]:
+                self.postings.setdefault(gram, []).append(key)
+
+    def search(self, key, max_distance):
+        """[(distance, key)] of every key within max_distance, closest first."""
+        grams = trigrams(key)
+        needed = len(grams) - 3 * max_distance
+        shortest, longest = len(key) - max_distance, len(key) + max_distance
+        if needed <= 0:
+            candidates = [other for other in self.keys if shortest <= len(other) <= longest]
+        else:
+            rarest = sorted(grams, key=lambda gram: len(self.postings.get(gram, ())))[:len(grams) - needed + 1]
+            candidates = {
+                other for gram in rarest for other in self.postings.get(gram, ())
+                if shortest <= len(other) <= longest
+            }
+            candidates = [other for other in candidates if len(grams & self.grams[other]) >= needed]
+        found = []
+        for other in candidates:
+            distance = levenshtein(key, other, max_distance)
+            if distance <= max_distance:
+                found.append((distance, other))
+        return sorted(found)
+
+
+def max_typos(text):
+    """Edits tolerated for a name of this length."""
+    return 0 if len(text) < 4 else 1 if len(text) < 9 else 2
+
+
+class ResolutionIndex:
+    """
+    In-memory lookup of drivers by name or CPF and of vehicles by plate.
+
+    refresh() rebuilds the index only when a table changed since the last
+    build, detected with one cheap (count, latest updated_at) query per
+    table, so it can be called before every batch.
+    """
+
+    def __init__(self, min_score=MIN_SCORE):
+        self.min_score = min_score
+        self._version = None
+        self._cache = OrderedDict()
+        self.names = {}
+        self.sorted_names = []
+        self.name_by_id = {}
+        self.first_names = {}
+        self.cpfs = {}
+        self.plates = {}
+        self.canonical_plates = {}
+        self.name_grams = TrigramIndex()
+        self.first_name_grams = TrigramIndex()
+        self.plate_grams = TrigramIndex()
+
+    def _current_version(self):
+        return tuple(
+            tuple(model.objects.aggregate(Count('id'), Max('updated_at')).values())
+            for model in (Motorista, Veiculo)
+        )
+
+    def refresh(self):
+        version = self._current_version()
+        if version == self._version:
+            return self
+        self.names, self.first_names, self.cpfs = {}, {}, {}
+        for pk, nome, cpf in Motorista.objects.values_list('id', 'nome', 'cpf'):
+            name = normalize_name(nome)
+            self.names.setdefault(name, set()).add(pk)
+            if name:
+                self.first_names.setdefault(name.split()[0], set()).add(pk)
+            self.cpfs[re.sub(r'\D', '', cpf).zfill(11)] = pk
+        # Names starting with some words are contiguous in sorted order
+        self.sorted_names = sorted(self.names)
+        self.name_by_id = {pk: name for name, pks in self.names.items() for pk in pks}
+        self.plates, self.canonical_plates = {}, {}
+        for pk, placa in Veiculo.objects.values_list('id', 'placa'):
+            self.plates[normalize_plate(placa)] = pk
+            self.canonical_plates.setdefault(canonical_plate(placa), set()).add(pk)
+        self.name_grams = TrigramIndex(self.names)
+        self.first_name_grams = TrigramIndex(self.first_names)
+        self.plate_grams = TrigramIndex(self.canonical_plates)
+        self._cache.clear()
+        self._version = version
+        return self
+
+    def _cached(self, kind, key, resolve):
+        cache_key = (kind, key)
+        if cache_key in self._cache:
+            CACHE_REQUESTS.inc(cache='resolution', result='hit')
+            self._cache.move_to_end(cache_key)
+            return self._cache[cache_key]
+        CACHE_REQUESTS.inc(cache='resolution', result='miss')
+        match = resolve(key)
+        self._cache[cache_key] = match
+        if len(self._cache) > CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return match
+
+    def _accept(self, match):
+        return match if match and match.score >= self.min_score else None
+
+    @staticmethod
+    def _closest(grams, groups, key, limit):
+        """
+        Best fuzzy hit as (distance, value, id), or None when there is none
+        or the closest distance is shared by more than one record.
+        """
+        hits = grams.search(key, limit)
+        if not hits:
+            return None
+        best = hits[0][0]
+        ids = {pk for distance, value in hits if distance == best for pk in groups[value]}
+        if len(ids) != 1:
+            return None
+        value = next(value for distance, value in hits if distance == best)
+        return best, value, ids.pop()
+
+    def match_motorista(self, nome):
+        """
+        Best driver for a typed name, scored:
+        1.0 exact (ignoring case, accents and spacing), 0.9 the only name
+        starting with the given words ('Reginaldo' -> 'REGINALDO SOUZA'),
+        less for names with typos. None when nothing is close or when the
+        name fits more than one driver equally.
+        """
+        return self._cached('nome', normalize_name(nome), self._match_name)
+
+    def _match_name(self, key):
+        if not key:
+            return None
+        exact = self.names.get(key)
+        if exact:
+            return Match(next(iter(exact)), key, 1.0) if len(exact) == 1 else None
+
+        start = bisect_left(self.sorted_names, key + ' ')
+        # Two names are enough to tell whether the prefix is unique
+        prefix = [name for name in self.sorted_names[start:start + 2] if name.startswith(key + ' ')]
+        if prefix:
+            if len(prefix) == 1 and len(self.names[prefix[0]]) == 1:
+                return Match(next(iter(self.names[prefix[0]])), prefix[0], 0.9)
+            return None
+
+        hit = self._closest(self.name_grams, self.names, key, max_typos(key))
+        if hit:
+            distance, name, pk = hit
+            return Match(pk, name, round(1 - distance / max(len(key), len(name)), 3))
+
+        # A single (possibly misspelled) first name: 'Reginaldp' -> 'REGINALDO SOUZA'
+        if ' ' not in key:
+            hit = self._closest(self.first_name_grams, self.first_names, key, max_typos(key))
+            if hit:
+                distance, first_name, pk = hit
+                name = self.name_by_id[pk]
+                return Match(pk, name, round(0.9 * (1 - distance / max(len(key), len(first_name))), 3))
+        return None
+
+    def match_veiculo(self, placa):
+        """
+        Best vehicle for a typed plate, scored:
+        1.0 same characters, 0.95 the same plate in the other format
+        (old/Mercosul) or with a letter/digit mix-up, about 0.85 for one
+        wrong character. None when nothing is close or it is ambiguous.
+        """
+        return self._cached('placa', extract_plate(placa), self._match_plate)
+
+    def _match_plate(self, plate):
+        if not plate:
+            return None
+        if plate in self.plates:
+            return Match(self.plates[plate], plate, 1.0)
+        key = canonical_plate(plate)
+        pks = self.canonical_plates.get(key)
+        if pks:
+            return Match(next(iter(pks)), key, 0.95) if len(pks) == 1 else None
+        if len(key) != 7:
+            return None
+        hit = self._closest(self.plate_grams, self.canonical_plates, key, 1)
+        if hit:
+            distance, value, pk = hit
+            return Match(pk, value, round(1 - distance / 7, 3))
+        return None
+
+    def motorista_id(self, nome):
+        """Driver id for a typed name, if resolved with at least min_score."""
+        match = self._accept(self.match_motorista(nome))
+        return match.id if match else None
+
+    def veiculo_id(self, placa):
+        """Vehicle id for a typed plate, if resolved with at least min_score."""
+        match = self._accept(self.match_veiculo(placa))
+        return match.id if match else None
+
+    def motorista_id_por_cpf(self, cpf):
+        """Driver id for a CPF in any format ('123.456.789-01', 12345678901)."""
+        return self.cpfs.get(re.sub(r'\D', '', str(cpf or '')).zfill(11))
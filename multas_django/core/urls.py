@@ -1,4 +1,6 @@
 from django.urls import path
+from common.metrics import metrics_view
+from common.profiling import profile_download
 from .views import (
     DashboardView,
     MotoristaListView, MotoristaCreateView, MotoristaUpdateView, MotoristaDeleteView,
@@ -9,6 +11,7 @@ from .views import (
     ReportSelectionView,
     relatorio_motoristas_pdf, relatorio_veiculos_pdf, relatorio_multas_pdf, relatorio_manutencoes_pdf,
     relatorio_viagens_pdf,
+    ViagemExportView, MultaExportView, ManutencaoExportView,
     ImportTravelView, DownloadTravelTemplateView
 )
 
@@ -32,18 +35,21 @@ urlpatterns = [
     path('viagens/novo/', ViagemCreateView.as_view(), name='viagem_create'),
     path('viagens/<int:pk>/editar/', ViagemUpdateView.as_view(), name='viagem_update'),
     path('viagens/<int:pk>/excluir/', ViagemDeleteView.as_view(), name='viagem_delete'),
+    path('viagens/exportar/<str:formato>/', ViagemExportView.as_view(), name='viagem_export'),
 
     # Multa URLs
     path('multas/', MultaListView.as_view(), name='multa_list'),
     path('multas/novo/', MultaCreateView.as_view(), name='multa_create'),
     path('multas/<int:pk>/editar/', MultaUpdateView.as_view(), name='multa_update'),
     path('multas/<int:pk>/excluir/', MultaDeleteView.as_view(), name='multa_delete'),
+    path('multas/exportar/<str:formato>/', MultaExportView.as_view(), name='multa_export'),
 
     # Manutencao URLs
     path('manutencoes/', ManutencaoListView.as_view(), name='manutencao_list'),
     path('manutencoes/novo/', ManutencaoCreateView.as_view(), name='manutencao_create'),
     path('manutencoes/<int:pk>/editar/', ManutencaoUpdateView.as_view(), name='manutencao_update'),
     path('manutencoes/<int:pk>/excluir/', ManutencaoDeleteView.as_view(), name='manutencao_delete'),
+    path('manutencoes/exportar/<str:formato>/', ManutencaoExportView.as_view(), name='manutencao_export'),
     
     # Report URLs
     path('relatorios/', ReportSelectionView.as_view(), name='report_selection'),
@@ -56,5 +62,11 @@ urlpatterns = [
     # Import URLs
     path('viagens/importar/', ImportTravelView.as_view(), name='viagem_import'),
     path('viagens/modelo/', DownloadTravelTemplateView.as_view(), name='viagem_download_template'),
+
+    # Profiles stored with ?_profile_store=1
+    path('perfis/<str:name>/', profile_download, name='profile_download'),
+
+    # Prometheus metrics
+    path('metrics', metrics_view, name='metrics'),
 ]
 
@@ -1,16 +1,36 @@
+from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
 from django.shortcuts import render
-from django.views.generic import TemplateView, ListView, CreateView, UpdateView, DeleteView
+from django.views.generic import TemplateView, ListView, CreateView, UpdateView, DeleteView, View
 from django.urls import reverse_lazy
-from django.db.models import F, Count, Sum, Q
+from django.db.models import F, Count, Sum
 from django.db.models.functions import TruncMonth
 from django.utils import timezone
 from datetime import timedelta
-from django.http import HttpResponse
+from django.http import HttpResponse, Http404
 from .models import Motorista, Veiculo, Viagem, Multa, Manutencao
 from .forms import ViagemForm
-from .reports import generate_pdf_report
+from .filters import ViagemFilter, MultaFilter, ManutencaoFilter
+from .reports import REPORT_MAX_ROWS, generate_pdf_report
+from .pagination import KeysetPaginationMixin
+from .resolution import ResolutionIndex, extract_plate
+from .exports import EXPORT_CHUNK_SIZE, stream_csv_response, stream_xlsx_response
+from common import metrics
+
+# Mixins
+class FilterSetMixin:
+    """Filters list querysets with filterset_class and the GET parameters."""
+    filterset_class = None
+
+    def filter_queryset(self, queryset):
+        self.filterset = self.filterset_class(self.request.GET, queryset=queryset)
+        return self.filterset.qs
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['filter'] = self.filterset
+        return context
 
 # Dashboard View
 class DashboardView(LoginRequiredMixin, TemplateView):
@@ -67,16 +87,19 @@ class VeiculoDeleteView(LoginRequiredMixin, DeleteView):
     success_url = reverse_lazy('veiculo_list')
 
 # Viagem Views
-class ViagemListView(LoginRequiredMixin, ListView):
+class ViagemListView(LoginRequiredMixin, KeysetPaginationMixin, FilterSetMixin, ListView):
     model = Viagem
     template_name = 'travels/travel_list.html'
     context_object_name = 'viagens'
+    filterset_class = ViagemFilter
     paginate_by = 50
+    keyset_ordering = ('-data', '-hora_saida', 'id')
+    estimate_total = True
     
     def get_queryset(self):
-        return Viagem.objects.select_related(
+        return self.filter_queryset(Viagem.objects.select_related(
             'motorista', 'veiculo'
-        ).order_by('-data', '-hora_saida')
+        ).order_by(*self.keyset_ordering))
 
 class ViagemCreateView(LoginRequiredMixin, CreateView):
     model = Viagem
@@ -104,16 +127,19 @@ class ViagemDeleteView(LoginRequiredMixin, DeleteView):
     success_url = reverse_lazy('viagem_list')
 
 # Multa Views
-class MultaListView(LoginRequiredMixin, ListView):
+class MultaListView(LoginRequiredMixin, KeysetPaginationMixin, FilterSetMixin, ListView):
     model = Multa
     template_name = 'fines/fine_list.html'
     context_object_name = 'multas'
+    filterset_class = MultaFilter
     paginate_by = 50
+    keyset_ordering = ('-data', 'id')
+    estimate_total = True
     
     def get_queryset(self):
-        return Multa.objects.select_related(
+        return self.filter_queryset(Multa.objects.select_related(
             'motorista', 'veiculo', 'viagem'
-        ).order_by('-data')
+        ).order_by(*self.keyset_ordering))
 
 class MultaCreateView(LoginRequiredMixin, CreateView):
     model = Multa
@@ -133,16 +159,19 @@ class MultaDeleteView(LoginRequiredMixin, DeleteView):
     success_url = reverse_lazy('multa_list')
 
 # Manutencao Views
-class ManutencaoListView(LoginRequiredMixin, ListView):
+class ManutencaoListView(LoginRequiredMixin, KeysetPaginationMixin, FilterSetMixin, ListView):
     model = Manutencao
     template_name = 'maintenance/maintenance_list.html'
     context_object_name = 'manutencoes'
+    filterset_class = ManutencaoFilter
     paginate_by = 50
+    keyset_ordering = ('-data', 'id')
+    estimate_total = True
     
     def get_queryset(self):
-        return Manutencao.objects.select_related(
+        return self.filter_queryset(Manutencao.objects.select_related(
             'veiculo'
-        ).order_by('-data')
+        ).order_by(*self.keyset_ordering))
 
 class ManutencaoCreateView(LoginRequiredMixin, CreateView):
     model = Manutencao
@@ -162,7 +191,7 @@ class ManutencaoDeleteView(LoginRequiredMixin, DeleteView):
     success_url = reverse_lazy('manutencao_list')
 
 # Report Export Views
-# Report Export Views
+@login_required
 def relatorio_motoristas_pdf(request):
     """Exporta relatório de motoristas em PDF"""
     motoristas = Motorista.objects.all().order_by('nome')
@@ -178,6 +207,7 @@ def relatorio_motoristas_pdf(request):
     
     return generate_pdf_report("Relatório de Motoristas", data, headers, "relatorio_motoristas.pdf")
 
+@login_required
 def relatorio_veiculos_pdf(request):
     """Exporta relatório de veículos em PDF"""
     veiculos = Veiculo.objects.all().order_by('placa')
@@ -194,56 +224,173 @@ def relatorio_veiculos_pdf(request):
     
     return generate_pdf_report("Relatório de Veículos", data, headers, "relatorio_veiculos.pdf")
 
+def _filtered_report_rows(request, filterset_class, queryset, fields):
+    """
+    Applies the list filters to a report queryset and reads at most
+    REPORT_MAX_ROWS rows. The filters run in the database, so date ranges and
+    driver/vehicle filters use the (motorista, data) and (veiculo, data) indexes.
+
+    :return: (rows, subtitle) where subtitle describes the period and truncation
+    """
+    filterset = filterset_class(request.GET, queryset=queryset)
+    rows = list(filterset.qs.values_list(*fields)[:REPORT_MAX_ROWS + 1].iterator(chunk_size=EXPORT_CHUNK_SIZE))
+    truncated = len(rows) > REPORT_MAX_ROWS
+
+    parts = []
+    cleaned = getattr(filterset.form, 'cleaned_data', {})
+    if cleaned.get('data_inicio') or cleaned.get('data_fim'):
+        inicio = cleaned['data_inicio'].strftime('%d/%m/%Y') if cleaned.get('data_inicio') else '...'
+        fim = cleaned['data_fim'].strftime('%d/%m/%Y') if cleaned.get('data_fim') else '...'
+        parts.append(f"Período: {inicio} a {fim}")
+    if truncated:
+        parts.append(f"Exibindo os primeiros {REPORT_MAX_ROWS} registros. Refine os filtros para ver os demais.")
+    return rows[:REPORT_MAX_ROWS], ' — '.join(parts) or None
+
+@login_required
 def relatorio_multas_pdf(request):
-    """Exporta relatório de multas em PDF"""
-    multas = Multa.objects.select_related('motorista', 'veiculo').order_by('-data')
+    """Exporta relatório de multas em PDF, respeitando os filtros da listagem"""
+    rows, subtitle = _filtered_report_rows(
+        request, MultaFilter, Multa.objects.order_by('-data', 'id'),
+        ['data', 'hora_infracao', 'local', 'motorista__nome', 'veiculo__placa', 'valor'],
+    )
     headers = ['Data', 'Hora', 'Local', 'Motorista', 'Veículo', 'Valor']
     data = []
-    for m in multas:
+    for data_multa, hora, local, motorista, placa, valor in rows:
         data.append([
-            m.data.strftime('%d/%m/%Y'),
-            m.hora_infracao.strftime('%H:%M') if m.hora_infracao else '-',
-            m.local,
-            m.motorista.nome if m.motorista else '-',
-            m.veiculo.placa if m.veiculo else '-',
-            f"R$ {m.valor:.2f}"
+            data_multa.strftime('%d/%m/%Y'),
+            hora.strftime('%H:%M') if hora else '-',
+            local,
+            motorista or '-',
+            placa or '-',
+            f"R$ {valor:.2f}"
         ])
     
-    return generate_pdf_report("Relatório de Multas", data, headers, "relatorio_multas.pdf")
+    return generate_pdf_report("Relatório de Multas", data, headers, "relatorio_multas.pdf", subtitle=subtitle)
 
+@login_required
 def relatorio_manutencoes_pdf(request):
-    """Exporta relatório de manutenções em PDF"""
-    manutencoes = Manutencao.objects.select_related('veiculo').order_by('-data')
+    """Exporta relatório de manutenções em PDF, respeitando os filtros da listagem"""
+    rows, subtitle = _filtered_report_rows(
+        request, ManutencaoFilter, Manutencao.objects.order_by('-data', 'id'),
+        ['veiculo__placa', 'data', 'tipo_servico', 'descricao', 'valor'],
+    )
     headers = ['Veículo', 'Data', 'Tipo', 'Descrição', 'Valor']
     data = []
-    for m in manutencoes:
+    for placa, data_manutencao, tipo_servico, descricao, valor in rows:
         data.append([
-            m.veiculo.placa if m.veiculo else '-',
-            m.data.strftime('%d/%m/%Y'),
-            m.tipo_servico,
-            m.descricao,
-            f"R$ {m.valor:.2f}"
+            placa or '-',
+            data_manutencao.strftime('%d/%m/%Y'),
+            tipo_servico,
+            descricao,
+            f"R$ {valor:.2f}"
         ])
     
-    return generate_pdf_report("Relatório de Manutenções", data, headers, "relatorio_manutencoes.pdf")
+    return generate_pdf_report("Relatório de Manutenções", data, headers, "relatorio_manutencoes.pdf", subtitle=subtitle)
 
+@login_required
 def relatorio_viagens_pdf(request):
-    """Exporta relatório de viagens em PDF"""
-    viagens = Viagem.objects.select_related('motorista', 'veiculo').order_by('-data')
+    """Exporta relatório de viagens em PDF, respeitando os filtros da listagem"""
+    rows, subtitle = _filtered_report_rows(
+        request, ViagemFilter, Viagem.objects.order_by('-data', '-hora_saida', 'id'),
+        ['data', 'hora_saida', 'motorista__nome', 'veiculo__placa', 'destino'],
+    )
     headers = ['Data', 'Saída', 'Motorista', 'Veículo', 'Destino']
     data = []
-    for v in viagens:
+    for data_viagem, hora_saida, motorista, placa, destino in rows:
         data.append([
-            v.data.strftime('%d/%m/%Y'),
-            v.hora_saida.strftime('%H:%M') if v.hora_saida else '-',
-            v.motorista.nome if v.motorista else '-',
-            v.veiculo.placa if v.veiculo else '-',
-            v.destino
+            data_viagem.strftime('%d/%m/%Y'),
+            hora_saida.strftime('%H:%M') if hora_saida else '-',
+            motorista or '-',
+            placa or '-',
+            destino
         ])
-    return generate_pdf_report("Relatório de Viagens", data, headers, "relatorio_viagens.pdf")
+    return generate_pdf_report("Relatório de Viagens", data, headers, "relatorio_viagens.pdf", subtitle=subtitle)
+
+
+# Spreadsheet Export Views
+class FilteredExportView(LoginRequiredMixin, FilterSetMixin, View):
+    """
+    Streams the rows of a list, filtered with the same GET parameters as the
+    list view, as CSV or XLSX. Rows are read with values_list().iterator(), so
+    model instances are never built and memory stays flat.
+    """
+    model = None
+    ordering = None
+    # (header, field lookup) pairs
+    columns = []
+    title = ''
+    filename = 'export'
+
+    def get(self, request, formato):
+        queryset = self.filter_queryset(self.model.objects.all())
+        rows = queryset.order_by(*self.ordering).values_list(
+            *[lookup for _, lookup in self.columns]
+        ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        headers = [header for header, _ in self.columns]
+
+        if formato == 'csv':
+            return stream_csv_response(headers, rows, f'{self.filename}.csv')
+        if formato == 'xlsx':
+            return stream_xlsx_response(self.title, headers, rows, f'{self.filename}.xlsx')
+        raise Http404('Formato de exportação inválido.')
+
+class ViagemExportView(FilteredExportView):
+    model = Viagem
+    filterset_class = ViagemFilter
+    ordering = ('-data', '-hora_saida', 'id')
+    columns = [
+        ('Data', 'data'),
+        ('Hora Saída', 'hora_saida'),
+        ('Motorista', 'motorista__nome'),
+        ('CPF', 'motorista__cpf'),
+        ('Veículo', 'veiculo__placa'),
+        ('Origem', 'origem'),
+        ('Destino', 'destino'),
+        ('Distância (KM)', 'distancia'),
+        ('KM Final', 'km_final'),
+    ]
+    title = 'Viagens'
+    filename = 'viagens'
+
+class MultaExportView(FilteredExportView):
+    model = Multa
+    filterset_class = MultaFilter
+    ordering = ('-data', 'id')
+    columns = [
+        ('Data', 'data'),
+        ('Hora', 'hora_infracao'),
+        ('Local', 'local'),
+        ('Tipo de Infração', 'tipo_infracao'),
+        ('Descrição', 'descricao'),
+        ('Motorista', 'motorista__nome'),
+        ('CPF', 'motorista__cpf'),
+        ('Veículo', 'veiculo__placa'),
+        ('Valor (R$)', 'valor'),
+    ]
+    title = 'Multas'
+    filename = 'multas'
+
+class ManutencaoExportView(FilteredExportView):
+    model = Manutencao
+    filterset_class = ManutencaoFilter
+    ordering = ('-data', 'id')
+    columns = [
+        ('Data', 'data'),
+        ('Veículo', 'veiculo__placa'),
+        ('Tipo de Serviço', 'tipo_servico'),
+        ('Descrição', 'descricao'),
+        ('KM Realizado', 'km_realizado'),
+        ('Próximo Serviço (KM)', 'proximo_servico_km'),
+        ('Próximo Serviço (Data)', 'proximo_servico_data'),
+        ('Valor (R$)', 'valor'),
+    ]
+    title = 'Manutenções'
+    filename = 'manutencoes'
 
 
 # Excel Import/Export Views
+import time
+
 import openpyxl
 from django.views.generic import FormView, View
 from .forms import ViagemImportForm
@@ -314,12 +461,15 @@ class ImportTravelView(LoginRequiredMixin, FormView):
     
     def form_valid(self, form):
         excel_file = form.cleaned_data['arquivo_excel']
+        started = time.perf_counter()
         try:
             wb = openpyxl.load_workbook(excel_file)
             ws = wb.active
             
             created_count = 0
             errors = []
+            # Drivers and vehicles resolved in memory instead of 2 queries per row
+            index = ResolutionIndex().refresh()
             
             # Skip header row
             rows = list(ws.iter_rows(min_row=2, values_only=True))
@@ -363,24 +513,16 @@ class ImportTravelView(LoginRequiredMixin, FormView):
                     if len(cpf) < 11:
                          cpf = cpf.zfill(11)
 
-                    # Try searching with formatted CPF as well
-                    cpf_formatted = f"{cpf[:3]}.{cpf[3:6]}.{cpf[6:9]}-{cpf[9:]}"
-                         
-                    placa = str(raw_placa).replace('-', '').strip().upper()
-                    # Fallback for concatenated strings without separator (e.g., "MODELO PLACA")
-                    # If length > 7, assume the plate is at the end (standard plate is 7 chars)
-                    if len(placa) > 7:
-                        placa = placa[-7:]
-                    
                     # Search valid foreign keys
-                    motorista = Motorista.objects.filter(Q(cpf=cpf) | Q(cpf=cpf_formatted)).first()
-                    if not motorista:
+                    motorista_id = index.motorista_id_por_cpf(cpf)
+                    if not motorista_id:
                         errors.append(f"Linha {row_idx}: Motorista com CPF {cpf} não encontrado.")
                         continue
-                        
-                    veiculo = Veiculo.objects.filter(placa=placa).first()
-                    if not veiculo:
-                        errors.append(f"Linha {row_idx}: Veículo com placa {placa} não encontrado.")
+
+                    # Accepts 'MODELO PLACA' cells, old/Mercosul forms and small typos
+                    veiculo_id = index.veiculo_id(raw_placa)
+                    if not veiculo_id:
+                        errors.append(f"Linha {row_idx}: Veículo com placa {extract_plate(raw_placa)} não encontrado.")
                         continue
                     
                     # Handle Date/Time types from Excel
@@ -421,8 +563,8 @@ class ImportTravelView(LoginRequiredMixin, FormView):
                     viagem = Viagem.objects.create(
                         data=final_date,
                         hora_saida=final_time,
-                        motorista=motorista,
-                        veiculo=veiculo,
+                        motorista_id=motorista_id,
+                        veiculo_id=veiculo_id,
                         origem=origem_val,
                         destino=destino_val,
                         distancia=final_distancia,
@@ -430,15 +572,14 @@ class ImportTravelView(LoginRequiredMixin, FormView):
                     )
                     
                     # Update Vehicle KM if provided and greater
-                    if final_km_final > float(veiculo.km_atual):
-                        veiculo.km_atual = final_km_final
-                        veiculo.save()
+                    Veiculo.objects.filter(pk=veiculo_id, km_atual__lt=final_km_final).update(km_atual=final_km_final)
                         
                     created_count += 1
                     
                 except Exception as e:
                     errors.append(f"Linha {row_idx}: Erro inesperado - {str(e)}")
             
+            metrics.observe_import(created_count, len(errors), time.perf_counter() - started)
             if created_count > 0:
                 messages.success(self.request, f"{created_count} viagens importadas com sucesso!")
             
@@ -449,6 +590,7 @@ class ImportTravelView(LoginRequiredMixin, FormView):
                     messages.warning(self.request, f"E mais {len(errors)-5} erros. Verifique a planilha.")
                     
         except Exception as e:
+            metrics.IMPORT_FILES.inc(result='failed')
             messages.error(self.request, f"Erro ao ler arquivo: {str(e)}")
             return self.form_invalid(form)
             
@@ -0,0 +1,198 @@
+"""
+Backfill of old trip messages from a WhatsApp "Export chat" file.
+
+    python backfill.py "Conversa do WhatsApp com Motoristas.zip"
+    python backfill.py conversa.txt --workers 4 --django
+
+The export is read as a stream and split into messages on the lines that
+start with a timestamp (multi-line messages are joined back). Messages are
+parsed in batches across a process pool, and the trip records are appended
+to the ingestion store in one transaction per batch, with the original
+message time as their timestamp. Re-running the same (or an overlapping)
+export does not duplicate records, and neither do messages the monitor
+already captured live: main.py stores them under the same message_key(),
+read from the sender and time WhatsApp Web shows on each bubble.
+"""
+import argparse
+import hashlib
+import io
+import os
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+
+from exporter import RecordStore
+from parser import parse_message
+
+# Messages sent to a worker process at a time
+BATCH_SIZE = 2000
+
+# Lines that start a new message, in the formats of the Android and iOS exports:
+#   25/11/2025 05:12 - Reginaldo: text
+#   25/11/2025, 05:12 - Reginaldo: text
+#   [25/11/2025, 05:12:33] Reginaldo: text
+MESSAGE_START = re.compile(
+    r"^\u200e?\[?(?P<date>\d{1,2}/\d{1,2}/\d{2,4}),? (?P<time>\d{1,2}:\d{2}(?::\d{2})?)\]?(?: -)? (?P<body>.*)$"
+)
+
+# "Sender: text" (system messages such as "X added Y" have no sender)
+SENDER = re.compile(r"^(?P<sender>[^:]{1,80}): (?P<text>.*)$", re.DOTALL)
+
+# data-pre-plain-text of a message bubble in WhatsApp Web: "[05:12, 25/11/2025] Reginaldo: "
+BUBBLE_HEADER = re.compile(
+    r"^\[(?P<time>\d{1,2}:\d{2}(?::\d{2})?), (?P<date>\d{1,2}/\d{1,2}/\d{2,4})\] (?P<sender>[^:]{1,80}): ?$"
+)
+
+
+@contextmanager
+def open_export(path):
+    """Text stream of a chat export (.txt, or the .txt inside an exported .zip)."""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            names = [name for name in archive.namelist() if name.lower().endswith(".txt")]
+            if not names:
+                raise ValueError(f"Nenhum arquivo .txt dentro de {path}")
+            with io.TextIOWrapper(archive.open(names[0]), encoding="utf-8-sig") as lines:
+                yield lines
+    else:
+        with open(path, encoding="utf-8-sig") as lines:
+            yield lines
+
+
+def parse_timestamp(date_text, time_text):
+    day, month, year = date_text.split("/")
+    if len(year) == 2:
+        year = "20" + year
+    time_format = "%H:%M:%S" if time_text.count(":") == 2 else "%H:%M"
+    return datetime.strptime(f"{day}/{month}/{year} {time_text}", f"%d/%m/%Y {time_format}")
+
+
+def split_messages(lines):
+    """
+    Yields (timestamp, sender, text) for each message of an export,
+    joining the continuation lines of multi-line messages.
+    """
+    current = None
+    for line in lines:
+        line = line.rstrip("\r\n")
+        match = MESSAGE_START.match(line)
+        if match:
+            if current:
+                yield current[0], current[1], "\n".join(current[2])
+            body = match.group("body")
+            sender_match = SENDER.match(body)
+            sender, text = (sender_match.group("sender"), sender_match.group("text")) if sender_match else (None, body)
+            current = (parse_timestamp(match.group("date"), match.group("time")), sender, [text])
+        elif current:
+            current[2].append(line)
+    if current:
+        yield current[0], current[1], "\n".join(current[2])
+
+
+def batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def message_key(timestamp, sender, text):
+    """
+    Stable id of a message, so overlapping exports (and messages already
+    captured live) are imported once. Seconds are dropped: Android exports
+    and WhatsApp Web only show the minute.
+    """
+    timestamp = timestamp.replace(second=0, microsecond=0)
+    return hashlib.sha1(f"{timestamp:%Y-%m-%d %H:%M:%S}|{sender}|{text}".encode()).hexdigest()
+
+
+def bubble_origin(header):
+    """(timestamp, sender) of a message captured live, from its bubble header; None if unknown."""
+    match = BUBBLE_HEADER.match(header or "")
+    if not match:
+        return None
+    return parse_timestamp(match.group("date"), match.group("time")), match.group("sender")
+
+
+def parse_batch(messages):
+    """Worker: returns (key, record) for the trip messages of a batch."""
+    results = []
+    for timestamp, sender, text in messages:
+        data = parse_message(text, timestamp=timestamp)
+        if data:
+            results.append((message_key(timestamp, sender, text), data))
+    return results
+
+
+def parallel_map(executor, func, iterable, workers):
+    """
+    Like executor.map, but keeps at most 2 batches per worker in flight so a
+    large export is never loaded whole into memory. Results come in order.
+    """
+    pending = []
+    for item in iterable:
+        pending.append(executor.submit(func, item))
+        if len(pending) >= workers * 2:
+            yield pending.pop(0).result()
+    for future in pending:
+        yield future.result()
+
+
+def backfill(path, store, workers=None, batch_size=BATCH_SIZE, ingestor=None):
+    """
+    :return: (messages read, trip records found, records appended)
+    """
+    workers = workers or os.cpu_count() or 1
+    counts = {"messages": 0}
+
+    def counted(messages):
+        for message in messages:
+            counts["messages"] += 1
+            yield message
+
+    found = appended = 0
+    with open_export(path) as lines, ProcessPoolExecutor(max_workers=workers) as executor:
+        message_batches = batches(counted(split_messages(lines)), batch_size)
+        for results in parallel_map(executor, parse_batch, message_batches, workers):
+            found += len(results)
+            if not results:
+                continue
+            keys, records = zip(*results)
+            new_records = store.append(list(records), keys=list(keys))
+            appended += len(new_records)
+            if ingestor and new_records:
+                ingestor.write(new_records)
+            print(f"  {counts['messages']} mensagens lidas, {found} viagens, {appended} novas")
+    return counts["messages"], found, appended
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa mensagens antigas de um arquivo exportado do WhatsApp.")
+    parser.add_argument("arquivo", help="Conversa exportada (.txt ou .zip)")
+    parser.add_argument("--workers", type=int, default=None, help="Processos de leitura (padrão: número de CPUs)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Mensagens por lote")
+    parser.add_argument("--django", action="store_true", help="Também registra as viagens no sistema (core.Viagem)")
+    args = parser.parse_args()
+
+    ingestor = None
+    if args.django:
+        from ingest import TripIngestor
+        ingestor = TripIngestor()
+
+    store = RecordStore()
+    try:
+        messages, found, appended = backfill(args.arquivo, store, args.workers, args.batch_size, ingestor)
+    finally:
+        store.close()
+    print(f"✅ {messages} mensagens lidas, {found} registros de viagem, {appended} importados "
+          f"({found - appended} já existiam)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+End-to-end benchmark of the monitor against the local WhatsApp Web stand-in
+(fixtures/whatsapp_web.html), with headless Chrome. No WhatsApp account or
+network is needed.
+
+    python bench_monitor.py
+    python bench_monitor.py --mode polling --rate 20 --burst 20
+    python bench_monitor.py --groups 5 --count 2000 --rate 200
+
+Reports capture latency percentiles (from the moment the page added the
+message to the moment the monitor handed it to the callback), lost and
+duplicated messages, and the CPU time used by the bot and by Chrome.
+"""
+import argparse
+import contextlib
+import io
+import os
+import re
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlencode
+
+import psutil
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chrome.options import Options
+
+from bot import WhatsAppMonitor
+from dedupe import MessageDedupe
+
+FIXTURE = Path(__file__).resolve().parent / "fixtures" / "whatsapp_web.html"
+
+SEQ = re.compile(r"\[seq=(\d+) sent=(\d+)\]")
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, round(pct / 100 * (len(values) - 1)))]
+
+
+def cpu_seconds(processes):
+    total = 0.0
+    for process in processes:
+        try:
+            times = process.cpu_times()
+            total += times.user + times.system
+        except psutil.Error:
+            pass
+    return total
+
+
+def browser_processes(driver):
+    """chromedriver and every Chrome process it started."""
+    root = psutil.Process(driver.service.process.pid)
+    return [root] + root.children(recursive=True)
+
+
+def run(args):
+    groups = [f"Grupo {i + 1}" for i in range(args.groups)]
+    query = urlencode({
+        "groups": ";".join(groups), "count": args.count, "rate": args.rate,
+        "burst": args.burst, "keep": args.keep, "delay": args.delay,
+    })
+    url = f"{FIXTURE.as_uri()}?{query}"
+
+    options = Options()
+    if not args.headful:
+        options.add_argument("--headless=new")
+    options.add_argument("--window-size=1280,900")
+    driver = webdriver.Chrome(options=options)
+
+    received = {}
+    duplicates = 0
+    lock = threading.Lock()
+
+    def callback(message):
+        nonlocal duplicates
+        now = time.time() * 1000
+        match = SEQ.search(message.text)
+        if not match:
+            return
+        seq, sent = int(match.group(1)), int(match.group(2))
+        with lock:
+            if seq in received:
+                duplicates += 1
+            else:
+                received[seq] = now - sent
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dedupe = MessageDedupe(path=os.path.join(tmp, "dedupe.db"))
+        monitor = WhatsAppMonitor(groups=groups, capture_mode=args.mode, dedupe=dedupe, url=url)
+        monitor.driver = driver
+        bot_process = psutil.Process()
+        browser = browser_processes(driver)
+        cpu_before = cpu_seconds([bot_process]), cpu_seconds(browser)
+        started = time.monotonic()
+
+        def monitor_thread():
+            try:
+                monitor.start(callback)
+            except WebDriverException:
+                pass  # browser closed at the end of the run
+
+        thread = threading.Thread(target=monitor_thread, daemon=True)
+        thread.start()
+
+        # Until everything arrived, or the page is done and nothing new came for --settle seconds
+        deadline = started + args.timeout
+        last_count, last_change = 0, time.monotonic()
+        while time.monotonic() < deadline:
+            time.sleep(0.5)
+            with lock:
+                count = len(received)
+            if count >= args.count:
+                break
+            if count != last_count:
+                last_count, last_change = count, time.monotonic()
+            elif time.monotonic() - last_change > args.settle:
+                try:
+                    if driver.execute_script("return window.__fixture && window.__fixture.done"):
+                        break
+                except WebDriverException:
+                    break
+
+        elapsed = time.monotonic() - started
+        browser = browser_processes(driver)
+        cpu_bot = cpu_seconds([bot_process]) - cpu_before[0]
+        cpu_browser = cpu_seconds(browser) - cpu_before[1]
+        try:
+            sent = driver.execute_script("return window.__fixture.sent")
+        except WebDriverException:
+            sent = args.count
+        driver.quit()
+        thread.join(10)
+        dedupe.close()
+
+    return {
+        "sent": sent, "received": received, "duplicates": duplicates,
+        "elapsed": elapsed, "cpu_bot": cpu_bot, "cpu_browser": cpu_browser,
+    }
+
+
+def report(args, result):
+    latencies = list(result["received"].values())
+    elapsed = result["elapsed"]
+    print(f"Modo: {args.mode} | grupos: {args.groups} | {args.rate:g} msg/s em rajadas de {args.burst}")
+    print(
+        f"Enviadas: {result['sent']} | capturadas: {len(latencies)} "
+        f"| perdidas: {result['sent'] - len(latencies)} | duplicadas: {result['duplicates']}"
+    )
+    if latencies:
+        print(
+            f"Latência (ms): p50 {percentile(latencies, 50):.0f} | p90 {percentile(latencies, 90):.0f} "
+            f"| p99 {percentile(latencies, 99):.0f} | máx {max(latencies):.0f} | média {statistics.mean(latencies):.0f}"
+        )
+    print(
+        f"CPU em {elapsed:.1f}s: bot {result['cpu_bot']:.2f}s ({result['cpu_bot'] / elapsed:.0%}) "
+        f"| Chrome {result['cpu_browser']:.2f}s ({result['cpu_browser'] / elapsed:.0%})"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do monitor contra uma página local que imita o WhatsApp Web.")
+    parser.add_argument("--mode", choices=("observer", "polling"), default="observer")
+    parser.add_argument("--groups", type=int, default=1, help="Grupos monitorados")
+    parser.add_argument("--count", type=int, default=500, help="Mensagens enviadas")
+    parser.add_argument("--rate", type=float, default=50, help="Mensagens por segundo")
+    parser.add_argument("--burst", type=int, default=10, help="Mensagens por rajada")
+    parser.add_argument("--keep", type=int, default=100, help="Mensagens mantidas na tela por conversa")
+    parser.add_argument("--delay", type=int, default=3000, help="ms antes da primeira mensagem")
+    parser.add_argument("--timeout", type=float, default=120, help="Tempo máximo do teste (s)")
+    parser.add_argument("--settle", type=float, default=5, help="Espera final sem mensagens novas (s)")
+    parser.add_argument("--headful", action="store_true", help="Mostra o navegador")
+    parser.add_argument("--verbose", action="store_true", help="Mostra o log do robô")
+    args = parser.parse_args()
+    # The bot logs every message; keep the benchmark output readable
+    with contextlib.redirect_stdout(io.StringIO()) if not args.verbose else contextlib.nullcontext():
+        result = run(args)
+    report(args, result)
+
+
+if __name__ == "__main__":
+    main()
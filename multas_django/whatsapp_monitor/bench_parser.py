@@ -0,0 +1,119 @@
+"""
+Accuracy and throughput of parser.parse_message on the labelled corpus.
+
+    python bench_parser.py
+    python bench_parser.py --chatter 20 --seconds 3
+
+parser_corpus.json holds real message shapes: trip records in the formats
+drivers actually type (labelled with the expected fields) and group chatter
+(labelled null). Throughput is measured on a stream where chatter outnumbers
+trip records --chatter to 1, as in the group.
+"""
+import argparse
+import json
+import os
+import re
+import time
+
+from parser import parse_message
+
+CORPUS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "parser_corpus.json")
+
+FIELDS = ("nome", "placa", "km_inicial", "destino", "km_final")
+
+
+def legacy_parse_message(text):
+    """The previous parser (lower() + five uncompiled searches), kept as the baseline."""
+    if not text or "registro de viagem" not in text.lower():
+        return None
+    data = {}
+    patterns = {
+        'nome': r'Nome\s*:\s*(.+)',
+        'placa': r'Placa\s*:\s*(.+)',
+        'km_inicial': r'Km\s*Inicial\s*:\s*(\d+)',
+        'destino': r'Destino\s*:\s*(.+)',
+        'km_final': r'Km\s*final\s*:\s*(\d+)'
+    }
+    for field, pattern in patterns.items():
+        match = re.search(pattern, text, re.IGNORECASE | re.MULTILINE)
+        data[field] = match.group(1).strip() if match else None
+    return data if sum(v is not None for v in data.values()) >= 3 else None
+
+
+def load_corpus(path=CORPUS_FILE):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def accuracy(parse, corpus):
+    """
+    Precision and recall of trip detection (a detection only counts as
+    correct when every labelled field was extracted with the right value),
+    plus the share of labelled fields extracted correctly.
+    """
+    detected = correct = trips = fields_ok = fields_total = 0
+    errors = []
+    for item in corpus:
+        expected, result = item["expected"], parse(item["text"])
+        if result:
+            detected += 1
+        if not expected:
+            if result:
+                errors.append(("falso positivo", item["text"]))
+            continue
+        trips += 1
+        wrong = [f for f in FIELDS if (result or {}).get(f) != expected[f]]
+        fields_total += len(FIELDS)
+        fields_ok += len(FIELDS) - len(wrong)
+        if result and not wrong:
+            correct += 1
+        else:
+            errors.append((f"campos errados: {', '.join(wrong)}", item["text"]))
+    return {
+        "precision": correct / detected if detected else 0.0,
+        "recall": correct / trips if trips else 0.0,
+        "field_accuracy": fields_ok / fields_total if fields_total else 0.0,
+        "errors": errors,
+    }
+
+
+def throughput(parse, messages, seconds):
+    """Messages per second over repeated passes for about `seconds`."""
+    count = 0
+    start = time.perf_counter()
+    while True:
+        for text in messages:
+            parse(text)
+        count += len(messages)
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds:
+            return count / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chatter", type=int, default=10, help="Mensagens comuns por registro de viagem")
+    parser.add_argument("--seconds", type=float, default=2.0, help="Duração de cada medição")
+    parser.add_argument("--errors", action="store_true", help="Lista as mensagens com erro")
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    trips = [item["text"] for item in corpus if item["expected"]]
+    chatter = [item["text"] for item in corpus if not item["expected"]]
+    stream = trips + [chatter[i % len(chatter)] for i in range(len(trips) * args.chatter)]
+
+    print(f"Corpus: {len(trips)} registros de viagem, {len(chatter)} mensagens comuns")
+    for name, parse in (("atual", parse_message), ("anterior", legacy_parse_message)):
+        result = accuracy(parse, corpus)
+        rate = throughput(parse, stream, args.seconds)
+        print(
+            f"{name:>9}: {rate:>10,.0f} msg/s | precisão {result['precision']:.1%} "
+            f"| revocação {result['recall']:.1%} | campos {result['field_accuracy']:.1%}"
+        )
+        if args.errors:
+            for reason, text in result["errors"]:
+                print(f"           - {reason}: {text[:60]!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,251 @@
 import time
 import os
+import threading
+from collections import namedtuple
+from concurrent.futures import Future
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import (
+    JavascriptException, SessionNotCreatedException, TimeoutException, WebDriverException,
+)
+import psutil
+from dedupe import MessageDedupe
+
+WHATSAPP_URL = "https://web.whatsapp.com"
+
+# Path of the chromedriver installed by webdriver-manager, reused on the next
+# starts instead of resolving it again (CHROMEDRIVER_PATH pins a binary)
+DRIVER_CACHE = "chromedriver_path.txt"
+
+# Browser memory (RSS of all Chrome processes, MB) above which the page is
+# reloaded; if it is still above after the reload, Chrome is restarted
+MAX_BROWSER_MB = 1500
+
+# Seconds between two memory checks
+WATCHDOG_INTERVAL = 60
+
+# Seconds before restarting a crashed browser (doubles up to RESTART_DELAY_MAX;
+# back to RESTART_DELAY once a session ran for STABLE_AFTER seconds)
+RESTART_DELAY = 5
+RESTART_DELAY_MAX = 300
+STABLE_AFTER = 600
+
+# Older messages loaded (scrolling up) when a group is opened, looking for the
+# last message processed before a restart
+CATCH_UP_STEPS = 20
+
+# Seconds a drain call waits for new messages before returning an empty batch
+DRAIN_TIMEOUT = 25
+
+# Installs a MutationObserver on the open chat pane (#main). Every incoming
+# message bubble (.message-in) added to the DOM is pushed, once per data-id,
+# into window.__waMonitor.queue, tagged with the open group. A second
+# observer on the chat list (#pane-side) flags the other watched groups that
+# show an unread badge. Returns false while no chat is open.
+INSTALL_OBSERVER_JS = r"""
+const [includeVisible, group, watched] = arguments;
+const pane = document.querySelector('#main');
+if (!pane) return false;
+const current = window.__waMonitor;
+if (current && current.pane === pane && current.group === group) return true;
+if (current) {
+    current.observer.disconnect();
+    if (current.listObserver) current.listObserver.disconnect();
+}
+
+const monitor = {
+    pane: pane, group: group, queue: [], unread: [],
+    seen: current ? current.seen : new Set(), waiter: null, observer: null, listObserver: null,
+};
+const MAX_SEEN = 5000;
+const wake = () => { if (monitor.waiter) monitor.waiter(); };
+
+const push = (bubble) => {
+    // data-id is WhatsApp's stable message id; it lives on an ancestor row
+    const row = bubble.closest('[data-id]') || bubble;
+    const text = (bubble.querySelector('span.selectable-text') || bubble).innerText;
+    const id = row.getAttribute('data-id') || text;
+    if (!id || monitor.seen.has(id)) return;
+    monitor.seen.add(id);
+    if (monitor.seen.size > MAX_SEEN) {
+        monitor.seen.delete(monitor.seen.values().next().value);
+    }
+    // "[05:12, 25/11/2025] Sender: ": when the message was sent, and by whom
+    const meta = bubble.querySelector('[data-pre-plain-text]');
+    const header = meta ? meta.getAttribute('data-pre-plain-text') : null;
+    monitor.queue.push({id: id, text: text, group: group, header: header});
+};
+const scan = (node) => {
+    if (node.nodeType !== Node.ELEMENT_NODE) return;
+    if (node.matches('.message-in')) push(node);
+    node.querySelectorAll('.message-in').forEach(push);
+};
+
+monitor.observer = new MutationObserver((mutations) => {
+    for (const mutation of mutations) mutation.addedNodes.forEach(scan);
+    if (monitor.queue.length) wake();
+});
+monitor.observer.observe(pane, {childList: true, subtree: true});
+if (includeVisible) scan(pane);
+
+// Watched groups (other than the open one) whose row in the chat list has an unread badge
+const others = new Set(watched.filter((name) => name !== group));
+const checkUnread = () => {
+    monitor.checkScheduled = false;
+    const side = document.querySelector('#pane-side');
+    if (!side) return;
+    const unread = [];
+    side.querySelectorAll('span[title]').forEach((title) => {
+        const name = title.getAttribute('title');
+        if (!others.has(name) || unread.includes(name)) return;
+        const row = title.closest('[role="listitem"], [role="row"]');
+        if (row && row.querySelector('[aria-label*="unread" i], [aria-label*="não lida" i]')) unread.push(name);
+    });
+    monitor.unread = unread;
+    if (unread.length) wake();
+};
+const side = document.querySelector('#pane-side');
+if (side && others.size) {
+    // The list changes on every message of every chat: check at most every 250 ms
+    monitor.listObserver = new MutationObserver(() => {
+        if (monitor.checkScheduled) return;
+        monitor.checkScheduled = true;
+        setTimeout(checkUnread, 250);
+    });
+    monitor.listObserver.observe(side, {childList: true, subtree: true, characterData: true, attributes: true});
+    checkUnread();
+}
+window.__waMonitor = monitor;
+return true;
+"""
+
+# Long-poll: resolves with {messages, unread} as soon as the queue has
+# messages or a watched group (not in arguments[1]) has unread messages, or
+# after arguments[0] ms. Resolves with null when the observer is gone (page
+# reload or another chat opened) so Python installs it again.
+DRAIN_MESSAGES_JS = r"""
+const timeoutMs = arguments[0];
+const ignore = arguments[1];
+const done = arguments[arguments.length - 1];
+const monitor = window.__waMonitor;
+if (!monitor || !monitor.pane.isConnected) { done(null); return; }
+const take = () => ({
+    messages: monitor.queue.splice(0),
+    unread: monitor.unread.filter((name) => !ignore.includes(name)),
+});
+let result = take();
+if (result.messages.length || result.unread.length) { done(result); return; }
+const timer = setTimeout(() => { monitor.waiter = null; done(take()); }, timeoutMs);
+monitor.waiter = () => {
+    result = take();
+    if (!result.messages.length && !result.unread.length) return;
+    clearTimeout(timer);
+    monitor.waiter = null;
+    done(result);
+};
+"""
+
+# Scrolls the open chat up until the message arguments[0] is loaded (at most
+# arguments[1] times), then back to the bottom. The older bubbles loaded on the
+# way are picked up by the observer. Resolves with true if the message was found.
+CATCH_UP_JS = r"""
+const [lastId, maxSteps] = arguments;
+const done = arguments[arguments.length - 1];
+const pane = document.querySelector('#main');
+const first = pane && pane.querySelector('[data-id]');
+if (!first) { done(false); return; }
+let list = first.parentElement;
+while (list && list !== pane && list.scrollHeight <= list.clientHeight) list = list.parentElement;
+const found = () => [...pane.querySelectorAll('[data-id]')].some((row) => row.getAttribute('data-id') === lastId);
+let steps = 0;
+const step = () => {
+    if (found() || steps++ >= maxSteps || !list) {
+        if (list) list.scrollTop = list.scrollHeight;
+        done(found());
+        return;
+    }
+    list.scrollTop = 0;
+    setTimeout(step, 800);
+};
+step();
+"""
+
+# Seconds before trying again to open a group that could not be found
+GROUP_RETRY_DELAY = 60
+
+# A message captured by the bot, with the group it was sent to
+IncomingMessage = namedtuple("IncomingMessage", "text group header", defaults=(None,))
+
+
+def xpath_literal(text):
+    """Quotes a string for an XPath expression (group names may contain quotes)."""
+    if "'" not in text:
+        return f"'{text}'"
+    if '"' not in text:
+        return f'"{text}"'
+    return "concat(" + ", \"'\", ".join(f"'{part}'" for part in text.split("'")) + ")"
+
+
+def chromedriver_path(refresh=False):
+    """
+    chromedriver binary: CHROMEDRIVER_PATH if set, else the one cached by a
+    previous start, else installed by webdriver-manager (and cached).
+    """
+    pinned = os.environ.get("CHROMEDRIVER_PATH")
+    if pinned:
+        return pinned
+    if not refresh and os.path.exists(DRIVER_CACHE):
+        with open(DRIVER_CACHE, encoding="utf-8") as f:
+            path = f.read().strip()
+        if os.path.exists(path):
+            return path
+    path = ChromeDriverManager().install()
+    with open(DRIVER_CACHE, "w", encoding="utf-8") as f:
+        f.write(path)
+    return path
+
+
+class BrowserRestart(Exception):
+    """Raised inside the monitoring loop to have run_forever() start a new browser."""
+
 
 class WhatsAppMonitor:
-    def __init__(self, target_group="Motoristas secretarias de obras"):
-        self.target_group = target_group
+    def __init__(self, groups=("Motoristas secretarias de obras",), capture_mode="observer", dedupe=None,
+                 url=WHATSAPP_URL, headless=False, max_browser_mb=MAX_BROWSER_MB):
+        """
+        :param groups: Names of the groups to watch (a single name is accepted)
+        :param capture_mode: "observer" (MutationObserver pushes new messages
+            as they arrive) or "polling" (re-reads the DOM every 2 seconds)
+        :param dedupe: MessageDedupe store of processed message ids
+            (default: mensagens_processadas.db in the working directory)
+        :param url: Page to open (the local fixture in benchmarks)
+        :param headless: Run Chrome without a window (needs a saved login)
+        :param max_browser_mb: Memory limit of the watchdog (0 disables it)
+        """
+        self.url = url
+        self.groups = [groups] if isinstance(groups, str) else list(groups)
+        self.capture_mode = capture_mode
+        self.dedupe = dedupe or MessageDedupe()
+        self.headless = headless
+        self.max_browser_mb = max_browser_mb
         self.driver = None
-        
+        self.current_group = None
+        # group -> monotonic time of the last visit / of the last failed attempt to open it
+        self._last_visit = {}
+        self._failed_at = {}
+        self._catch_up = False
+        self._next_watchdog = 0
+        self._reloaded = False
+        # Ids handed to an asynchronous callback and not finished yet
+        self._in_flight = set()
+        self._in_flight_lock = threading.Lock()
+
     def setup_driver(self):
         """Sets up Chrome Driver with persistent profile."""
         options = Options()
@@ -21,12 +254,29 @@ class WhatsAppMonitor:
         options.add_argument(f"user-data-dir={user_data_dir}")
         
         # Additional options for stability
-        options.add_argument("--start-maximized")
         options.add_argument("--disable-infobars")
         options.add_argument("--disable-extensions")
+        if self.headless:
+            options.add_argument("--headless=new")
+            options.add_argument("--window-size=1280,900")
+            # Only text is read: skip images, audio and background work
+            options.add_argument("--blink-settings=imagesEnabled=false")
+            options.add_argument("--mute-audio")
+            options.add_argument("--disable-background-networking")
+            options.add_argument("--disable-renderer-backgrounding")
+        else:
+            options.add_argument("--start-maximized")
         
         print("🚀 Iniciando navegador...")
-        self.driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
+        try:
+            self.driver = webdriver.Chrome(service=Service(chromedriver_path()), options=options)
+        except SessionNotCreatedException:
+            # Chrome updated itself and no longer matches the cached driver
+            self.driver = webdriver.Chrome(service=Service(chromedriver_path(refresh=True)), options=options)
+        if self.headless:
+            # WhatsApp Web refuses the "HeadlessChrome" user agent
+            user_agent = self.driver.execute_script("return navigator.userAgent").replace("HeadlessChrome", "Chrome")
+            self.driver.execute_cdp_cmd("Network.setUserAgentOverride", {"userAgent": user_agent})
         
     def start(self, message_handler_callback):
         """
@@ -37,7 +287,7 @@ class WhatsAppMonitor:
             self.setup_driver()
             
         print("🌐 Abrindo WhatsApp Web...")
-        self.driver.get("https://web.whatsapp.com")
+        self.driver.get(self.url)
         
         print("⏳ Aguardando login... (Escaneie o QR Code se necessário)")
         # Wait for chat list to load (indicating login success)
@@ -46,36 +296,258 @@ class WhatsAppMonitor:
                 EC.presence_of_element_located((By.ID, "pane-side"))
             )
             print("✅ Login detectado!")
-        except:
+        except TimeoutException:
+            if self.headless:
+                # Nobody can scan the QR Code without a window
+                raise BrowserRestart("login não encontrado; rode uma vez sem HEADLESS para escanear o QR Code")
             print("⚠️ Tempo de espera esgotado. Verifique se o login foi feito.")
             # Continue anyway, user might login later
         
-        self.find_and_open_group()
+        self._next_watchdog = time.monotonic() + WATCHDOG_INTERVAL
+        self._reloaded = False
+        self.open_first_group()
         self.monitor_messages(message_handler_callback)
-        
-    def find_and_open_group(self):
-        """Searches and opens the specific group."""
-        print(f"🔍 Procurando grupo: '{self.target_group}'...")
+
+    def run_forever(self, message_handler_callback):
+        """
+        Service mode: runs start() and, when the browser crashes or the
+        watchdog asks for it, quits Chrome and starts it again after an
+        exponential backoff. Already processed messages are not repeated
+        and each group resumes from its last seen message.
+        """
+        failures = 0
         while True:
+            started = time.monotonic()
             try:
-                # Try to find group in the list using title attribute
-                # This XPath matches span with title='Group Name'
-                group_xpath = f"//span[@title='{self.target_group}']"
-                group_element = self.driver.find_element(By.XPATH, group_xpath)
-                group_element.click()
-                print(f"✅ Grupo '{self.target_group}' aberto!")
-                break
-            except Exception:
-                # If not found, maybe scroll or search? 
-                # For simplicity, we ask user to ensure group is visible or search manually if needed first time
-                # But let's try to simple wait
-                print("⏳ Grupo não encontrado na tela visível. Aguardando 5s... (Role a lista se necessário)")
-                time.sleep(5)
+                self.start(message_handler_callback)
+            except BrowserRestart as e:
+                print(f"🔁 Reiniciando navegador: {e}")
+            except WebDriverException as e:
+                print(f"❌ Navegador parou: {e.msg}")
+            finally:
+                self.quit_browser()
+            failures = 1 if time.monotonic() - started > STABLE_AFTER else failures + 1
+            delay = min(RESTART_DELAY_MAX, RESTART_DELAY * 2 ** (failures - 1))
+            print(f"⏳ Nova tentativa em {delay}s...")
+            time.sleep(delay)
+
+    def browser_rss_mb(self):
+        """Resident memory of chromedriver and every Chrome process, in MB."""
+        try:
+            root = psutil.Process(self.driver.service.process.pid)
+            processes = [root] + root.children(recursive=True)
+        except (AttributeError, psutil.Error):
+            return 0
+        total = 0
+        for process in processes:
+            try:
+                total += process.memory_info().rss
+            except psutil.Error:
+                pass
+        return total / 1024 / 1024
+
+    def check_memory(self):
+        """
+        Watchdog, called from the monitoring loop: reloads the page when
+        Chrome goes over max_browser_mb, and asks for a browser restart if
+        it is still over at the next check.
+        """
+        if not self.max_browser_mb or time.monotonic() < self._next_watchdog:
+            return
+        self._next_watchdog = time.monotonic() + WATCHDOG_INTERVAL
+        rss = self.browser_rss_mb()
+        if rss <= self.max_browser_mb:
+            self._reloaded = False
+            return
+        if self._reloaded:
+            raise BrowserRestart(f"memória do navegador em {rss:.0f} MB mesmo após recarregar")
+        print(f"🧹 Navegador usando {rss:.0f} MB, recarregando a página...")
+        self._reloaded = True
+        self.driver.refresh()
+        WebDriverWait(self.driver, 60).until(EC.presence_of_element_located((By.ID, "pane-side")))
+        group = self.current_group
+        if not (group and self.open_group(group)):
+            self.open_first_group()
+
+    def quit_browser(self):
+        if self.driver:
+            try:
+                self.driver.quit()
+            except WebDriverException:
+                pass
+            self.driver = None
+        self.current_group = None
+
+    def open_group(self, group):
+        """
+        Opens a group by its title in the chat list, or through the search
+        box when it is scrolled out of the list. Returns False if not found.
+        """
+        group_xpath = f"//div[@id='pane-side']//span[@title={xpath_literal(group)}]"
+        search = None
+        try:
+            elements = self.driver.find_elements(By.XPATH, group_xpath)
+            if elements:
+                elements[0].click()
+            else:
+                search = self.driver.find_element(By.CSS_SELECTOR, "#side div[contenteditable='true']")
+                search.click()
+                search.send_keys(group)
+                WebDriverWait(self.driver, 5).until(
+                    EC.element_to_be_clickable((By.XPATH, group_xpath))
+                ).click()
+        except WebDriverException:
+            self._failed_at[group] = time.monotonic()
+            print(f"⚠️ Grupo '{group}' não encontrado. Nova tentativa em {GROUP_RETRY_DELAY}s.")
+            return False
+        finally:
+            if search is not None:
+                # Clear the search, or the chat list would only show this group
+                try:
+                    search.send_keys(Keys.CONTROL, "a")
+                    search.send_keys(Keys.BACKSPACE)
+                except WebDriverException:
+                    pass
+        self.current_group = group
+        self._catch_up = True
+        self._last_visit[group] = time.monotonic()
+        self._failed_at.pop(group, None)
+        print(f"✅ Grupo '{group}' aberto!")
+        return True
+
+    def open_first_group(self):
+        """Opens the first watched group that can be found, waiting until one shows up."""
+        print(f"🔍 Procurando grupos: {', '.join(self.groups)}...")
+        while not any(self.open_group(group) for group in self.groups):
+            print("⏳ Nenhum grupo encontrado. Aguardando 5s... (Role a lista se necessário)")
+            time.sleep(5)
+
+    def _groups_on_hold(self):
+        """Groups that failed to open recently; their unread badges are ignored for a while."""
+        now = time.monotonic()
+        return [group for group, failed in self._failed_at.items() if now - failed < GROUP_RETRY_DELAY]
+
+    def handle_message(self, message_id, text, callback, group=None, header=None):
+        """
+        Runs the callback once per WhatsApp message id, across restarts.
+
+        The id is marked as processed only once the message was handled: when
+        the callback returns, or, if it returns a Future (MessagePipeline.submit),
+        when that Future succeeds. A message given up or still queued when the
+        process stops is not marked, so it is captured again.
+
+        :param header: data-pre-plain-text of the bubble (send time and sender)
+        """
+        if not text:
+            return
+        with self._in_flight_lock:
+            if message_id in self._in_flight:
+                return
+        # Checked after _in_flight: a finished message is marked before it leaves it
+        if self.dedupe.seen(message_id):
+            return
+        with self._in_flight_lock:
+            self._in_flight.add(message_id)
+        group = group or self.current_group
+        print(f"📩 Nova mensagem detectada ({group}): {text[:30]}...")
+        try:
+            result = callback(IncomingMessage(text, group, header))
+        except BaseException:
+            self._finish(message_id, group, handled=False)
+            raise
+        if isinstance(result, Future):
+            result.add_done_callback(lambda done: self._finish(message_id, group, done.exception() is None))
+        else:
+            self._finish(message_id, group, handled=True)
+
+    def _finish(self, message_id, group, handled):
+        """Marks a handled message as processed and forgets it as in flight."""
+        try:
+            if handled:
+                self.dedupe.mark(message_id, group)
+        finally:
+            with self._in_flight_lock:
+                self._in_flight.discard(message_id)
 
     def monitor_messages(self, callback):
         """Loop to read new messages."""
-        print("👀 Monitorando novas mensagens...")
-        processed_messages = set()
+        if self.capture_mode == "polling":
+            self.poll_messages(callback)
+        else:
+            self.observe_messages(callback)
+
+    def observe_messages(self, callback):
+        """
+        Event-driven capture: the injected MutationObserver queues every new
+        message in the browser and each execute_async_script call drains the
+        queue, returning as soon as something arrives. Bursts are never lost:
+        everything added between two drains is in the next batch.
+
+        With several groups, the same call also reports the watched groups
+        that got an unread badge in the chat list; the monitor then opens the
+        one visited longest ago and captures its new messages. Only one chat
+        is observed at a time, so the cost follows the message volume, not
+        the number of groups.
+        """
+        print("👀 Monitorando novas mensagens (observer)...")
+        self.driver.set_script_timeout(DRAIN_TIMEOUT + 10)
+        installed = False
+
+        while True:
+            try:
+                if not installed:
+                    installed = self.driver.execute_script(
+                        INSTALL_OBSERVER_JS, True, self.current_group, self.groups
+                    )
+                    if not installed:
+                        # Chat pane not open (yet)
+                        time.sleep(1)
+                        continue
+                if self._catch_up:
+                    self.catch_up()
+                self.check_memory()
+                batch = self.driver.execute_async_script(
+                    DRAIN_MESSAGES_JS, DRAIN_TIMEOUT * 1000, self._groups_on_hold()
+                )
+            except (JavascriptException, TimeoutException) as e:
+                print(f"⚠️ Observer reiniciado: {e.msg}")
+                installed = False
+                continue
+
+            if batch is None:
+                # Page reloaded or chat pane replaced
+                installed = False
+                continue
+
+            for message in batch["messages"]:
+                self.handle_message(message["id"], message["text"], callback, message["group"], message.get("header"))
+
+            if batch["unread"]:
+                group = min(batch["unread"], key=lambda name: self._last_visit.get(name, 0))
+                if self.open_group(group):
+                    installed = False
+
+    def catch_up(self):
+        """
+        Loads the older messages of the open group back to the last one
+        processed, so messages sent while the monitor was down (or while it
+        was in another group) are captured even if they scrolled off screen.
+        """
+        self._catch_up = False
+        last_id = self.dedupe.last_seen(self.current_group)
+        if not last_id:
+            return
+        found = self.driver.execute_async_script(CATCH_UP_JS, last_id, CATCH_UP_STEPS)
+        if not found:
+            print(f"⚠️ Última mensagem lida de '{self.current_group}' não encontrada; "
+                  f"mensagens mais antigas podem ter ficado de fora (veja backfill.py).")
+
+    def poll_messages(self, callback):
+        """
+        Fallback capture that re-reads the last bubbles every 2 seconds.
+        Only watches the open group (no rotation between groups).
+        """
+        print("👀 Monitorando novas mensagens (polling)...")
         
         while True:
             try:
@@ -86,28 +558,29 @@ class WhatsAppMonitor:
                 
                 for msg in messages[-5:]: # Check only last 5 to be efficient
                     try:
-                        text_element = msg.find_element(By.CLASS_NAME, "_11JPr") # Common text class, might need adjustment
-                        # Fallback if class changed: try generic span inside
-                        # text = msg.text
-                    except:
+                        text = msg.find_element(By.CSS_SELECTOR, "span.selectable-text").text
+                    except WebDriverException:
                         # Fallback to getting full text of message div
                         text = msg.text
+
+                    try:
+                        message_id = msg.find_element(By.XPATH, "./ancestor-or-self::div[@data-id][1]").get_attribute("data-id")
+                    except WebDriverException:
+                        message_id = text
+
+                    try:
+                        header = msg.find_element(By.CSS_SELECTOR, "[data-pre-plain-text]").get_attribute("data-pre-plain-text")
+                    except WebDriverException:
+                        header = None
+
+                    self.handle_message(message_id, text, callback, header=header)
                         
-                    # Use a hash or just text to identify processed
-                    # Simple check: if we processed this specific object text content recently
-                    # Using (text, timestamp) or just raw text if unique enough
-                    
-                    if text and text not in processed_messages:
-                        print(f"📩 Nova mensagem detectada: {text[:30]}...")
-                        callback(text)
-                        processed_messages.add(text)
-                        
-            except Exception as e:
-                # print(f"⚠️ Erro no loop de monitoramento: {e}")
-                pass
+            except WebDriverException as e:
+                print(f"⚠️ Erro no loop de monitoramento: {e.msg}")
             
+            self.check_memory()
             time.sleep(2) # Poll interval
 
     def close(self):
-        if self.driver:
-            self.driver.quit()
+        self.quit_browser()
+        self.dedupe.close()
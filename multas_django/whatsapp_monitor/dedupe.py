@@ -0,0 +1,114 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+DEDUPE_DB = "mensagens_processadas.db"
+
+# Message ids kept in memory (the SQLite table holds the rest)
+CACHE_SIZE = 10000
+
+# Processed ids older than this are forgotten
+RETENTION_DAYS = 30
+
+# Expired ids are purged at most this often (seconds)
+PRUNE_INTERVAL = 3600
+
+
+class MessageDedupe:
+    """
+    Remembers which WhatsApp messages were already processed, by their
+    stable message id (the data-id attribute of the bubble).
+
+    Lookups hit a bounded in-memory LRU first and fall back to a small
+    indexed SQLite table, so memory stays flat over weeks of uptime and a
+    restart does not reprocess messages that are still on screen. Safe to
+    share between threads: the pipeline workers mark the messages they handled.
+    """
+
+    def __init__(self, path=None, cache_size=CACHE_SIZE, retention_days=RETENTION_DAYS):
+        self.path = path or os.path.join(os.getcwd(), DEDUPE_DB)
+        self.cache_size = cache_size
+        self.retention = retention_days * 86400
+        self._cache = OrderedDict()
+        self._last_prune = 0
+        self._lock = threading.RLock()
+
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS processed_messages ("
+            "message_id TEXT PRIMARY KEY, processed_at REAL NOT NULL)"
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_processed_at ON processed_messages (processed_at)"
+        )
+        # Last message processed per group, where a restarted monitor resumes from
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS last_seen ("
+            "group_name TEXT PRIMARY KEY, message_id TEXT NOT NULL, seen_at REAL NOT NULL)"
+        )
+        self.conn.commit()
+        self.prune()
+
+    def _remember(self, message_id):
+        self._cache[message_id] = True
+        self._cache.move_to_end(message_id)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def seen(self, message_id):
+        """True if the message was already processed (within the retention window)."""
+        with self._lock:
+            if message_id in self._cache:
+                self._cache.move_to_end(message_id)
+                return True
+            row = self.conn.execute(
+                "SELECT processed_at FROM processed_messages WHERE message_id = ?", (message_id,)
+            ).fetchone()
+            if row and row[0] >= time.time() - self.retention:
+                self._remember(message_id)
+                return True
+            return False
+
+    def mark(self, message_id, group=None):
+        """
+        Record a message as processed (committed immediately, so it survives a crash).
+        With a group, it also becomes that group's last seen message.
+        """
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO processed_messages (message_id, processed_at) VALUES (?, ?)",
+                (message_id, now),
+            )
+            if group:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO last_seen (group_name, message_id, seen_at) VALUES (?, ?, ?)",
+                    (group, message_id, now),
+                )
+            self.conn.commit()
+            self._remember(message_id)
+            if time.time() - self._last_prune > PRUNE_INTERVAL:
+                self.prune()
+
+    def last_seen(self, group):
+        """Id of the last message processed in a group, or None."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT message_id FROM last_seen WHERE group_name = ?", (group,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def prune(self):
+        """Forget ids older than the retention window."""
+        with self._lock:
+            self.conn.execute(
+                "DELETE FROM processed_messages WHERE processed_at < ?", (time.time() - self.retention,)
+            )
+            self.conn.commit()
+            self._last_prune = time.time()
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
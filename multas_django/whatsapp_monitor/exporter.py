@@ -1,38 +1,144 @@
-import pandas as pd
+import json
 import os
+import sqlite3
+import tempfile
+import threading
+
+import pandas as pd
 
 EXCEL_FILE = "dados_extraidos.xlsx"
 
-def save_to_excel(data_list: list[dict], filename: str = EXCEL_FILE):
+# Append-only log of every parsed record; the Excel file is generated from it
+STORE_DB = "registros_viagens.db"
+
+# Seconds between two Excel snapshots (only written when there are new records)
+EXPORT_INTERVAL = 60
+
+
+class RecordStore:
     """
-    Saves a list of dictionaries to an Excel file.
-    Appends to existing file if it exists.
+    Durable, append-only store of parsed messages.
+
+    Each append is a single INSERT committed on its own, so the cost per
+    message does not grow with the number of records already saved, and a
+    crash can only lose the record being written.
     """
-    if not data_list:
-        return
 
-    df_new = pd.DataFrame(data_list)
-    
-    if os.path.exists(filename):
+    def __init__(self, path: str = STORE_DB, excel_file: str = EXCEL_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS records ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, data TEXT NOT NULL)"
+        )
+        # Idempotency keys of records that may be appended more than once (backfills)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS record_keys (key TEXT PRIMARY KEY)")
+        self.conn.commit()
+        self._lock = threading.Lock()
+        self._import_existing_excel(excel_file)
+
+    def _import_existing_excel(self, excel_file):
+        """Seed an empty store with the rows of an Excel file written by older versions."""
+        if self.last_id() or not os.path.exists(excel_file):
+            return
+        rows = pd.read_excel(excel_file).astype(object).where(lambda df: df.notna(), None)
+        self.append(rows.to_dict("records"))
+        print(f"📥 {len(rows)} registros importados de {excel_file}")
+
+    def append(self, data_list: list[dict], keys: list[str] | None = None) -> list[dict]:
+        """
+        Appends records in one transaction.
+
+        :param keys: Optional idempotency key per record; records whose key
+            was already appended are skipped
+        :return: The records actually appended
+        """
+        if not data_list:
+            return []
+        with self._lock, self.conn:
+            if keys is not None:
+                data_list = [
+                    data for key, data in zip(keys, data_list)
+                    if self.conn.execute("INSERT OR IGNORE INTO record_keys (key) VALUES (?)", (key,)).rowcount
+                ]
+            self.conn.executemany(
+                "INSERT INTO records (data) VALUES (?)",
+                [(json.dumps(data, ensure_ascii=False, default=str),) for data in data_list],
+            )
+        return data_list
+
+    def last_id(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM records").fetchone()[0]
+
+    def records(self) -> list[dict]:
+        with self._lock:
+            rows = self.conn.execute("SELECT data FROM records ORDER BY id").fetchall()
+        return [json.loads(data) for data, in rows]
+
+    def close(self):
+        self.conn.close()
+
+
+def export_to_excel(store: RecordStore, filename: str = EXCEL_FILE) -> int:
+    """
+    Writes every stored record to an Excel file.
+
+    The workbook is written to a temporary file in the same folder and then
+    renamed over the old one, so readers never see a half-written file.
+    Returns the number of rows written.
+    """
+    records = store.records()
+    folder = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_path = tempfile.mkstemp(suffix=".xlsx", dir=folder)
+    os.close(fd)
+    try:
+        pd.DataFrame(records).to_excel(tmp_path, index=False)
+        os.replace(tmp_path, filename)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return len(records)
+
+
+class PeriodicExcelExport(threading.Thread):
+    """Background thread that refreshes the Excel file when new records arrive."""
+
+    def __init__(self, store: RecordStore, filename: str = EXCEL_FILE, interval: float = EXPORT_INTERVAL):
+        super().__init__(daemon=True)
+        self.store = store
+        self.filename = filename
+        self.interval = interval
+        self._exported_id = None
+        self._stop_event = threading.Event()
+
+    def export_if_changed(self):
+        last_id = self.store.last_id()
+        if last_id == self._exported_id:
+            return
         try:
-            # Read existing
-            df_existing = pd.read_excel(filename)
-            # Concat
-            df_combined = pd.concat([df_existing, df_new], ignore_index=True)
-            # Save
-            df_combined.to_excel(filename, index=False)
-            print(f"✅ {len(data_list)} novos registros salvos em {filename}")
+            count = export_to_excel(self.store, self.filename)
+            self._exported_id = last_id
+            print(f"✅ {self.filename} atualizado ({count} registros)")
         except Exception as e:
             print(f"❌ Erro ao salvar Excel: {e}")
-    else:
-        # Create new
-        try:
-            df_new.to_excel(filename, index=False)
-            print(f"✅ Arquivo {filename} criado com {len(data_list)} registros")
-        except Exception as e:
-            print(f"❌ Erro ao criar Excel: {e}")
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.export_if_changed()
+
+    def stop(self):
+        """Stops the thread and writes a final snapshot."""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+        self.export_if_changed()
+
 
 if __name__ == "__main__":
-    # Test
-    dummy = [{'timestamp': '2023-10-20', 'nome': 'Teste', 'placa': 'ABC', 'km_inicial': 100, 'km_final': 200}]
-    save_to_excel(dummy)
+    # On demand export: python exporter.py
+    store = RecordStore()
+    count = export_to_excel(store)
+    print(f"✅ {count} registros exportados para {EXCEL_FILE}")
+    store.close()
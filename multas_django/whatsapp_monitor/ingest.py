@@ -0,0 +1,252 @@
+"""
+Direct ingestion of parsed trip messages into the Django app (core.Viagem).
+
+Records from parser.parse_message are queued and inserted in small batches by
+a background thread. Driver names and plates typed by the drivers are
+resolved with core.resolution.ResolutionIndex (accents, typos, old/Mercosul
+plates), rebuilt only when those tables change. Records that cannot be
+resolved with enough confidence go to core.ViagemPendente for review.
+
+A batch that fails on a transient database error ("database is locked", a
+dropped connection) is retried with backoff; one that still fails is written
+record by record, and the records that fail on their own go to
+ViagemPendente with the error, so a bad record never takes its batch down.
+"""
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+# Maximum records inserted per transaction
+BATCH_SIZE = 50
+
+# Seconds a record may wait for its batch to fill up
+BATCH_WAIT = 1.0
+
+# Attempts for a batch failing on a transient database error, waiting
+# RETRY_BACKOFF, 2 * RETRY_BACKOFF, ... seconds between them
+BATCH_ATTEMPTS = 3
+RETRY_BACKOFF = 0.5
+
+DJANGO_PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_django():
+    """Makes the multas_django project importable and configures Django."""
+    if DJANGO_PROJECT_DIR not in sys.path:
+        sys.path.insert(0, DJANGO_PROJECT_DIR)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+    import django
+    django.setup()
+
+
+def to_decimal(value):
+    if value in (None, ""):
+        return None
+    try:
+        return Decimal(str(value).strip().replace(",", "."))
+    except InvalidOperation:
+        return None
+
+
+class TripIngestor:
+    """
+    Background worker that turns parsed trip messages into Viagem rows.
+
+    submit() only enqueues; the worker thread groups records into batches of
+    up to BATCH_SIZE (or whatever arrived within BATCH_WAIT seconds) and
+    writes each batch in one transaction.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, batch_wait=BATCH_WAIT, attempts=BATCH_ATTEMPTS, backoff=RETRY_BACKOFF):
+        setup_django()
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.attempts = attempts
+        self.backoff = backoff
+        from core.resolution import ResolutionIndex
+        self.index = ResolutionIndex()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._stopping = threading.Event()
+
+    def start(self):
+        self._thread.start()
+
+    def submit(self, record):
+        self._queue.put(record)
+
+    def stop(self):
+        """Waits for the queued records to be written."""
+        self._stopping.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _next_batch(self):
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=self.batch_wait))
+        except queue.Empty:
+            return batch
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        from django.db import close_old_connections
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if not batch:
+                continue
+            close_old_connections()
+            from core import metrics
+            created, pending, failed = self.write(batch)
+            print(f"🚚 {created} viagens registradas, {pending} para revisão")
+            metrics.WHATSAPP_RECORDS.inc(created, result="created")
+            metrics.WHATSAPP_RECORDS.inc(pending, result="pending")
+            metrics.WHATSAPP_RECORDS.inc(failed, result="failed")
+            # Only live messages: backfill calls ingest() directly with old ones
+            now = datetime.now()
+            for record in batch:
+                try:
+                    sent = datetime.strptime(record["timestamp"], "%Y-%m-%d %H:%M:%S")
+                except (KeyError, TypeError, ValueError):
+                    continue
+                metrics.WHATSAPP_LAG.observe(max((now - sent).total_seconds(), 0.0))
+
+    def write(self, batch):
+        """
+        ingest() with retries. A batch that still fails is written record by
+        record; records failing on their own are sent to review with the error.
+
+        :return: (trips created, records sent to review, records not saved)
+        """
+        from django.db import OperationalError, close_old_connections
+
+        for attempt in range(1, self.attempts + 1):
+            try:
+                return (*self.ingest(batch), 0)
+            except OperationalError as e:
+                error = e
+                if attempt < self.attempts:
+                    time.sleep(self.backoff * 2 ** (attempt - 1))
+                    close_old_connections()
+            except Exception as e:
+                error = e
+                break
+        print(f"⚠️ Erro ao registrar {len(batch)} viagens ({error}), registrando uma a uma")
+
+        created = pending = failed = 0
+        for record in batch:
+            try:
+                record_created, record_pending = self.ingest([record])
+            except Exception as e:
+                try:
+                    self.pending(record, f"Erro ao registrar: {e}"[:200]).save()
+                except Exception as save_error:
+                    # Still in the append-only store: a backfill of the export can recover it
+                    print(f"❌ Erro ao registrar a viagem de {record.get('nome')!r}: {save_error}")
+                    failed += 1
+                    continue
+                record_created, record_pending = 0, 1
+            created += record_created
+            pending += record_pending
+        return created, pending, failed
+
+    def pending(self, record, motivo):
+        """An unsaved ViagemPendente for a record that needs review."""
+        from django.utils import timezone
+        from core.models import ViagemPendente
+
+        try:
+            recebido_em = timezone.make_aware(datetime.strptime(record["timestamp"], "%Y-%m-%d %H:%M:%S"))
+        except (KeyError, TypeError, ValueError):
+            recebido_em = timezone.now()
+        return ViagemPendente(
+            recebido_em=recebido_em,
+            nome=(record.get("nome") or "")[:200],
+            placa=(record.get("placa") or "")[:20],
+            destino=(record.get("destino") or "")[:200],
+            km_inicial=to_decimal(record.get("km_inicial")),
+            km_final=to_decimal(record.get("km_final")),
+            texto=record.get("raw_text") or "",
+            motivo=motivo,
+        )
+
+    def build(self, record):
+        """
+        Returns an unsaved Viagem for a resolvable record, or else a
+        ViagemPendente with the reason it needs review.
+        """
+        from django.utils import timezone
+        from core.models import Viagem
+
+        # parse_message stamps the local time of the machine running the bot
+        recebido_em = timezone.make_aware(datetime.strptime(record["timestamp"], "%Y-%m-%d %H:%M:%S"))
+        km_inicial = to_decimal(record.get("km_inicial"))
+        km_final = to_decimal(record.get("km_final"))
+        motorista_id = self.index.motorista_id(record.get("nome"))
+        veiculo_id = self.index.veiculo_id(record.get("placa"))
+
+        motivo = None
+        if not motorista_id:
+            motivo = "Motorista não encontrado ou ambíguo"
+        elif not veiculo_id:
+            motivo = "Placa não encontrada"
+        elif km_inicial is not None and km_final is not None and km_final < km_inicial:
+            motivo = "KM final menor que o inicial"
+
+        if motivo:
+            return self.pending(record, motivo)
+
+        distancia = km_final - km_inicial if km_inicial is not None and km_final is not None else Decimal("0")
+        local = timezone.localtime(recebido_em)
+        return Viagem(
+            data=local.date(),
+            hora_saida=local.time().replace(microsecond=0),
+            motorista_id=motorista_id,
+            veiculo_id=veiculo_id,
+            origem="",
+            destino=(record.get("destino") or "")[:200],
+            distancia=distancia,
+            km_final=km_final or Decimal("0"),
+        )
+
+    def ingest(self, records):
+        """
+        Writes one batch. bulk_create skips the km signal, so the odometer of
+        each vehicle is moved to the highest km_final of the batch instead
+        (never backwards).
+
+        :return: (trips created, records sent to review)
+        """
+        from django.db import transaction
+        from core.models import Veiculo, Viagem, ViagemPendente
+
+        self.index.refresh()
+        viagens, pendentes = [], []
+        for record in records:
+            obj = self.build(record)
+            (viagens if isinstance(obj, Viagem) else pendentes).append(obj)
+
+        odometers = {}
+        for viagem in viagens:
+            if viagem.km_final:
+                odometers[viagem.veiculo_id] = max(odometers.get(viagem.veiculo_id, 0), viagem.km_final)
+
+        with transaction.atomic():
+            Viagem.objects.bulk_create(viagens)
+            ViagemPendente.objects.bulk_create(pendentes)
+            for veiculo_id, km in odometers.items():
+                Veiculo.objects.filter(pk=veiculo_id, km_atual__lt=km).update(km_atual=km)
+        return len(viagens), len(pendentes)
@@ -1,46 +1,106 @@
+import os
+import signal
 import sys
-from bot import WhatsAppMonitor
+from backfill import bubble_origin, message_key
+from bot import MAX_BROWSER_MB, WhatsAppMonitor
+from pipeline import MessagePipeline
 from parser import parse_message
-from exporter import save_to_excel
+from exporter import RecordStore, PeriodicExcelExport
 
-def handle_new_message(text):
+# Parsed records are appended here; the Excel file is refreshed from it in the background
+store = RecordStore()
+
+# Trips are also written straight into the Django database (DJANGO_INGEST=0 disables it)
+ingestor = None
+if os.environ.get("DJANGO_INGEST", "1") != "0":
+    from ingest import TripIngestor
+    ingestor = TripIngestor()
+
+# Groups watched from the same browser, separated by ";"
+GROUPS = [
+    name.strip()
+    for name in os.environ.get("WHATSAPP_GROUPS", "Motoristas secretarias de obras").split(";")
+    if name.strip()
+]
+
+def handle_new_message(message):
     """
     Callback function to process new messages found by the bot.
+    :param message: bot.IncomingMessage (text, source group and bubble header)
     """
     print(f"🔄 Processando mensagem...")
     
-    # 1. Parse Data
-    data = parse_message(text)
+    # 1. Parse Data (stamped with the send time shown on the bubble, if any)
+    origin = bubble_origin(message.header)
+    data = parse_message(message.text, timestamp=origin[0] if origin else None)
     
     if data:
+        data['grupo'] = message.group
         print(f"✅ Dados extraídos: {data}")
-        # 2. Export to Excel
-        save_to_excel([data])
+        # 2. Save (the Excel file is regenerated periodically), under the key
+        # backfill.py gives the same message in an export, so they never overlap
+        keys = [message_key(*origin, message.text)] if origin else None
+        if not store.append([data], keys=keys):
+            print("ℹ️ Mensagem já registrada (importada de uma exportação).")
+            return
+        # 3. Register the trip in the system
+        if ingestor:
+            ingestor.submit(data)
     else:
         print("ℹ️ Mensagem ignorada (não corresponde ao padrão de viagem).")
         # Optional: Log ignored message to error log
         # with open("ignored_log.txt", "a", encoding="utf-8") as f:
         #     f.write(f"IGNORED: {text}\n---\n")
 
+def stop_on_sigterm(signum, frame):
+    """Treats SIGTERM like Ctrl+C, so the queue is drained before exiting."""
+    raise KeyboardInterrupt
+
 def main():
     print("🤖 WhatsApp Monitor - Motoristas")
     print("---------------------------------")
+    signal.signal(signal.SIGTERM, stop_on_sigterm)
     
+    excel_export = PeriodicExcelExport(store)
+    excel_export.start()
+    if ingestor:
+        ingestor.start()
+
+    # Capture only enqueues; the handlers run on worker threads
+    pipeline = MessagePipeline(handle_new_message)
+    pipeline.start()
+
+    monitor = None
+    exit_code = 0
     try:
         # Create Monitor Instance
-        monitor = WhatsAppMonitor(target_group="Motoristas secretarias de obras")
+        monitor = WhatsAppMonitor(
+            groups=GROUPS,
+            capture_mode=os.environ.get("CAPTURE_MODE", "observer"),
+            headless=os.environ.get("HEADLESS", "0") == "1",
+            max_browser_mb=int(os.environ.get("MAX_BROWSER_MB", MAX_BROWSER_MB)),
+        )
         
-        # Start Monitoring with Callback
-        monitor.start(handle_new_message)
+        # Start Monitoring with Callback (Chrome is restarted if it crashes)
+        monitor.run_forever(pipeline.submit)
         
     except KeyboardInterrupt:
         print("\n🛑 Encerrando monitoramento...")
-        if 'monitor' in locals():
-            monitor.close()
-        sys.exit(0)
     except Exception as e:
         print(f"❌ Erro fatal: {e}")
-        sys.exit(1)
+        exit_code = 1
+    finally:
+        # Handle the messages already captured first: they mark the dedupe
+        # store (closed with the monitor) and write to the store and ingestor
+        metrics = pipeline.shutdown()
+        print(f"📊 {metrics['handled']} mensagens processadas, {metrics['dropped']} descartadas")
+        if monitor:
+            monitor.close()
+        excel_export.stop()
+        if ingestor:
+            ingestor.stop()
+        store.close()
+    sys.exit(exit_code)
 
 if __name__ == "__main__":
     main()
@@ -1,69 +1,97 @@
 import re
 import datetime
 
-def parse_message(text: str) -> dict | None:
+# Almost every message in the group is chatter: one search for the header
+# rejects it before the fields are scanned
+HEADER = re.compile(r"registro\s*de\s*viagem", re.IGNORECASE)
+
+# All fields in one scan, one line per field. The label may be preceded by
+# emojis or bullets and written in the usual driver variants
+# ("KM inicial", "Km Ini", "Km saída", "Km final", "KM Fim", "Km chegada").
+FIELDS = re.compile(
+    r"^[^\w\n]*"
+    r"(?:(?P<nome>nome|motorista)"
+    r"|(?P<placa>placa)"
+    r"|(?P<km_inicial>km\.?\s*(?:inicial|ini|sa[ií]da))"
+    r"|(?P<km_final>km\.?\s*(?:final|fim|chegada))"
+    r"|(?P<destino>destino))"
+    r"\b[^\S\n]*[:=\-]?[^\S\n]*(?P<value>[^\n]*)",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+FIELD_NAMES = ("nome", "placa", "km_inicial", "destino", "km_final")
+
+# 1301 | 1.301 | 1,301 | 12.301.000 (separators only count when followed by 3 digits)
+KM_VALUE = re.compile(r"\d{1,3}(?:[.,]\d{3})+(?!\d)|\d+")
+
+_NOT_DIGIT = re.compile(r"\D")
+
+# Emojis and symbols typed around a value ("araguari 🚚")
+_TRAILING_SYMBOLS = re.compile(r"[^\w)]+$")
+
+
+def parse_message(text: str, timestamp: datetime.datetime | None = None) -> dict | None:
     """
     Parses a WhatsApp message text to extract trip details.
-    
+
+    :param timestamp: When the message was sent (default: now, for live messages)
+
     Expected format (approximate):
     📄 Registro de Viagem
-    Nome: Reginaldo 
-    Placa: txh2f74 
+    Nome: Reginaldo
+    Placa: txh2f74
     Km Inicial: 1301
-    Destino: araguari 
+    Destino: araguari
     Km final: 1563
-    
+
     Returns:
         dict: Extracted data if pattern matches.
         None: If the message does not match the trip log pattern.
     """
-    if not text:
+    if not text or not HEADER.search(text):
         return None
 
-    # Check for header (case insensitive)
-    if "registro de viagem" not in text.lower():
+    fields = dict.fromkeys(FIELD_NAMES)
+    for match in FIELDS.finditer(text):
+        field = _label(match)
+        if fields[field] is not None:
+            continue
+        value = match.group("value")
+        if field in ("km_inicial", "km_final"):
+            km = KM_VALUE.search(value)
+            value = _NOT_DIGIT.sub("", km.group()) if km else None
+        else:
+            value = _TRAILING_SYMBOLS.sub("", value).strip() or None
+        fields[field] = value
+
+    # If we found at least a few fields, consider it a valid trip message
+    # Sometimes fields might be missing, but 'Nome' and 'Placa' are critical usually.
+    if sum(value is not None for value in fields.values()) < 3:
         return None
 
-    data = {
-        'timestamp': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        'raw_text': text
+    return {
+        'timestamp': (timestamp or datetime.datetime.now()).strftime("%Y-%m-%d %H:%M:%S"),
+        'raw_text': text,
+        **fields,
     }
 
-    # Regex patterns for fields
-    # Format: FieldName: <value> (handles optional whitespace)
-    patterns = {
-        'nome': r'Nome\s*:\s*(.+)',
-        'placa': r'Placa\s*:\s*(.+)',
-        'km_inicial': r'Km\s*Inicial\s*:\s*(\d+)',
-        'destino': r'Destino\s*:\s*(.+)',
-        'km_final': r'Km\s*final\s*:\s*(\d+)'
-    }
 
-    match_count = 0
-    for field, pattern in patterns.items():
-        match = re.search(pattern, text, re.IGNORECASE | re.MULTILINE)
-        if match:
-            data[field] = match.group(1).strip()
-            match_count += 1
-        else:
-            data[field] = None
+def _label(match):
+    """Name of the field whose label matched."""
+    for field in FIELD_NAMES:
+        if match.group(field) is not None:
+            return field
 
-    # If we found at least a few fields, consider it a valid trip message
-    # Sometimes fields might be missing, but 'Nome' and 'Placa' are critical usually.
-    if match_count >= 3:
-        return data
-    
-    return None
 
 if __name__ == "__main__":
     # Test
     sample = """
     📄 Registro de Viagem
 
-    Nome:Reginaldo 
-    Placa:txh2f74 
+    Nome:Reginaldo
+    Placa:txh2f74
     Km Inicial:1301
-    Destino:araguari 
+    Destino:araguari
     Km final:1563
     """
     print(parse_message(sample))
@@ -0,0 +1,172 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+# Messages waiting to be handled; capture blocks (backpressure) when full
+QUEUE_SIZE = 1000
+
+# Handler threads
+WORKERS = 2
+
+# Attempts per message before it is given up
+MAX_ATTEMPTS = 3
+
+# Seconds before the first retry (doubles on each attempt)
+RETRY_DELAY = 2.0
+
+# Seconds between two metrics lines in the log (0 disables them)
+LOG_INTERVAL = 300
+
+_STOP = object()
+
+
+class MessagePipeline:
+    """
+    Decouples message capture from message handling.
+
+    The bot only calls submit(), which puts the message on a bounded queue
+    and returns. A pool of worker threads runs the handler. When the queue is
+    full, submit() blocks until there is room, so a slow handler slows the
+    capture down instead of growing memory or dropping messages (the browser
+    keeps buffering new messages meanwhile). Failed messages are retried
+    later from a timer, without holding a worker or the capture loop.
+
+    submit() returns a Future that completes when the handler succeeded, or
+    fails with the last error when the message was given up, so the caller
+    can remember a message as processed only once it really was.
+    """
+
+    def __init__(self, handler, workers=WORKERS, maxsize=QUEUE_SIZE,
+                 max_attempts=MAX_ATTEMPTS, retry_delay=RETRY_DELAY, log_interval=LOG_INTERVAL):
+        self.handler = handler
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.log_interval = log_interval
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._workers = [
+            threading.Thread(target=self._work, name=f"handler-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        self._lock = threading.Lock()
+        self._retry_timers = set()
+        self._stopped = threading.Event()
+        self._counters = {
+            'submitted': 0, 'handled': 0, 'failed': 0, 'retried': 0, 'dropped': 0,
+            'backpressure_waits': 0, 'in_flight': 0,
+            'handler_seconds_total': 0.0, 'handler_seconds_max': 0.0,
+            'queue_wait_seconds_total': 0.0,
+        }
+
+    def start(self):
+        for worker in self._workers:
+            worker.start()
+        if self.log_interval:
+            threading.Thread(target=self._log_metrics, name="pipeline-metrics", daemon=True).start()
+
+    def submit(self, message):
+        """Queues a message; blocks while the queue is full. Returns the message's Future."""
+        self._count('submitted')
+        done = Future()
+        item = (message, 1, time.monotonic(), done)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self._count('backpressure_waits')
+            self._queue.put(item)
+        return done
+
+    def _count(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                self._queue.task_done()
+                return
+            message, attempt, queued_at, done = item
+            started = time.monotonic()
+            self._count('in_flight')
+            try:
+                self.handler(message)
+            except Exception as e:
+                self._retry(message, attempt, e, done)
+            else:
+                self._count('handled')
+                done.set_result(None)
+            finally:
+                elapsed = time.monotonic() - started
+                with self._lock:
+                    self._counters['in_flight'] -= 1
+                    self._counters['handler_seconds_total'] += elapsed
+                    self._counters['handler_seconds_max'] = max(self._counters['handler_seconds_max'], elapsed)
+                    self._counters['queue_wait_seconds_total'] += started - queued_at
+                self._queue.task_done()
+
+    def _retry(self, message, attempt, error, done):
+        self._count('failed')
+        if attempt >= self.max_attempts or self._stopped.is_set():
+            self._count('dropped')
+            print(f"❌ Mensagem descartada após {attempt} tentativa(s): {error}")
+            done.set_exception(error)
+            return
+        delay = self.retry_delay * 2 ** (attempt - 1)
+        print(f"⚠️ Erro ao processar mensagem (tentativa {attempt}), nova tentativa em {delay:.0f}s: {error}")
+        self._count('retried')
+
+        def requeue():
+            with self._lock:
+                self._retry_timers.discard(timer)
+            self._queue.put((message, attempt + 1, time.monotonic(), done))
+
+        timer = threading.Timer(delay, requeue)
+        timer.daemon = True
+        with self._lock:
+            self._retry_timers.add(timer)
+        timer.start()
+
+    def metrics(self):
+        """Snapshot of the counters, plus the current queue depth and average latencies."""
+        with self._lock:
+            counters = dict(self._counters)
+            counters['retries_pending'] = len(self._retry_timers)
+        done = counters['handled'] + counters['failed']
+        counters['queue_depth'] = self._queue.qsize()
+        counters['handler_seconds_avg'] = counters['handler_seconds_total'] / done if done else 0.0
+        counters['queue_wait_seconds_avg'] = counters['queue_wait_seconds_total'] / done if done else 0.0
+        return counters
+
+    def _log_metrics(self):
+        while not self._stopped.wait(self.log_interval):
+            m = self.metrics()
+            print(
+                f"📊 Fila: {m['queue_depth']} | processadas: {m['handled']} | falhas: {m['failed']} "
+                f"| tempo médio: {m['handler_seconds_avg'] * 1000:.0f} ms (máx {m['handler_seconds_max'] * 1000:.0f} ms)"
+            )
+
+    def shutdown(self, timeout=30):
+        """
+        Stops accepting retries, waits for the queued messages (and the
+        retries already scheduled) to be handled, then stops the workers.
+        """
+        deadline = time.monotonic() + timeout
+        # Let scheduled retries land in the queue before draining it
+        while time.monotonic() < deadline:
+            with self._lock:
+                if not self._retry_timers:
+                    break
+            time.sleep(0.1)
+        self._stopped.set()
+        pending = self._queue.qsize()
+        if pending:
+            print(f"⏳ Processando {pending} mensagem(ns) restantes...")
+        for _ in self._workers:
+            self._queue.put(_STOP)
+        for worker in self._workers:
+            worker.join(max(0, deadline - time.monotonic()))
+        with self._lock:
+            for timer in self._retry_timers:
+                timer.cancel()
+        return self.metrics()
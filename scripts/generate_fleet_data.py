@@ -0,0 +1,638 @@
+"""
+Fills a database with a synthetic fleet, to measure pages, exports and
+imports at a realistic scale.
+
+Three schemas are supported: the logistics app of this project, the core app
+of multas_django, and the legacy Streamlit tables of traffic_app.db
+(db_handler). Rows are generated chronologically and inserted in chunks
+(bulk_create, or executemany for the legacy tables), each chunk in its own
+transaction, so a million trips never sit in memory.
+
+The data follows the shape of a real municipal fleet:
+- a few vehicles and drivers do most of the trips (Pareto weights) and each
+  vehicle is driven mostly by a small crew;
+- trips concentrate on weekdays and in the morning, distances are
+  log-normal around a median that depends on the vehicle model, and every
+  trip advances its vehicle's odometer;
+- fines are drawn from the trips themselves (same day, driver and vehicle,
+  linked to the trip) with the CTB values of each infraction;
+- maintenances are spread by kilometres driven, with the next service set
+  by the kind of service.
+
+Usage (from the project root):
+    python scripts/generate_fleet_data.py --schema logistics --trips 100000
+    python scripts/generate_fleet_data.py --schema core --database /tmp/bench.sqlite3 --migrate
+    python scripts/generate_fleet_data.py --schema legacy --vehicles 500 --drivers 2000 \\
+        --trips 1000000 --fines 100000 --maintenances 50000
+or, with Django already set up:
+    python manage.py shell -c "from scripts.generate_fleet_data import run; run('--trips', '50000')"
+"""
+import argparse
+import math
+import os
+import random
+import sqlite3
+import string
+import sys
+import time
+from bisect import bisect
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import accumulate
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+CHUNK_SIZE = 5000
+
+DEFAULT_COUNTS = {
+    'vehicles': 500,
+    'drivers': 2000,
+    'trips': 1_000_000,
+    'fines': 100_000,
+    'maintenances': 50_000,
+}
+
+FIRST_NAMES = [
+    'José', 'João', 'Antônio', 'Francisco', 'Carlos', 'Paulo', 'Pedro', 'Lucas', 'Luiz', 'Marcos',
+    'Luis', 'Gabriel', 'Rafael', 'Daniel', 'Marcelo', 'Bruno', 'Eduardo', 'Felipe', 'Raimundo', 'Rodrigo',
+    'Manoel', 'Sebastião', 'Reginaldo', 'Valdir', 'Edson', 'Gilberto', 'Rogério', 'Sérgio', 'Cláudio', 'Jorge',
+    'Maria', 'Ana', 'Francisca', 'Antônia', 'Adriana', 'Juliana', 'Márcia', 'Fernanda', 'Patrícia', 'Aline',
+]
+LAST_NAMES = [
+    'Silva', 'Santos', 'Oliveira', 'Souza', 'Rodrigues', 'Ferreira', 'Alves', 'Pereira', 'Lima', 'Gomes',
+    'Costa', 'Ribeiro', 'Martins', 'Carvalho', 'Almeida', 'Lopes', 'Soares', 'Fernandes', 'Vieira', 'Barbosa',
+    'Rocha', 'Dias', 'Nascimento', 'Andrade', 'Moreira', 'Nunes', 'Marques', 'Machado', 'Mendes', 'Freitas',
+]
+
+# (model, share of the fleet, median trip distance in km, km driven per year)
+MODELS = [
+    ('VW Gol 1.0', 0.22, 25, 20000),
+    ('Fiat Strada', 0.18, 35, 25000),
+    ('Toyota Hilux', 0.12, 60, 35000),
+    ('Renault Master', 0.10, 80, 40000),
+    ('Mercedes-Benz Sprinter', 0.08, 90, 45000),
+    ('VW Delivery 9.170', 0.08, 70, 30000),
+    ('Mercedes-Benz Atego Basculante', 0.07, 45, 25000),
+    ('Marcopolo Volare', 0.06, 120, 50000),
+    ('Volvo FH 540', 0.05, 250, 90000),
+    ('Honda CG 160', 0.04, 15, 12000),
+]
+HEAVY_MODELS = {'VW Delivery 9.170', 'Mercedes-Benz Atego Basculante', 'Marcopolo Volare', 'Volvo FH 540'}
+
+GARAGE = 'Garagem Central'
+CITIES = [
+    'Centro', 'Secretaria de Obras', 'Secretaria de Saúde', 'Hospital Municipal', 'Escola Municipal',
+    'Aterro Sanitário', 'Distrito Industrial', 'Zona Rural', 'Posto de Saúde', 'Prefeitura',
+    'Campinas', 'Sorocaba', 'Jundiaí', 'Piracicaba', 'Ribeirão Preto', 'São Paulo', 'Santos',
+    'Bauru', 'São José dos Campos', 'Limeira', 'Americana', 'Itu', 'Indaiatuba', 'Atibaia',
+]
+STREETS = [
+    'Av. Brasil', 'Rua XV de Novembro', 'Av. Paulista', 'Rodovia SP-330', 'Rodovia SP-075', 'Rua da Matriz',
+    'Av. Getúlio Vargas', 'Rua São Bento', 'Av. Independência', 'Rodovia BR-116', 'Rua Sete de Setembro',
+]
+
+# infraction -> (weight, [(value, weight)])
+INFRACTIONS = {
+    'Excesso de Velocidade': (45, [(130.16, 70), (195.23, 20), (880.41, 10)]),
+    'Estacionamento Irregular': (20, [(88.38, 60), (195.23, 40)]),
+    'Avanço de Sinal': (10, [(293.47, 1)]),
+    'Uso de Celular': (10, [(293.47, 1)]),
+    'Falta de Cinto': (5, [(195.23, 1)]),
+    'Documentação Irregular': (5, [(293.47, 1)]),
+    'Outros': (5, [(88.38, 40), (130.16, 40), (195.23, 20)]),
+}
+
+# service -> (weight, median cost, next service in km, next service in days)
+SERVICES = {
+    'Troca de Óleo': (35, 350, 10000, 180),
+    'Revisão': (15, 1200, 20000, 365),
+    'Troca de Pneus': (10, 2800, 50000, None),
+    'Alinhamento': (10, 150, 10000, None),
+    'Balanceamento': (8, 120, 10000, None),
+    'Freios': (10, 900, 30000, None),
+    'Suspensão': (5, 1800, 40000, None),
+    'Outros': (7, 500, None, None),
+}
+
+WEEKDAY_WEIGHTS = [1.0, 1.0, 1.0, 1.0, 0.95, 0.35, 0.1]
+
+
+def cpf_check_digits(base):
+    digits = [int(c) for c in base]
+    for size in (10, 11):
+        total = sum(d * w for d, w in zip(digits, range(size, 1, -1)))
+        digits.append((total * 10 // 11) % 10)
+    return ''.join(str(d) for d in digits[9:])
+
+
+class FleetGenerator:
+    """
+    Generates the rows of a fleet. Drivers and vehicles are dicts; trips,
+    fines and maintenances refer to them by their position in those lists.
+    Unique values already present in the target database can be passed in
+    `taken` ({'cpf': set, 'cnh': set, 'placa': set, 'renavam': set}).
+    """
+
+    def __init__(self, seed=42, days=730, end=None, taken=None):
+        self.random = random.Random(seed)
+        self.end = end or date.today()
+        self.start = self.end - timedelta(days=days - 1)
+        self.days = days
+        self.taken = {key: set(values) for key, values in (taken or {}).items()}
+
+    def unique(self, kind, make):
+        taken = self.taken.setdefault(kind, set())
+        while True:
+            value = make()
+            if value not in taken:
+                taken.add(value)
+                return value
+
+    def digits(self, count):
+        return ''.join(self.random.choices(string.digits, k=count))
+
+    def cpf(self):
+        base = self.digits(9)
+        return base + cpf_check_digits(base)
+
+    def drivers(self, count):
+        rng = self.random
+        rows = []
+        for _ in range(count):
+            rows.append({
+                'nome': f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {rng.choice(LAST_NAMES)}",
+                'cpf': self.unique('cpf', self.cpf),
+                'cnh': self.unique('cnh', lambda: self.digits(11)),
+                # About 4% of the licences are already expired
+                'validade_cnh': self.end + timedelta(days=rng.randint(-75, 5 * 365)),
+                'weight': min(rng.paretovariate(1.2), 30),
+            })
+        return rows
+
+    def plate(self):
+        rng = self.random
+        letters = ''.join(rng.choices(string.ascii_uppercase, k=3))
+        if rng.random() < 0.45:  # Mercosul
+            return f"{letters}{rng.randint(0, 9)}{rng.choice(string.ascii_uppercase)}{rng.randint(0, 99):02d}"
+        return f"{letters}{rng.randint(0, 9999):04d}"
+
+    def vehicles(self, count):
+        rng = self.random
+        models = [model for model, *_ in MODELS]
+        shares = [share for _, share, *_ in MODELS]
+        specs = {model: (median, per_year) for model, _, median, per_year in MODELS}
+        rows = []
+        for _ in range(count):
+            modelo = rng.choices(models, shares)[0]
+            median, per_year = specs[modelo]
+            age = min(int(rng.expovariate(1 / 5)), 20)
+            years_before = max(age - self.days / 365, 0)
+            rows.append({
+                'placa': self.unique('placa', self.plate),
+                'modelo': modelo,
+                'ano': self.end.year - age,
+                'renavam': self.unique('renavam', lambda: self.digits(11)),
+                # Odometer at the start of the generated period
+                'km_atual': round(years_before * per_year * rng.uniform(0.6, 1.3), 1),
+                'median_km': median,
+                'weight': min(rng.paretovariate(1.5), 15),
+            })
+        return rows
+
+    def day_counts(self, total):
+        """Trips per day: weekdays busier, slow growth over the period."""
+        weights = [
+            WEEKDAY_WEIGHTS[(self.start + timedelta(days=i)).weekday()] * (1 + 0.2 * i / self.days)
+            for i in range(self.days)
+        ]
+        scale = total / sum(weights)
+        counts, carried = [], 0.0
+        for weight in weights:
+            carried += weight * scale
+            counts.append(int(carried))
+            carried -= int(carried)
+        counts[-1] += total - sum(counts)
+        return counts
+
+    def departure(self):
+        rng = self.random
+        pick = rng.random()
+        if pick < 0.7:
+            hour = rng.gauss(7.5, 1.2)
+        elif pick < 0.95:
+            hour = rng.gauss(13.5, 1.5)
+        else:
+            hour = rng.uniform(0, 24)
+        minutes = int(min(max(hour, 0), 23.99) * 60)
+        return minutes // 60, minutes % 60
+
+    def crews(self, drivers, vehicles):
+        """Each vehicle is driven mostly by 2 to 8 drivers, busy drivers in more crews."""
+        if not drivers:
+            return []
+        cum = list(accumulate(driver['weight'] for driver in drivers))
+        return [
+            sorted({bisect(cum, self.random.random() * cum[-1]) for _ in range(self.random.randint(2, 8))})
+            for _ in vehicles
+        ]
+
+    def trips(self, drivers, vehicles, total, fines=0, chunk_size=CHUNK_SIZE):
+        """
+        Yields (trips, fines) chunks in chronological order. Each fine
+        carries 'trip', the position of its trip in the same chunk. Updates
+        vehicle['km_atual'] as trips are generated.
+        """
+        rng = self.random
+        if not total or not drivers or not vehicles:
+            return
+        vehicle_cum = list(accumulate(vehicle['weight'] for vehicle in vehicles))
+        driver_cum = list(accumulate(driver['weight'] for driver in drivers))
+        crews = self.crews(drivers, vehicles)
+        destinations = CITIES
+        destination_cum = list(accumulate(1 / (rank + 1) for rank in range(len(destinations))))
+        fines_left, trips_left = min(fines, total), total
+
+        trips_chunk, fines_chunk = [], []
+        for offset, count in enumerate(self.day_counts(total)):
+            day = self.start + timedelta(days=offset)
+            departures = sorted(self.departure() for _ in range(count))
+            for hour, minute in departures:
+                v = bisect(vehicle_cum, rng.random() * vehicle_cum[-1])
+                vehicle = vehicles[v]
+                if rng.random() < 0.9:
+                    d = rng.choice(crews[v])
+                else:
+                    d = bisect(driver_cum, rng.random() * driver_cum[-1])
+                distance = round(max(rng.lognormvariate(math.log(vehicle['median_km']), 0.6), 0.5), 1)
+                vehicle['km_atual'] = round(vehicle['km_atual'] + distance, 1)
+                if rng.random() < 0.6:
+                    origem = GARAGE
+                else:
+                    origem = destinations[bisect(destination_cum, rng.random() * destination_cum[-1])]
+                destino = destinations[bisect(destination_cum, rng.random() * destination_cum[-1])]
+                trips_chunk.append({
+                    'data': day,
+                    'hora_saida': f"{hour:02d}:{minute:02d}",
+                    'motorista': d,
+                    'veiculo': v,
+                    'origem': origem,
+                    'destino': destino,
+                    'distancia': distance,
+                    'km_atual': vehicle['km_atual'],
+                })
+                # Selection sampling: exactly `fines` trips get a fine
+                if fines_left and rng.random() * trips_left < fines_left:
+                    fines_chunk.append(self.fine(day, hour * 60 + minute, d, v, trip=len(trips_chunk) - 1))
+                    fines_left -= 1
+                trips_left -= 1
+                if len(trips_chunk) >= chunk_size:
+                    yield trips_chunk, fines_chunk
+                    trips_chunk, fines_chunk = [], []
+        if trips_chunk:
+            yield trips_chunk, fines_chunk
+
+    def fine(self, day, minutes, motorista, veiculo, trip=None):
+        rng = self.random
+        names = list(INFRACTIONS)
+        tipo = rng.choices(names, [INFRACTIONS[name][0] for name in names])[0]
+        values = INFRACTIONS[tipo][1]
+        valor = rng.choices([value for value, _ in values], [weight for _, weight in values])[0]
+        minutes = min(minutes + rng.randint(5, 180), 23 * 60 + 59)
+        return {
+            'data': day,
+            'hora_infracao': f"{minutes // 60:02d}:{minutes % 60:02d}",
+            'local': f"{rng.choice(STREETS)}, {rng.randint(1, 3000)}",
+            'tipo_infracao': tipo,
+            'descricao': '',
+            'motorista': motorista,
+            'veiculo': veiculo,
+            'valor': valor,
+            'trip': trip,
+        }
+
+    def loose_fines(self, drivers, vehicles, count, chunk_size=CHUNK_SIZE):
+        """Fines not tied to a generated trip (when there are more fines than trips)."""
+        rng = self.random
+        chunk = []
+        for _ in range(count):
+            day = self.start + timedelta(days=rng.randrange(self.days))
+            hour, minute = self.departure()
+            chunk.append(self.fine(day, hour * 60 + minute, rng.randrange(len(drivers)), rng.randrange(len(vehicles))))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def maintenances(self, vehicles, start_km, total, chunk_size=CHUNK_SIZE):
+        """
+        Maintenances spread over the vehicles by km driven in the period
+        (start_km[i] -> vehicles[i]['km_atual']), dated by the odometer.
+        """
+        rng = self.random
+        if not total or not vehicles:
+            return
+        driven = [max(vehicle['km_atual'] - start, 1.0) for vehicle, start in zip(vehicles, start_km)]
+        scale = total / sum(driven)
+        shares = [km * scale for km in driven]
+        counts = [int(share) for share in shares]
+        # Largest remainders get the leftovers
+        for i in sorted(range(len(shares)), key=lambda i: shares[i] - counts[i], reverse=True)[:total - sum(counts)]:
+            counts[i] += 1
+
+        names = list(SERVICES)
+        weights = [SERVICES[name][0] for name in names]
+        chunk = []
+        for v, (vehicle, start, count) in enumerate(zip(vehicles, start_km, counts)):
+            end = max(vehicle['km_atual'], start + 1)
+            heavy = 2.5 if vehicle['modelo'] in HEAVY_MODELS else 1.0
+            for km in sorted(rng.uniform(start, end) for _ in range(count)):
+                tipo = rng.choices(names, weights)[0]
+                _, cost, next_km, next_days = SERVICES[tipo]
+                day = self.start + timedelta(days=int((km - start) / (end - start) * (self.days - 1)))
+                chunk.append({
+                    'veiculo': v,
+                    'data': day,
+                    'tipo_servico': tipo,
+                    'descricao': f"{tipo} - {vehicle['modelo']}",
+                    'km_realizado': round(km, 1),
+                    'proximo_servico_km': round(km + next_km, 1) if next_km else None,
+                    'proximo_servico_data': day + timedelta(days=next_days) if next_days else None,
+                    'valor': round(rng.lognormvariate(math.log(cost * heavy), 0.4), 2),
+                })
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+        if chunk:
+            yield chunk
+
+
+def money(value):
+    return Decimal(f"{value:.2f}")
+
+
+class DjangoWriter:
+    """Bulk inserts into the logistics or the core models (whichever app is installed)."""
+
+    def __init__(self, schema):
+        from django.apps import apps
+
+        self.schema = schema
+        app = 'logistics' if schema == 'logistics' else 'core'
+        self.models = {name: apps.get_model(app, name) for name in ('Motorista', 'Veiculo', 'Viagem', 'Multa', 'Manutencao')}
+        # core stores distances and odometers as decimals, logistics as floats
+        self.km = money if schema == 'core' else float
+        self.km_field = 'km_final' if schema == 'core' else 'km_atual'
+
+    def taken(self):
+        Motorista, Veiculo = self.models['Motorista'], self.models['Veiculo']
+        return {
+            'cpf': set(Motorista.objects.values_list('cpf', flat=True)),
+            'cnh': set(Motorista.objects.values_list('cnh', flat=True)),
+            'placa': set(Veiculo.objects.values_list('placa', flat=True)),
+            'renavam': set(Veiculo.objects.values_list('renavam', flat=True)),
+        }
+
+    def _insert(self, model, objs):
+        from django.db import transaction
+
+        with transaction.atomic():
+            return [obj.pk for obj in self.models[model].objects.bulk_create(objs, batch_size=CHUNK_SIZE)]
+
+    def drivers(self, rows):
+        Motorista = self.models['Motorista']
+        return self._insert('Motorista', [
+            Motorista(nome=r['nome'], cpf=r['cpf'], cnh=r['cnh'], validade_cnh=r['validade_cnh']) for r in rows
+        ])
+
+    def vehicles(self, rows):
+        Veiculo = self.models['Veiculo']
+        return self._insert('Veiculo', [
+            Veiculo(placa=r['placa'], modelo=r['modelo'], ano=r['ano'], renavam=r['renavam'], km_atual=self.km(r['km_atual']))
+            for r in rows
+        ])
+
+    def trips(self, rows, driver_ids, vehicle_ids):
+        Viagem = self.models['Viagem']
+        return self._insert('Viagem', [
+            Viagem(
+                data=r['data'], hora_saida=r['hora_saida'],
+                motorista_id=driver_ids[r['motorista']], veiculo_id=vehicle_ids[r['veiculo']],
+                origem=r['origem'], destino=r['destino'], distancia=self.km(r['distancia']),
+                **{self.km_field: self.km(r['km_atual'])},
+            )
+            for r in rows
+        ])
+
+    def fines(self, rows, driver_ids, vehicle_ids, trip_ids=()):
+        Multa = self.models['Multa']
+        return self._insert('Multa', [
+            Multa(
+                data=r['data'], hora_infracao=r['hora_infracao'], local=r['local'],
+                tipo_infracao=r['tipo_infracao'], descricao=r['descricao'],
+                motorista_id=driver_ids[r['motorista']], veiculo_id=vehicle_ids[r['veiculo']],
+                viagem_id=trip_ids[r['trip']] if r['trip'] is not None else None,
+                valor=money(r['valor']),
+            )
+            for r in rows
+        ])
+
+    def maintenances(self, rows, vehicle_ids):
+        Manutencao = self.models['Manutencao']
+        return self._insert('Manutencao', [
+            Manutencao(
+                veiculo_id=vehicle_ids[r['veiculo']], data=r['data'], tipo_servico=r['tipo_servico'],
+                descricao=r['descricao'], km_realizado=self.km(r['km_realizado']),
+                proximo_servico_km=self.km(r['proximo_servico_km']) if r['proximo_servico_km'] else None,
+                proximo_servico_data=r['proximo_servico_data'], valor=money(r['valor']),
+            )
+            for r in rows
+        ])
+
+    def odometers(self, vehicles, vehicle_ids):
+        from django.db import transaction
+
+        Veiculo = self.models['Veiculo']
+        objs = [Veiculo(pk=pk, km_atual=self.km(vehicle['km_atual'])) for vehicle, pk in zip(vehicles, vehicle_ids)]
+        with transaction.atomic():
+            Veiculo.objects.bulk_update(objs, ['km_atual'], batch_size=CHUNK_SIZE)
+
+    def finish(self):
+        if self.schema == 'logistics':
+            # bulk_create skips the signals that maintain the statistics
+            from logistics import stats
+
+            stats.rebuild()
+
+
+class LegacyWriter:
+    """executemany into the db_handler tables."""
+
+    def __init__(self, path):
+        import db_handler
+
+        db_handler.DB_NAME = str(path)
+        db_handler.init_db()
+        self.conn = sqlite3.connect(str(path))
+
+    def taken(self):
+        return {
+            key: {row[0] for row in self.conn.execute(f"SELECT {key} FROM {table}")}
+            for key, table in (('cpf', 'motoristas'), ('cnh', 'motoristas'), ('placa', 'veiculos'), ('renavam', 'veiculos'))
+        }
+
+    def _insert(self, table, columns, rows):
+        # AUTOINCREMENT ids are consecutive inside one transaction with a single writer
+        with self.conn:
+            first = (self.conn.execute(f"SELECT MAX(id) FROM {table}").fetchone()[0] or 0) + 1
+            placeholders = ', '.join('?' * len(columns))
+            self.conn.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+        return list(range(first, first + len(rows)))
+
+    def drivers(self, rows):
+        return self._insert('motoristas', ('nome', 'cpf', 'cnh', 'validade_cnh'), [
+            (r['nome'], r['cpf'], r['cnh'], r['validade_cnh'].isoformat()) for r in rows
+        ])
+
+    def vehicles(self, rows):
+        return self._insert('veiculos', ('placa', 'modelo', 'ano', 'renavam', 'km_atual'), [
+            (r['placa'], r['modelo'], r['ano'], r['renavam'], r['km_atual']) for r in rows
+        ])
+
+    def trips(self, rows, driver_ids, vehicle_ids):
+        columns = ('data', 'motorista_id', 'veiculo_id', 'origem', 'destino', 'hora_saida', 'distancia', 'km_atual')
+        return self._insert('viagens', columns, [
+            (r['data'].isoformat(), driver_ids[r['motorista']], vehicle_ids[r['veiculo']], r['origem'],
+             r['destino'], r['hora_saida'], r['distancia'], r['km_atual'])
+            for r in rows
+        ])
+
+    def fines(self, rows, driver_ids, vehicle_ids, trip_ids=()):
+        columns = ('data', 'hora_infracao', 'local', 'tipo_infracao', 'descricao', 'motorista_id', 'veiculo_id',
+                   'valor', 'viagem_id')
+        return self._insert('multas', columns, [
+            (r['data'].isoformat(), r['hora_infracao'], r['local'], r['tipo_infracao'], r['descricao'],
+             driver_ids[r['motorista']], vehicle_ids[r['veiculo']], r['valor'],
+             trip_ids[r['trip']] if r['trip'] is not None else None)
+            for r in rows
+        ])
+
+    def maintenances(self, rows, vehicle_ids):
+        columns = ('veiculo_id', 'data', 'tipo_servico', 'descricao', 'km_realizado', 'proximo_servico_km',
+                   'proximo_servico_data', 'valor')
+        return self._insert('manutencoes', columns, [
+            (vehicle_ids[r['veiculo']], r['data'].isoformat(), r['tipo_servico'], r['descricao'], r['km_realizado'],
+             r['proximo_servico_km'],
+             r['proximo_servico_data'].isoformat() if r['proximo_servico_data'] else None, r['valor'])
+            for r in rows
+        ])
+
+    def odometers(self, vehicles, vehicle_ids):
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE veiculos SET km_atual = ? WHERE id = ?",
+                [(vehicle['km_atual'], pk) for vehicle, pk in zip(vehicles, vehicle_ids)],
+            )
+
+    def finish(self):
+        self.conn.close()
+
+
+def generate(writer, counts, seed=42, days=730, end=None, chunk_size=CHUNK_SIZE, progress=None):
+    """
+    Generates and writes a fleet of counts['vehicles'], counts['drivers'],
+    counts['trips'], counts['fines'] and counts['maintenances'] rows.
+    Returns the number of rows written per table.
+    """
+    say = progress or (lambda message: None)
+    generator = FleetGenerator(seed=seed, days=days, end=end, taken=writer.taken())
+    written = dict.fromkeys(('drivers', 'vehicles', 'trips', 'fines', 'maintenances'), 0)
+
+    drivers = generator.drivers(counts['drivers'])
+    driver_ids = writer.drivers(drivers)
+    vehicles = generator.vehicles(counts['vehicles'])
+    vehicle_ids = writer.vehicles(vehicles)
+    written['drivers'], written['vehicles'] = len(driver_ids), len(vehicle_ids)
+    say(f"{len(driver_ids)} motoristas, {len(vehicle_ids)} veículos")
+
+    start_km = [vehicle['km_atual'] for vehicle in vehicles]
+    for trips, fines in generator.trips(drivers, vehicles, counts['trips'], counts['fines'], chunk_size):
+        trip_ids = writer.trips(trips, driver_ids, vehicle_ids)
+        written['trips'] += len(trip_ids)
+        if fines:
+            written['fines'] += len(writer.fines(fines, driver_ids, vehicle_ids, trip_ids))
+        say(f"{written['trips']} viagens, {written['fines']} multas")
+
+    if drivers and vehicles:
+        for fines in generator.loose_fines(drivers, vehicles, counts['fines'] - written['fines'], chunk_size):
+            written['fines'] += len(writer.fines(fines, driver_ids, vehicle_ids))
+    writer.odometers(vehicles, vehicle_ids)
+
+    for maintenances in generator.maintenances(vehicles, start_km, counts['maintenances'], chunk_size):
+        written['maintenances'] += len(writer.maintenances(maintenances, vehicle_ids))
+    say(f"{written['fines']} multas, {written['maintenances']} manutenções")
+
+    writer.finish()
+    return written
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(prog='generate_fleet_data', description='Gera uma frota sintética para testes de carga.')
+    parser.add_argument('--schema', choices=('logistics', 'core', 'legacy'), default='logistics',
+                        help='logistics (este projeto), core (multas_django) ou legacy (tabelas do db_handler)')
+    parser.add_argument('--database', help='Arquivo SQLite de destino (padrão: o banco do projeto)')
+    parser.add_argument('--migrate', action='store_true', help='Roda as migrações antes de gerar')
+    for name, default in DEFAULT_COUNTS.items():
+        parser.add_argument(f'--{name}', type=int, default=default)
+    parser.add_argument('--days', type=int, default=730, help='Período coberto, terminando hoje')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Linhas por transação')
+    return parser.parse_args(args)
+
+
+def run(*args):
+    """Entry point when Django is already set up (manage.py shell)."""
+    options = parse_args(args)
+    if options.schema == 'legacy':
+        writer = LegacyWriter(options.database or 'traffic_app.db')
+    else:
+        if options.migrate:
+            from django.core.management import call_command
+
+            call_command('migrate', verbosity=0)
+        writer = DjangoWriter(options.schema)
+
+    counts = {name: getattr(options, name) for name in DEFAULT_COUNTS}
+    started = time.monotonic()
+    written = generate(writer, counts, seed=options.seed, days=options.days, chunk_size=options.chunk_size,
+                       progress=lambda message: print(f"  {message}"))
+    print(f"Pronto em {time.monotonic() - started:.0f}s: " + ', '.join(f"{name}={count}" for name, count in written.items()))
+    return written
+
+
+def setup_django(schema, database=None):
+    """Standalone run: pick the project of the schema and point it at `database`."""
+    project = ROOT / 'multas_django' if schema == 'core' else ROOT
+    sys.path.insert(0, str(project))
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'config.settings'
+    import django
+    from django.conf import settings
+
+    if database:
+        settings.DATABASES['default']['NAME'] = database
+    django.setup()
+
+
+def main():
+    options = parse_args(sys.argv[1:])
+    if options.schema == 'legacy':
+        sys.path.insert(0, str(ROOT))
+        os.chdir(ROOT)
+    else:
+        setup_django(options.schema, options.database)
+    run(*sys.argv[1:])
+
+
+if __name__ == '__main__':
+    main()
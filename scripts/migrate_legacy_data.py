@@ -1,140 +1,292 @@
+"""
+Migrates the legacy Streamlit tables of traffic_app.db into the logistics models.
+
+Rows are streamed from the legacy tables and inserted with bulk_create in
+chunks, each chunk in its own transaction. Legacy ids are resolved through
+in-memory maps (cpf -> id, placa -> id) instead of one lookup per row.
+bulk_create bypasses Viagem.save() and the statistics signals, so the vehicle
+odometers are updated once per chunk of trips, in its transaction and with the
+same rules save() applies per trip, and the statistics are rebuilt once. A run
+that was interrupted can be started again: rows already stored are skipped.
+
+Usage:
+    python manage.py shell -c "from scripts.migrate_legacy_data import run; run()"
+    python manage.py shell -c "from scripts.migrate_legacy_data import run; run('--dry-run')"
+"""
+import argparse
 import sqlite3
+
+from django.db import transaction
+from django.utils.dateparse import parse_date, parse_time
+
+from logistics import stats
 from logistics.models import Motorista, Veiculo, Viagem, Manutencao, Multa
-from datetime import datetime
-
-def run():
-    conn = sqlite3.connect('traffic_app.db')
-    cursor = conn.cursor()
-
-    # 1. Migrate Motoristas
-    print("Migrating Motoristas...")
-    cursor.execute("SELECT id, nome, cpf, cnh, validade_cnh FROM motoristas")
-    motoristas_map = {} # Old ID -> New ID
-    for row in cursor.fetchall():
-        old_id, nome, cpf, cnh, validade_cnh = row
-        # Check if exists to avoid duplicates
-        if not Motorista.objects.filter(cpf=cpf).exists():
-            obj = Motorista.objects.create(
-                nome=nome,
-                cpf=cpf,
-                cnh=cnh,
-                validade_cnh=validade_cnh
-            )
-            motoristas_map[old_id] = obj.id
-            print(f"Created Motorista: {nome}")
-        else:
-            obj = Motorista.objects.get(cpf=cpf)
-            motoristas_map[old_id] = obj.id
-            print(f"Skipped existing Motorista: {nome}")
-
-    # 2. Migrate Veiculos
-    print("\nMigrating Veiculos...")
-    cursor.execute("SELECT id, placa, modelo, ano, renavam, km_atual FROM veiculos")
-    veiculos_map = {} # Old ID -> New ID
-    for row in cursor.fetchall():
-        old_id, placa, modelo, ano, renavam, km_atual = row
-        if not Veiculo.objects.filter(placa=placa).exists():
-            obj = Veiculo.objects.create(
-                placa=placa,
-                modelo=modelo,
-                ano=ano,
-                renavam=renavam,
-                km_atual=km_atual
-            )
-            veiculos_map[old_id] = obj.id
-            print(f"Created Veiculo: {placa}")
-        else:
-            obj = Veiculo.objects.get(placa=placa)
-            veiculos_map[old_id] = obj.id
-            print(f"Skipped existing Veiculo: {placa}")
-
-    # 3. Migrate Viagens
-    print("\nMigrating Viagens...")
-    cursor.execute("SELECT id, data, motorista_id, veiculo_id, origem, destino, hora_saida, distancia, km_atual FROM viagens")
-    viagens_map = {}
-    for row in cursor.fetchall():
-        old_id, data, motorista_id, veiculo_id, origem, destino, hora_saida, distancia, km_atual = row
-        
-        new_motorista_id = motoristas_map.get(motorista_id)
-        new_veiculo_id = veiculos_map.get(veiculo_id)
-
-        if new_motorista_id and new_veiculo_id:
-             # Check for duplicates (simple check based on data/time/driver)
-            if not Viagem.objects.filter(data=data, hora_saida=hora_saida, motorista_id=new_motorista_id).exists():
-                obj = Viagem.objects.create(
+
+CHUNK_SIZE = 1000
+PROGRESS_EVERY = 5000
+
+
+class DryRunRollback(Exception):
+    """Raised at the end of a dry run to discard everything it wrote."""
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(prog='migrate_legacy_data')
+    parser.add_argument('--source', default='traffic_app.db', help='Legacy SQLite database')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help='Rows inserted per transaction')
+    parser.add_argument('--progress-every', type=int, default=PROGRESS_EVERY,
+                        help='Print progress every N legacy rows')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Print what would be migrated without keeping any change')
+    return parser.parse_args(args)
+
+
+class LegacyMigration:
+    def __init__(self, conn, chunk_size=CHUNK_SIZE, progress_every=PROGRESS_EVERY):
+        self.conn = conn
+        self.chunk_size = chunk_size
+        self.progress_every = progress_every
+        self.counts = {}
+        # Odometer change per vehicle in the current chunk of trips:
+        # veiculo_id -> (km set by a trip or None, km added after it)
+        self.km_changes = {}
+        self.km_updated = set()
+
+    def run(self):
+        self.migrate_table('Motoristas', "SELECT id, nome, cpf, cnh, validade_cnh FROM motoristas ORDER BY id",
+                           self.motoristas_chunk, setup=self.load_motoristas)
+        self.motoristas_map = self.build_map('motoristas', 'cpf', Motorista)
+
+        self.migrate_table('Veiculos', "SELECT id, placa, modelo, ano, renavam, km_atual FROM veiculos ORDER BY id",
+                           self.veiculos_chunk, setup=self.load_veiculos)
+        self.veiculos_map = self.build_map('veiculos', 'placa', Veiculo)
+
+        self.viagens_map = {}
+        self.migrate_table('Viagens', "SELECT id, data, motorista_id, veiculo_id, origem, destino, hora_saida, "
+                                      "distancia, km_atual FROM viagens ORDER BY id",
+                           self.viagens_chunk)
+
+        self.migrate_table('Manutencoes', "SELECT id, veiculo_id, data, tipo_servico, descricao, km_realizado, "
+                                          "proximo_servico_km, proximo_servico_data, valor FROM manutencoes ORDER BY id",
+                           self.manutencoes_chunk)
+
+        self.migrate_table('Multas', "SELECT id, data, hora_infracao, local, tipo_infracao, descricao, motorista_id, "
+                                     "veiculo_id, valor, viagem_id FROM multas ORDER BY id",
+                           self.multas_chunk)
+
+        print(f"\nUpdated km of {len(self.km_updated)} Veiculos")
+
+        # bulk_create skips the signals that maintain the statistics
+        drift = stats.rebuild()
+        print(f"Statistics rebuilt ({sum(len(rows) for rows in drift.values())} values updated)")
+
+    def migrate_table(self, label, query, migrate_chunk, setup=None):
+        print(f"\nMigrating {label}...")
+        if setup:
+            setup()
+        cursor = self.conn.execute(query)
+        read = created = skipped = 0
+        while True:
+            rows = cursor.fetchmany(self.chunk_size)
+            if not rows:
+                break
+            with transaction.atomic():
+                new_count = migrate_chunk(rows)
+            created += new_count
+            skipped += len(rows) - new_count
+            previous, read = read, read + len(rows)
+            if read // self.progress_every > previous // self.progress_every:
+                print(f"  {read} rows read, {created} created, {skipped} skipped")
+        self.counts[label] = (created, skipped)
+        print(f"{label}: {created} created, {skipped} skipped (existing or missing dependencies)")
+
+    def build_map(self, table, key, model):
+        """Old id -> new id, joined on the natural key: one query on each side."""
+        new_ids = dict(model.objects.values_list(key, 'id'))
+        return {
+            old_id: new_ids[value]
+            for old_id, value in self.conn.execute(f"SELECT id, {key} FROM {table}")
+            if value in new_ids
+        }
+
+    def load_motoristas(self):
+        self.existing = {
+            'cpf': set(Motorista.objects.values_list('cpf', flat=True)),
+            'cnh': set(Motorista.objects.values_list('cnh', flat=True)),
+        }
+
+    def motoristas_chunk(self, rows):
+        objs = []
+        for old_id, nome, cpf, cnh, validade_cnh in rows:
+            if cpf in self.existing['cpf'] or cnh in self.existing['cnh']:
+                continue
+            self.existing['cpf'].add(cpf)
+            self.existing['cnh'].add(cnh)
+            objs.append(Motorista(nome=nome, cpf=cpf, cnh=cnh, validade_cnh=parse_date(validade_cnh)))
+        Motorista.objects.bulk_create(objs)
+        return len(objs)
+
+    def load_veiculos(self):
+        self.existing = {
+            'placa': set(Veiculo.objects.values_list('placa', flat=True)),
+            'renavam': set(Veiculo.objects.values_list('renavam', flat=True)),
+        }
+
+    def veiculos_chunk(self, rows):
+        objs = []
+        for old_id, placa, modelo, ano, renavam, km_atual in rows:
+            if placa in self.existing['placa'] or renavam in self.existing['renavam']:
+                continue
+            self.existing['placa'].add(placa)
+            self.existing['renavam'].add(renavam)
+            objs.append(Veiculo(placa=placa, modelo=modelo, ano=ano, renavam=renavam, km_atual=km_atual or 0))
+        Veiculo.objects.bulk_create(objs)
+        return len(objs)
+
+    def existing_keys(self, model, dates, key_fields):
+        """Natural key -> id of the rows already stored in the date range of a chunk."""
+        if not dates:
+            return {}
+        rows = model.objects.filter(data__range=(min(dates), max(dates))).values_list(*key_fields, 'id')
+        return {row[:-1]: row[-1] for row in rows}
+
+    def viagens_chunk(self, rows):
+        candidates = []
+        for old_id, data, motorista_id, veiculo_id, origem, destino, hora_saida, distancia, km_atual in rows:
+            motorista_id = self.motoristas_map.get(motorista_id)
+            veiculo_id = self.veiculos_map.get(veiculo_id)
+            data, hora_saida = parse_date(data), parse_time(hora_saida)
+            if motorista_id and veiculo_id and data and hora_saida:
+                candidates.append((old_id, Viagem(
                     data=data,
-                    motorista_id=new_motorista_id,
-                    veiculo_id=new_veiculo_id,
-                    origem=origem,
+                    motorista_id=motorista_id,
+                    veiculo_id=veiculo_id,
+                    origem=origem or '',
                     destino=destino,
                     hora_saida=hora_saida,
-                    distancia=distancia,
-                    km_atual=km_atual
-                )
-                viagens_map[old_id] = obj.id
-                print(f"Created Viagem: {data} - {destino}")
+                    distancia=distancia or 0,
+                    km_atual=km_atual,
+                )))
+
+        existing = self.existing_keys(
+            Viagem, [obj.data for _, obj in candidates], ['data', 'hora_saida', 'motorista_id']
+        )
+        new, repeated = {}, []
+        for old_id, obj in candidates:
+            key = (obj.data, obj.hora_saida, obj.motorista_id)
+            if key in existing:
+                # Keep the mapping so fines can still point at the stored trip
+                self.viagens_map[old_id] = existing[key]
+            elif key in new:
+                # Repeated in this chunk: mapped to the first one once it is inserted
+                repeated.append((old_id, key))
             else:
-                 # Need to get the object to map the ID for fines
-                obj = Viagem.objects.get(data=data, hora_saida=hora_saida, motorista_id=new_motorista_id)
-                viagens_map[old_id] = obj.id
-                print(f"Skipped existing Viagem: {data} - {destino}")
-        else:
-            print(f"Skipped Viagem (ID {old_id}) due to missing dependencies.")
-
-    # 4. Migrate Manutencoes
-    print("\nMigrating Manutencoes...")
-    cursor.execute("SELECT id, veiculo_id, data, tipo_servico, descricao, km_realizado, proximo_servico_km, proximo_servico_data, valor FROM manutencoes")
-    for row in cursor.fetchall():
-        old_id, veiculo_id, data, tipo_servico, descricao, km_realizado, proximo_servico_km, proximo_servico_data, valor = row
-        
-        new_veiculo_id = veiculos_map.get(veiculo_id)
-        
-        if new_veiculo_id:
-            if not Manutencao.objects.filter(data=data, veiculo_id=new_veiculo_id, tipo_servico=tipo_servico).exists():
-                Manutencao.objects.create(
-                    veiculo_id=new_veiculo_id,
+                new[key] = (old_id, obj)
+
+        Viagem.objects.bulk_create([obj for _, obj in new.values()])
+        for old_id, obj in new.values():
+            self.viagens_map[old_id] = obj.pk
+            self.track_km(obj)
+        for old_id, key in repeated:
+            self.viagens_map[old_id] = new[key][1].pk
+        # In the chunk's transaction, so a resumed run neither loses nor
+        # repeats the distance of the trips already stored
+        self.apply_vehicle_km()
+        return len(new)
+
+    def track_km(self, viagem):
+        """Record the odometer change Viagem.save() would have made for this trip."""
+        base, added = self.km_changes.get(viagem.veiculo_id, (None, 0))
+        if viagem.km_atual:
+            base, added = viagem.km_atual, 0
+        elif viagem.distancia > 0:
+            added += viagem.distancia
+        self.km_changes[viagem.veiculo_id] = (base, added)
+
+    def manutencoes_chunk(self, rows):
+        candidates = []
+        for old_id, veiculo_id, data, tipo_servico, descricao, km_realizado, proximo_servico_km, proximo_servico_data, valor in rows:
+            veiculo_id = self.veiculos_map.get(veiculo_id)
+            data = parse_date(data)
+            if veiculo_id and data:
+                candidates.append(Manutencao(
+                    veiculo_id=veiculo_id,
                     data=data,
                     tipo_servico=tipo_servico,
-                    descricao=descricao,
+                    descricao=descricao or '',
                     km_realizado=km_realizado,
                     proximo_servico_km=proximo_servico_km,
-                    proximo_servico_data=proximo_servico_data,
-                    valor=valor
-                )
-                print(f"Created Manutencao: {tipo_servico}")
-            else:
-                print(f"Skipped existing Manutencao: {tipo_servico}")
-        else:
-             print(f"Skipped Manutencao (ID {old_id}) due to missing vehicle.")
-
-    # 5. Migrate Multas
-    print("\nMigrating Multas...")
-    cursor.execute("SELECT id, data, hora_infracao, local, tipo_infracao, descricao, motorista_id, veiculo_id, valor, viagem_id FROM multas")
-    for row in cursor.fetchall():
-        old_id, data, hora_infracao, local, tipo_infracao, descricao, motorista_id, veiculo_id, valor, viagem_id = row
-        
-        new_motorista_id = motoristas_map.get(motorista_id)
-        new_veiculo_id = veiculos_map.get(veiculo_id)
-        new_viagem_id = viagens_map.get(viagem_id) if viagem_id else None
-
-        if new_motorista_id and new_veiculo_id:
-            if not Multa.objects.filter(data=data, motorista_id=new_motorista_id, tipo_infracao=tipo_infracao).exists():
-                Multa.objects.create(
+                    proximo_servico_data=parse_date(proximo_servico_data) if proximo_servico_data else None,
+                    valor=valor,
+                ))
+        objs = self.new_objects(Manutencao, candidates, ['data', 'veiculo_id', 'tipo_servico'])
+        Manutencao.objects.bulk_create(objs)
+        return len(objs)
+
+    def multas_chunk(self, rows):
+        candidates = []
+        for old_id, data, hora_infracao, local, tipo_infracao, descricao, motorista_id, veiculo_id, valor, viagem_id in rows:
+            motorista_id = self.motoristas_map.get(motorista_id)
+            veiculo_id = self.veiculos_map.get(veiculo_id)
+            data = parse_date(data)
+            if motorista_id and veiculo_id and data:
+                candidates.append(Multa(
                     data=data,
-                    hora_infracao=hora_infracao,
+                    hora_infracao=parse_time(hora_infracao) if hora_infracao else None,
                     local=local,
                     tipo_infracao=tipo_infracao,
-                    descricao=descricao,
-                    motorista_id=new_motorista_id,
-                    veiculo_id=new_veiculo_id,
+                    descricao=descricao or '',
+                    motorista_id=motorista_id,
+                    veiculo_id=veiculo_id,
                     valor=valor,
-                    viagem_id=new_viagem_id
-                )
-                print(f"Created Multa: {tipo_infracao}")
-            else:
-                print(f"Skipped existing Multa: {tipo_infracao}")
-        else:
-            print(f"Skipped Multa (ID {old_id}) due to missing dependencies.")
+                    viagem_id=self.viagens_map.get(viagem_id) if viagem_id else None,
+                ))
+        objs = self.new_objects(Multa, candidates, ['data', 'motorista_id', 'tipo_infracao'])
+        Multa.objects.bulk_create(objs)
+        return len(objs)
+
+    def new_objects(self, model, candidates, key_fields):
+        """Drops candidates whose natural key is already stored (or repeated in the chunk)."""
+        existing = set(self.existing_keys(model, [obj.data for obj in candidates], key_fields))
+        objs = []
+        for obj in candidates:
+            key = tuple(getattr(obj, field) for field in key_fields)
+            if key not in existing:
+                existing.add(key)
+                objs.append(obj)
+        return objs
+
+    def apply_vehicle_km(self):
+        if not self.km_changes:
+            return
+        veiculos = Veiculo.objects.in_bulk(list(self.km_changes))
+        for veiculo_id, (base, added) in self.km_changes.items():
+            veiculo = veiculos[veiculo_id]
+            veiculo.km_atual = (veiculo.km_atual if base is None else base) + added
+        Veiculo.objects.bulk_update(veiculos.values(), ['km_atual'], batch_size=self.chunk_size)
+        self.km_updated.update(veiculos)
+        self.km_changes = {}
+
+
+def run(*args):
+    options = parse_args(args)
+    conn = sqlite3.connect(options.source)
+    migration = LegacyMigration(conn, options.chunk_size, options.progress_every)
+    try:
+        if options.dry_run:
+            # A dry run goes through the same inserts inside one transaction and
+            # rolls it back, so its counts match what a real run would do
+            with transaction.atomic():
+                migration.run()
+                raise DryRunRollback
+        migration.run()
+    except DryRunRollback:
+        print("\nDry run: no changes were kept.")
+    finally:
+        conn.close()
 
-    conn.close()
+    print("\nSummary:")
+    for label, (created, skipped) in migration.counts.items():
+        print(f"  {label}: {created} {'to create' if options.dry_run else 'created'}, {skipped} skipped")
     print("\nMigration completed.")